@@ -0,0 +1,84 @@
+"""
+Сбор альбомов для телеграм-бота объявлений Fixed Gear Perm.
+
+Альбом из нескольких фото Telegram присылает отдельными апдейтами с общим
+media_group_id. Сборщик копит такие сообщения и отдаёт их обработчику одним
+списком, когда новые фото альбома перестают приходить (ALBUM_DEBOUNCE секунд
+тишины). Обработчик апдейта при этом возвращается сразу и не держит
+блокировку пользователя в режиме нескольких процессов.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from aiogram import types
+
+from .config import ALBUM_DEBOUNCE
+
+logger = logging.getLogger(__name__)
+
+AlbumCallback = Callable[[List[types.Message]], Awaitable[None]]
+
+class _Album:
+    """Накопленные сообщения альбома и таймер его обработки"""
+    __slots__ = ('messages', 'callback', 'timer')
+
+    def __init__(self, callback: AlbumCallback):
+        self.messages: List[types.Message] = []
+        self.callback = callback
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+class AlbumCollector:
+    """Копит сообщения по (чат, media_group_id) и обрабатывает альбом целиком"""
+
+    def __init__(self, delay: float = ALBUM_DEBOUNCE):
+        """
+        :param delay: Секунд без новых фото альбома до его обработки
+        """
+        self.delay = delay
+        self._albums: Dict[Tuple[int, str], _Album] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add(self, message: types.Message, callback: AlbumCallback) -> None:
+        """
+        Добавляет сообщение в альбом и откладывает его обработку
+
+        :param message: Сообщение с media_group_id
+        :param callback: Обработчик альбома; берётся от первого сообщения и
+            получает все сообщения альбома по порядку
+        """
+        key = (message.chat.id, message.media_group_id)
+        album = self._albums.get(key)
+        if album is None:
+            album = self._albums[key] = _Album(callback)
+        else:
+            album.timer.cancel()
+        album.messages.append(message)
+        album.timer = asyncio.get_running_loop().call_later(self.delay, self._flush, key)
+
+    def _flush(self, key: Tuple[int, str]) -> None:
+        """Запускает обработку накопленного альбома"""
+        album = self._albums.pop(key)
+        messages = sorted(album.messages, key=lambda m: m.message_id)
+        task = asyncio.create_task(album.callback(messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        """Убирает завершённую обработку и логирует её ошибку"""
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Ошибка при обработке альбома", exc_info=task.exception())
+
+    async def close(self) -> None:
+        """Обрабатывает накопленные альбомы, не дожидаясь таймеров, и ждёт завершения"""
+        for key in list(self._albums):
+            self._albums[key].timer.cancel()
+            self._flush(key)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+# Сборщик альбомов процесса
+albums = AlbumCollector()
+
+__all__ = ['AlbumCollector', 'albums']
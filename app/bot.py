@@ -3,13 +3,25 @@
 """
 
 from aiogram import Bot, Dispatcher
-from .storage import DatabaseStorage
-from .config import BOT_TOKEN, logger
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from .storage import DatabaseStorage, CachedDatabaseStorage
+from .throttling import RateLimitMiddleware
+from .metrics import RequestMetricsMiddleware, setup_metrics
+from .config import BOT_TOKEN, BOT_API_URL, FSM_FLUSH_INTERVAL, logger
+
+# Сессия с ограничением частоты запросов к Bot API
+session = AiohttpSession(api=TelegramAPIServer.from_base(BOT_API_URL) if BOT_API_URL else PRODUCTION)
+rate_limiter = RateLimitMiddleware()
+session.middleware(rate_limiter)
+# Метрики внутри ограничителя: замеряется каждая попытка без ожидания в очереди
+session.middleware(RequestMetricsMiddleware())
 
 # Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
-storage = DatabaseStorage()
+bot = Bot(token=BOT_TOKEN, session=session)
+storage = CachedDatabaseStorage() if FSM_FLUSH_INTERVAL else DatabaseStorage()
 dp = Dispatcher(storage=storage)
+setup_metrics(dp)
 
 # Логируем только если файл импортируется, а не запускается напрямую
 if __name__ != "__main__":
@@ -0,0 +1,71 @@
+"""
+Кэш результатов запросов для телеграм-бота объявлений Fixed Gear Perm.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class TTLCache:
+    """
+    LRU-кэш с временем жизни записей.
+
+    Одновременные промахи по одному ключу ждут одну загрузку: при наборе
+    текста в инлайн-режиме одинаковые запросы от разных пользователей
+    приходят пачками, а в БД уходит один.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        :param maxsize: Записей в кэше
+        :param ttl: Секунд жизни записи
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # ключ -> (момент устаревания, значение)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Возвращает значение из кэша или загружает его
+
+        :param key: Ключ
+        :param load: Корутина-функция, загружающая значение при промахе
+        :return: Значение
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = self._loading[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Ожидающих нет — исключение никто не заберёт, гасим предупреждение
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return value
+        finally:
+            del self._loading[key]
@@ -0,0 +1,180 @@
+"""
+Схема callback_data и маршрутизатор нажатий кнопок телеграм-бота объявлений Fixed Gear Perm.
+
+Все callback_data описаны здесь типизированными классами: pack() формирует
+строку вида approve:<id>, unpack() разбирает её обратно. Вместо цепочки
+фильтров-лямбд, которые aiogram проверяет по очереди, в диспетчере
+регистрируется один обработчик нажатий, а нужный обработчик находится по
+префиксу в словаре за O(1). Кнопки старого формата (approve_<id>, sold_<id>),
+уже разосланные пользователям и модераторам, по-прежнему разбираются.
+"""
+
+import logging
+from typing import Any, Dict, NamedTuple, Optional, Tuple, Type, Union
+
+from aiogram import types
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters import Filter
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.state import State
+
+logger = logging.getLogger(__name__)
+
+class CreateAd(CallbackData, prefix='create_ad'):
+    """Начать создание объявления"""
+
+class Category(CallbackData, prefix='category'):
+    """Выбор категории"""
+    code: str
+
+class PhotosDone(CallbackData, prefix='photos_done'):
+    """Фото загружены"""
+
+class GoToStart(CallbackData, prefix='start_command'):
+    """Возврат в главное меню"""
+
+class SendToModeration(CallbackData, prefix='send_to_moderation'):
+    """Отправка объявления на модерацию"""
+
+class Approve(CallbackData, prefix='approve'):
+    """Одобрение объявления модератором"""
+    ad_id: int
+
+class Reject(CallbackData, prefix='reject'):
+    """Отклонение объявления модератором"""
+    ad_id: int
+
+class Sold(CallbackData, prefix='sold'):
+    """Отметка «Продано» по ID сообщения в канале"""
+    message_id: int
+
+class SearchPage(CallbackData, prefix='search'):
+    """Страница результатов поиска; сам запрос — в тексте сообщения"""
+    status: str
+    page: int
+
+class MyAds(CallbackData, prefix='my'):
+    """Страница /my: объявления старше before_id (0 — первая страница)"""
+    before_id: int
+
+class MyAdAction(CallbackData, prefix='my_ad'):
+    """Действие со своим объявлением из /my: sold, expire или renew"""
+    action: str
+    ad_id: int
+    before_id: int
+
+class Renew(CallbackData, prefix='renew'):
+    """Возврат снятого объявления в каталог"""
+    ad_id: int
+
+class QueueToggle(CallbackData, prefix='q_pick'):
+    """Флажок объявления в сообщении /queue; выбор хранится в самой клавиатуре"""
+    ad_id: int
+
+class QueueAction(CallbackData, prefix='q_act'):
+    """Действие над очередью модерации: approve, reject, approve_all или refresh"""
+    action: str
+
+def split_callback_data(data: str) -> Tuple[str, str]:
+    """
+    Делит callback_data на префикс и остаток
+
+    :param data: callback_data (approve:12 или старый формат approve_12)
+    :return: (префикс, остаток)
+    """
+    prefix, separator, rest = data.partition(':')
+    if not separator:
+        # Старый формат: approve_12, sold_34, category_sell
+        prefix, _, rest = data.partition('_')
+    return prefix, rest
+
+class Route(NamedTuple):
+    """Обработчик нажатия, его схема данных и требуемое состояние FSM"""
+    handler: CallableObject
+    data_class: Type[CallbackData]
+    state: Optional[str]
+
+    @property
+    def name(self) -> str:
+        return self.handler.callback.__name__
+
+class CallbackRouter(Filter):
+    """
+    Маршрутизатор нажатий кнопок по префиксу callback_data.
+
+    Регистрируется в диспетчере как фильтр единственного обработчика
+    callback_query: фильтр находит маршрут и передаёт обработчику
+    разобранные данные (callback_data) и сам маршрут (callback_route).
+    """
+
+    def __init__(self):
+        self.routes: Dict[str, Route] = {}
+
+    def route(self, data_class: Type[CallbackData], handler, state: Optional[State] = None) -> None:
+        """
+        Регистрирует обработчик для префикса
+
+        :param data_class: Класс callback_data
+        :param handler: Обработчик (получает callback, а также state, callback_data и т.п. по имени)
+        :param state: Состояние FSM, в котором кнопка действует
+        """
+        prefix = data_class.__prefix__
+        if prefix in self.routes:
+            raise ValueError(f"Обработчик для {prefix!r} уже зарегистрирован: {self.routes[prefix].name}")
+        self.routes[prefix] = Route(CallableObject(handler), data_class, state.state if state else None)
+
+    def resolve(self, data: Optional[str]) -> Optional[Tuple[Route, CallbackData]]:
+        """
+        Находит маршрут и разбирает callback_data
+
+        :param data: callback_data
+        :return: (маршрут, данные) или None, если кнопка неизвестна
+        """
+        if not data:
+            return None
+        # Кнопки без данных (create_ad, photos_done) совпадают с префиксом целиком
+        route = self.routes.get(data)
+        packed = data
+        if route is None:
+            prefix, rest = split_callback_data(data)
+            route = self.routes.get(prefix)
+            if route is None:
+                return None
+            packed = f"{prefix}:{rest}"
+        try:
+            return route, route.data_class.unpack(packed)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Некорректные callback_data {data!r}: {e}")
+            return None
+
+    async def __call__(self, callback: types.CallbackQuery, raw_state: Optional[str] = None) -> Union[bool, Dict[str, Any]]:
+        resolved = self.resolve(callback.data)
+        if resolved is None:
+            return False
+        route, callback_data = resolved
+        if route.state is not None and route.state != raw_state:
+            return False
+        return {'callback_route': route, 'callback_data': callback_data}
+
+    async def dispatch(self, callback: types.CallbackQuery, callback_route: Route, **data: Any) -> Any:
+        """Единственный обработчик нажатий: вызывает обработчик найденного маршрута"""
+        return await callback_route.handler.call(callback, **data)
+
+def get_callback_router(dp) -> CallbackRouter:
+    """
+    Возвращает маршрутизатор нажатий диспетчера, подключая его при первом обращении
+
+    :param dp: Диспетчер
+    :return: Маршрутизатор
+    """
+    router = dp.workflow_data.get('callback_router')
+    if router is None:
+        router = dp['callback_router'] = CallbackRouter()
+        dp.callback_query.register(router.dispatch, router)
+    return router
+
+__all__ = [
+    'CreateAd', 'Category', 'PhotosDone', 'GoToStart', 'SendToModeration', 'Approve', 'Reject', 'Sold',
+    'SearchPage', 'MyAds', 'MyAdAction', 'Renew', 'QueueToggle', 'QueueAction',
+    'CallbackRouter', 'Route', 'get_callback_router', 'split_callback_data',
+]
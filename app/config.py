@@ -20,11 +20,104 @@ load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 MODERATION_CHAT_ID = os.getenv('MODERATION_CHAT_ID')
 CHANNEL_ID = os.getenv('CHANNEL_ID')
+BOT_API_URL = os.getenv('BOT_API_URL')  # Свой сервер Bot API (локальный или тестовый); по умолчанию api.telegram.org
+
+# Настройки базы данных SQLite
+DB_PATH = os.getenv('DB_PATH', 'bot_data.db')
+DB_POOL_READERS = int(os.getenv('DB_POOL_READERS', '4'))  # Соединений для чтения, помимо одного писателя
+DB_JOURNAL_MODE = os.getenv('DB_JOURNAL_MODE', 'WAL')
+DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))  # Байт
+DB_CACHE_SIZE = int(os.getenv('DB_CACHE_SIZE', '-16000'))  # Отрицательное значение — в КиБ
+DB_CACHED_STATEMENTS = int(os.getenv('DB_CACHED_STATEMENTS', '256'))
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '5'))  # Секунд
+
+# Кэш состояний FSM с отложенной записью в БД
+FSM_CACHE_SIZE = int(os.getenv('FSM_CACHE_SIZE', '10000'))  # Пользователей в памяти
+FSM_CACHE_TTL = float(os.getenv('FSM_CACHE_TTL', '3600'))  # Секунд с последнего обращения
+FSM_FLUSH_INTERVAL = int(os.getenv('FSM_FLUSH_INTERVAL', '200'))  # Мс; столько может потеряться при сбое, 0 — писать сразу
+FSM_SERIALIZER = os.getenv('FSM_SERIALIZER', 'json')  # Формат user_states.data: json, packed или msgpack (нужен пакет msgpack)
+
+# Сбор альбомов: фото одного media_group_id приходят отдельными апдейтами
+ALBUM_DEBOUNCE = float(os.getenv('ALBUM_DEBOUNCE', '0.5'))  # Секунд тишины, после которых альбом считается полным
+
+# Поиск по объявлениям (/search)
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '8'))  # Объявлений на странице
+SEARCH_CANDIDATES = int(os.getenv('SEARCH_CANDIDATES', '200'))  # Ранжировать только столько самых свежих совпадений; 0 — все
+SEARCH_MAX_PAGES = int(os.getenv('SEARCH_MAX_PAGES', '25'))  # Страниц результатов; дальше OFFSET не заходит
+
+# Список своих объявлений (/my)
+MY_ADS_PAGE_SIZE = int(os.getenv('MY_ADS_PAGE_SIZE', '5'))  # Объявлений на странице
+
+# Очередь модерации (/queue)
+QUEUE_PAGE_SIZE = int(os.getenv('QUEUE_PAGE_SIZE', '10'))  # Объявлений с флажками в сообщении очереди
+QUEUE_BULK_LIMIT = int(os.getenv('QUEUE_BULK_LIMIT', '100'))  # Объявлений за одно «Одобрить все»
+
+# Каталог в инлайн-режиме (@бот запрос)
+INLINE_PAGE_SIZE = int(os.getenv('INLINE_PAGE_SIZE', '20'))  # Карточек на страницу, не больше 50
+INLINE_CACHE_TTL = float(os.getenv('INLINE_CACHE_TTL', '30'))  # Секунд жизни страницы в кэше бота
+INLINE_CACHE_SIZE = int(os.getenv('INLINE_CACHE_SIZE', '2000'))  # Страниц в кэше бота
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '30'))  # Секунд, которые Telegram кэширует ответ у себя
+
+# Фоновая очистка брошенных состояний FSM
+STATE_TTL = int(os.getenv('STATE_TTL', str(7 * 24 * 3600)))  # Секунд без обновления
+SWEEPER_INTERVAL = int(os.getenv('SWEEPER_INTERVAL', '600'))  # Секунд между проходами
+SWEEPER_BATCH_SIZE = int(os.getenv('SWEEPER_BATCH_SIZE', '500'))  # Строк за одно удаление
+SWEEPER_VACUUM_PAGES = int(os.getenv('SWEEPER_VACUUM_PAGES', '0'))  # Страниц incremental_vacuum за проход, 0 — не освобождать
+
+# Автоматическое снятие устаревших объявлений
+AD_TTL_DAYS = int(os.getenv('AD_TTL_DAYS', '0'))  # Дней в каталоге, 0 — не снимать
+# Свой срок для отдельных категорий: код=дни через запятую
+AD_TTL_DAYS_BY_CATEGORY = {
+    code.strip(): int(days)
+    for code, _, days in (item.partition('=') for item in os.getenv('AD_TTL_DAYS_BY_CATEGORY', '').split(','))
+    if code.strip() and days.strip()
+}
+EXPIRY_INTERVAL = int(os.getenv('EXPIRY_INTERVAL', '3600'))  # Секунд между проходами
+EXPIRY_BATCH_SIZE = int(os.getenv('EXPIRY_BATCH_SIZE', '200'))  # Объявлений за одну транзакцию
+EXPIRY_EDITS_PER_MINUTE = float(os.getenv('EXPIRY_EDITS_PER_MINUTE', '10'))  # Правок постов в канале; остальное — публикациям
+EXPIRY_RENEW_PROMPT = os.getenv('EXPIRY_RENEW_PROMPT', '0') == '1'  # Спрашивать автора «Ещё актуально?»
+
+# Ограничение частоты запросов к Bot API
+RATE_LIMIT_GLOBAL = float(os.getenv('RATE_LIMIT_GLOBAL', '30'))  # Сообщений в секунду на бота
+RATE_LIMIT_GROUP = float(os.getenv('RATE_LIMIT_GROUP', '20'))  # Сообщений в минуту в группу или канал
+RATE_LIMIT_GROUP_BURST = float(os.getenv('RATE_LIMIT_GROUP_BURST', '3'))  # Сообщений подряд в группу или канал
+RATE_LIMIT_PRIVATE = float(os.getenv('RATE_LIMIT_PRIVATE', '1'))  # Сообщений в секунду в личный чат
+RATE_LIMIT_PRIVATE_BURST = float(os.getenv('RATE_LIMIT_PRIVATE_BURST', '5'))  # Сообщений подряд в личный чат
+RATE_LIMIT_MAX_RETRIES = int(os.getenv('RATE_LIMIT_MAX_RETRIES', '3'))  # Повторов после RetryAfter
+
+# Режим получения апдейтов: polling или webhook
+RUN_MODE = os.getenv('RUN_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')  # Одинаковый у всех экземпляров
+WEBHOOK_REGISTER = os.getenv('WEBHOOK_REGISTER', 'auto')  # auto — если адрес изменился, always — при каждом запуске, off — никогда
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+
+# Горизонтальное масштабирование: число процессов-обработчиков
+WORKERS = int(os.getenv('WORKERS', '1'))
+
+# Метрики Prometheus: порт HTTP-эндпоинта /metrics (0 — не поднимать)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
 
 # Проверка наличия необходимых переменных окружения
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден в .env файле")
 
+if RUN_MODE not in ('polling', 'webhook'):
+    raise ValueError(f"Неизвестный RUN_MODE: {RUN_MODE} (ожидается polling или webhook)")
+
+if RUN_MODE == 'webhook' and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL не найден в .env файле (обязателен в режиме webhook)")
+
+if RUN_MODE == 'webhook' and not WEBHOOK_SECRET:
+    raise ValueError("WEBHOOK_SECRET не найден в .env файле (обязателен в режиме webhook)")
+
+if WEBHOOK_REGISTER not in ('auto', 'always', 'off'):
+    raise ValueError(f"Неизвестный WEBHOOK_REGISTER: {WEBHOOK_REGISTER} (ожидается auto, always или off)")
+
 if not MODERATION_CHAT_ID:
     logger.warning("MODERATION_CHAT_ID не найден в .env файле")
 
@@ -32,4 +125,19 @@ if not CHANNEL_ID:
     logger.warning("CHANNEL_ID не найден в .env файле")
 
 # Экспортируем все переменные
-__all__ = ['BOT_TOKEN', 'MODERATION_CHAT_ID', 'CHANNEL_ID', 'logger'] 
\ No newline at end of file
+__all__ = [
+    'BOT_TOKEN', 'MODERATION_CHAT_ID', 'CHANNEL_ID', 'BOT_API_URL', 'logger',
+    'DB_PATH', 'DB_POOL_READERS', 'DB_JOURNAL_MODE', 'DB_SYNCHRONOUS',
+    'DB_MMAP_SIZE', 'DB_CACHE_SIZE', 'DB_CACHED_STATEMENTS', 'DB_BUSY_TIMEOUT',
+    'FSM_CACHE_SIZE', 'FSM_CACHE_TTL', 'FSM_FLUSH_INTERVAL', 'FSM_SERIALIZER', 'ALBUM_DEBOUNCE',
+    'SEARCH_PAGE_SIZE', 'SEARCH_CANDIDATES', 'SEARCH_MAX_PAGES',
+    'MY_ADS_PAGE_SIZE', 'QUEUE_PAGE_SIZE', 'QUEUE_BULK_LIMIT',
+    'INLINE_PAGE_SIZE', 'INLINE_CACHE_TTL', 'INLINE_CACHE_SIZE', 'INLINE_CACHE_TIME',
+    'STATE_TTL', 'SWEEPER_INTERVAL', 'SWEEPER_BATCH_SIZE', 'SWEEPER_VACUUM_PAGES',
+    'AD_TTL_DAYS', 'AD_TTL_DAYS_BY_CATEGORY', 'EXPIRY_INTERVAL', 'EXPIRY_BATCH_SIZE',
+    'EXPIRY_EDITS_PER_MINUTE', 'EXPIRY_RENEW_PROMPT',
+    'RATE_LIMIT_GLOBAL', 'RATE_LIMIT_GROUP', 'RATE_LIMIT_GROUP_BURST', 'RATE_LIMIT_PRIVATE',
+    'RATE_LIMIT_PRIVATE_BURST', 'RATE_LIMIT_MAX_RETRIES',
+    'RUN_MODE', 'WEBHOOK_URL', 'WEBHOOK_PATH', 'WEBHOOK_SECRET', 'WEBHOOK_REGISTER', 'WEBHOOK_HOST', 'WEBHOOK_PORT',
+    'WORKERS', 'METRICS_HOST', 'METRICS_PORT'
+] 
\ No newline at end of file
@@ -1,100 +1,254 @@
 import sqlite3
 import json
+import queue
+import asyncio
+import functools
+import threading
 import logging
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from contextlib import contextmanager
 
+from . import serializers
+from .migrations import migrate
+from .metrics import timed, db_latency
+from .config import (
+    DB_PATH, DB_POOL_READERS, DB_JOURNAL_MODE, DB_SYNCHRONOUS,
+    DB_MMAP_SIZE, DB_CACHE_SIZE, DB_CACHED_STATEMENTS, DB_BUSY_TIMEOUT, SEARCH_CANDIDATES,
+    FSM_SERIALIZER
+)
+
 logger = logging.getLogger(__name__)
 
-class Database:
-    def __init__(self, db_path: str = "bot_data.db"):
+def _fts_query(words: List[str]) -> str:
+    """
+    Собирает запрос FTS5 из слов пользователя
+    
+    Каждое слово берётся в кавычки, чтобы операторы FTS5 в тексте не ломали
+    запрос; слова от трёх букв ищутся по префиксу (рама — рамы, рамой).
+    Как и в индексе, ё заменяется на е.
+    
+    :param words: Слова запроса
+    :return: Выражение для MATCH
+    """
+    terms = []
+    for word in words:
+        term = '"' + word.replace('"', '""').replace('ё', 'е').replace('Ё', 'Е') + '"'
+        terms.append(term + '*' if len(word) >= 3 else term)
+    return ' '.join(terms)
+
+# Статусы объявлений, побывавших в канале
+PUBLISHED_STATUSES = ['active', 'sold', 'expired']
+
+# Объявление на модерации вместе с его карточкой в чате модерации
+_MODERATION_AD_SELECT = """
+    SELECT a.id, a.user_id, a.category, a.photos, a.title, a.description, a.price,
+           a.user_mention, a.user_display, a.status, a.moderator_id, a.moderator_name, a.created_at,
+           c.message_id AS moderation_message_id, c.chat_id AS moderation_chat_id,
+           c.text AS moderation_text
+    FROM ads a LEFT JOIN ad_moderation_cards c ON c.ad_id = a.id
+"""
+
+def _moderation_ad(row: sqlite3.Row) -> Dict[str, Any]:
+    """Строка _MODERATION_AD_SELECT в словарь объявления"""
+    return {
+        'id': row['id'],
+        'user_id': row['user_id'],
+        'category': row['category'],
+        'photos': json.loads(row['photos']) if row['photos'] else [],
+        'title': row['title'],
+        'description': row['description'],
+        'price': row['price'],
+        'user_mention': row['user_mention'],
+        'user_display': row['user_display'],
+        'moderation_message_id': row['moderation_message_id'],
+        'moderation_chat_id': row['moderation_chat_id'],
+        'moderation_text': row['moderation_text'],
+        'status': row['status'],
+        'moderator_id': row['moderator_id'],
+        'moderator_name': row['moderator_name'],
+        'created_at': row['created_at']
+    }
+
+class _UnitOfWorkConnection:
+    """
+    Соединение писателя внутри единицы работы.
+    
+    Методы Database сами вызывают commit после своей записи; здесь он ничего
+    не делает — транзакцию фиксирует единица работы целиком.
+    """
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+    
+    def commit(self):
+        pass
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+class ConnectionPool:
+    """
+    Пул долгоживущих соединений SQLite: один писатель и N читателей.
+    
+    Соединения открываются один раз, поэтому прагмы применяются однократно,
+    а кэш подготовленных выражений sqlite3 переживает отдельные запросы.
+    В режиме WAL читатели не блокируются писателем.
+    """
+    
+    def __init__(self, db_path: str, readers: int = DB_POOL_READERS):
         self.db_path = db_path
-        self.init_database()
+        self._writer = self._connect()
+        # auto_vacuum действует только для новой БД и должен идти до смены журнала
+        self._writer.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._writer.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+        self._writer_lock = threading.Lock()
+        # Единица работы, открытая в текущем потоке
+        self._local = threading.local()
+        self._readers = queue.LifoQueue()
+        for _ in range(readers):
+            self._readers.put(self._connect())
+        self.size = readers
     
-    @contextmanager
-    def get_connection(self):
-        """Контекстный менеджер для работы с БД"""
-        conn = sqlite3.connect(self.db_path)
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает соединение и применяет прагмы"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=DB_BUSY_TIMEOUT,
+            cached_statements=DB_CACHED_STATEMENTS,
+            check_same_thread=False  # Соединения переходят между потоками пула
+        )
         conn.row_factory = sqlite3.Row  # Для доступа к колонкам по имени
+        conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = {DB_CACHE_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+    
+    @contextmanager
+    def writer(self):
+        """Выдаёт единственное соединение для записи (внутри единицы работы — её соединение)"""
+        unit = getattr(self._local, 'unit', None)
+        if unit is not None:
+            # Ошибку откатит единица работы — вся транзакция целиком
+            yield unit
+            return
+        with self._writer_lock:
+            try:
+                yield self._writer
+            except Exception:
+                self._writer.rollback()
+                raise
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Единица работы: записи этого потока внутри блока — одна транзакция с одним commit
+        
+        Соединение писателя занято на всё время блока. Вложенный блок входит во внешний.
+        """
+        unit = getattr(self._local, 'unit', None)
+        if unit is not None:
+            yield unit
+            return
+        with self._writer_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            self._local.unit = _UnitOfWorkConnection(self._writer)
+            try:
+                yield self._local.unit
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+            finally:
+                self._local.unit = None
+    
+    @property
+    def in_transaction(self) -> bool:
+        """Открыта ли единица работы в текущем потоке"""
+        return getattr(self._local, 'unit', None) is not None
+    
+    @contextmanager
+    def reader(self):
+        """Выдаёт свободное соединение для чтения (или писателя, если читателей нет)"""
+        unit = getattr(self._local, 'unit', None)
+        if unit is not None:
+            # Внутри единицы работы читаем её же ещё не зафиксированные записи
+            yield unit
+            return
+        if not self.size:
+            with self.writer() as conn:
+                yield conn
+            return
+        conn = self._readers.get()
         try:
             yield conn
         finally:
-            conn.close()
+            self._readers.put(conn)
+    
+    def close(self):
+        """Закрывает все соединения пула"""
+        for _ in range(self.size):
+            self._readers.get().close()
+        with self._writer_lock:
+            self._writer.close()
+
+class Database:
+    def __init__(self, db_path: str = DB_PATH, pool_readers: int = DB_POOL_READERS,
+                 fsm_serializer: str = FSM_SERIALIZER):
+        self.db_path = db_path
+        # Формат записи user_states.data; читаются строки любого формата
+        self.serializer = serializers.get_serializer(fsm_serializer)
+        self.pool = ConnectionPool(db_path, pool_readers)
+        self.init_database()
+    
+    @contextmanager
+    def get_connection(self, readonly: bool = False):
+        """Контекстный менеджер для работы с БД"""
+        if readonly:
+            with self.pool.reader() as conn:
+                yield conn
+        else:
+            with self.pool.writer() as conn:
+                yield conn
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Объединяет вызовы методов Database в одну транзакцию
+        
+            with db.transaction():
+                db.publish_ad(...)
+                db.remove_from_expiry_queue(...)
+        
+        Ошибка внутри блока откатывает все записи блока.
+        """
+        with self.pool.transaction():
+            yield self
+    
+    def apply_unit_of_work(self, calls: List[Tuple[Callable, tuple, dict]]) -> List[Any]:
+        """
+        Выполняет записанные вызовы одной транзакцией
+        
+        :param calls: (метод, args, kwargs) в порядке записи
+        :return: Результаты вызовов
+        """
+        with self.transaction():
+            return [func(*args, **kwargs) for func, args, kwargs in calls]
+    
+    def close(self):
+        """Закрывает соединения с БД"""
+        self.pool.close()
     
     def init_database(self):
-        """Инициализация базы данных"""
+        """Инициализация базы данных: применяет недостающие миграции схемы"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Таблица для хранения состояния пользователей
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_states (
-                    user_id INTEGER PRIMARY KEY,
-                    state TEXT,
-                    data TEXT,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Таблица для хранения объявлений на модерации
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS moderation_ads (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    category TEXT,
-                    photos TEXT,
-                    title TEXT,
-                    description TEXT,
-                    price TEXT,
-                    user_mention TEXT,
-                    user_display TEXT,
-                    moderation_message_id INTEGER,
-                    moderation_chat_id INTEGER,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    moderated_at TIMESTAMP,
-                    moderator_id INTEGER
-                )
-            """)
-            
-            # Таблица для опубликованных объявлений
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS published_ads (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    category TEXT,
-                    photos TEXT,
-                    title TEXT,
-                    description TEXT,
-                    price TEXT,
-                    user_mention TEXT,
-                    user_display TEXT,
-                    channel_message_id INTEGER,
-                    channel_chat_id INTEGER,
-                    status TEXT DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    sold_at TIMESTAMP,
-                    sold_by_user_id INTEGER
-                )
-            """)
-            
-            conn.commit()
+            migrate(conn)
             logger.info("База данных инициализирована")
     
-    def save_user_state(self, user_id: int, state: str, data: Dict[str, Any]):
-        """Сохраняет состояние пользователя"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO user_states (user_id, state, data, updated_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-            """, (user_id, state, json.dumps(data, ensure_ascii=False)))
-            conn.commit()
-            logger.debug(f"Состояние пользователя {user_id} сохранено: {state}")
-    
     def get_user_state(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получает состояние пользователя"""
-        with self.get_connection() as conn:
+        with self.get_connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT state, data FROM user_states WHERE user_id = ?
@@ -104,10 +258,120 @@ class Database:
             if row:
                 return {
                     'state': row['state'],
-                    'data': json.loads(row['data']) if row['data'] else {}
+                    'data': serializers.loads(row['data'])
                 }
             return None
     
+    def set_user_state(self, user_id: int, state: Optional[str]):
+        """Устанавливает состояние пользователя, не трогая данные"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO user_states (user_id, state, data, updated_at)
+                VALUES (?, ?, '{}', CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id) DO UPDATE
+                SET state = excluded.state, updated_at = excluded.updated_at
+            """, (user_id, state))
+            conn.commit()
+            logger.debug(f"Состояние пользователя {user_id} обновлено: {state}")
+    
+    def set_user_data(self, user_id: int, data: Dict[str, Any]):
+        """Заменяет данные пользователя, не трогая состояние"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO user_states (user_id, state, data, updated_at)
+                VALUES (?, NULL, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id) DO UPDATE
+                SET data = excluded.data, updated_at = excluded.updated_at
+            """, (user_id, self.serializer.dumps(data)))
+            conn.commit()
+            logger.debug(f"Данные пользователя {user_id} сохранены")
+    
+    def merge_user_data(self, user_id: int, data: Dict[str, Any],
+                        state: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Дополняет данные пользователя и возвращает результат.
+        
+        Как dict.update в BaseStorage.update_data из aiogram: ключи верхнего уровня
+        заменяются целиком, значение None сохраняется. JSON дополняет SQLite
+        (json_set по каждому ключу) одним запросом, поэтому одновременные обновления
+        не теряют друг друга. Двоичные форматы и ключи с кавычками, которые нельзя
+        записать в путь json_set, сливаются в Python между чтением и записью в
+        транзакции BEGIN IMMEDIATE. Если передан state, он устанавливается той же записью.
+        """
+        if self.serializer.name == 'json' and not any('"' in key or '\\' in key for key in data):
+            paths = []
+            for key, value in data.items():
+                paths += ['$."' + key + '"', json.dumps(value, ensure_ascii=False)]
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                # Строку в двоичном формате (FSM_SERIALIZER переключили обратно) json_set не прочтёт
+                cursor.execute(f"""
+                    INSERT INTO user_states (user_id, state, data, updated_at)
+                    VALUES (?, ?, json(?), CURRENT_TIMESTAMP)
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET data = json_set(COALESCE(NULLIF(user_states.data, ''), '{{}}'){', ?, json(?)' * len(data)}),
+                        state = COALESCE(excluded.state, user_states.state),
+                        updated_at = excluded.updated_at
+                    WHERE typeof(user_states.data) <> 'blob'
+                    RETURNING data
+                """, (user_id, state, json.dumps(data, ensure_ascii=False), *paths))
+                row = cursor.fetchone()
+                conn.commit()
+                if row:
+                    logger.debug(f"Данные пользователя {user_id} дополнены")
+                    return json.loads(row['data'])
+    
+        with self.transaction():
+            with self.get_connection() as conn:
+                row = conn.execute("SELECT data FROM user_states WHERE user_id = ?", (user_id,)).fetchone()
+                merged = {**(serializers.loads(row['data']) if row else {}), **data}
+                conn.execute("""
+                    INSERT INTO user_states (user_id, state, data, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET data = excluded.data,
+                        state = COALESCE(excluded.state, user_states.state),
+                        updated_at = excluded.updated_at
+                """, (user_id, state, self.serializer.dumps(merged)))
+        logger.debug(f"Данные пользователя {user_id} дополнены")
+        return merged
+    
+    def append_user_data(self, user_id: int, data: Dict[str, List[Any]],
+                         limit: int) -> Tuple[int, Dict[str, Any]]:
+        """
+        Дописывает элементы в списки данных пользователя, не больше limit в каждом.
+        
+        Чтение, проверка предела и запись идут в одной транзакции BEGIN IMMEDIATE,
+        поэтому одновременные вызовы (фото, присланные по одному) не теряют
+        элементы друг друга и вместе не превышают предел. Списки дописываются
+        одинаковым числом элементов, предел считается по первому ключу.
+        
+        :param user_id: ID пользователя
+        :param data: Ключ -> новые элементы (списки одной длины)
+        :param limit: Наибольшая длина списка
+        :return: Сколько элементов дописано и данные после записи
+        """
+        first = next(iter(data))
+        with self.transaction():
+            with self.get_connection() as conn:
+                row = conn.execute("SELECT data FROM user_states WHERE user_id = ?", (user_id,)).fetchone()
+                current = serializers.loads(row['data']) if row else {}
+                accepted = max(0, min(limit - len(current.get(first) or []), len(data[first])))
+                if not accepted:
+                    return 0, current
+                merged = {**current, **{key: (current.get(key) or []) + items[:accepted] for key, items in data.items()}}
+                conn.execute("""
+                    INSERT INTO user_states (user_id, data, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET data = excluded.data,
+                        updated_at = excluded.updated_at
+                """, (user_id, self.serializer.dumps(merged)))
+        logger.debug(f"В данные пользователя {user_id} дописано {accepted} эл.")
+        return accepted, merged
+    
     def clear_user_state(self, user_id: int):
         """Очищает состояние пользователя"""
         with self.get_connection() as conn:
@@ -116,12 +380,62 @@ class Database:
             conn.commit()
             logger.debug(f"Состояние пользователя {user_id} очищено")
     
+    def apply_user_states(self, saved: List[tuple], cleared: List[int]):
+        """Сохраняет и очищает состояния пользователей одной транзакцией"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO user_states (user_id, state, data, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            """, [
+                (user_id, state, self.serializer.dumps(data))
+                for user_id, state, data in saved
+            ])
+            cursor.executemany(
+                "DELETE FROM user_states WHERE user_id = ?",
+                [(user_id,) for user_id in cleared]
+            )
+            conn.commit()
+            logger.debug(f"Записано состояний: {len(saved)}, очищено: {len(cleared)}")
+    
+    def delete_stale_user_states(self, ttl_seconds: int, limit: int) -> int:
+        """Удаляет не больше limit состояний, не обновлявшихся дольше ttl_seconds"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM user_states WHERE user_id IN (
+                    SELECT user_id FROM user_states
+                    WHERE updated_at < datetime('now', ?)
+                    LIMIT ?
+                )
+            """, (f"-{int(ttl_seconds)} seconds", limit))
+            conn.commit()
+            return cursor.rowcount
+    
+    def incremental_vacuum(self, pages: int) -> int:
+        """
+        Возвращает ОС до pages свободных страниц, возвращает число освобождённых
+        
+        Не вызывается внутри единицы работы: executescript сначала фиксирует
+        открытую транзакцию, и единица работы распалась бы на две.
+        """
+        if self.pool.in_transaction:
+            raise RuntimeError("incremental_vacuum нельзя вызывать внутри транзакции (db.transaction, unit_of_work)")
+        with self.get_connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logger.warning("auto_vacuum не INCREMENTAL: для перевода БД выполните VACUUM (db_manager.py)")
+                return 0
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # execute() делает лишь один шаг прагмы (одну страницу), executescript — до конца
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    
     def save_moderation_ad(self, user_id: int, ad_data: Dict[str, Any]) -> int:
-        """Сохраняет объявление на модерации"""
+        """Сохраняет объявление на модерацию"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO moderation_ads (
+                INSERT INTO ads (
                     user_id, category, photos, title, description, price,
                     user_mention, user_display
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
@@ -135,88 +449,156 @@ class Database:
                 ad_data.get('user_mention'),
                 ad_data.get('user_display')
             ))
-            conn.commit()
             ad_id = cursor.lastrowid
+            # Фото объявления — для поиска повторов по file_unique_id
+            cursor.executemany("""
+                INSERT OR IGNORE INTO ad_photos (file_unique_id, ad_id) VALUES (?, ?)
+            """, [(uid, ad_id) for uid in ad_data.get('photo_uids', [])])
+            conn.commit()
             logger.info(f"Объявление {ad_id} пользователя {user_id} сохранено на модерации")
             return ad_id
     
     def get_moderation_ad(self, ad_id: int) -> Optional[Dict[str, Any]]:
         """Получает объявление на модерации"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM moderation_ads WHERE id = ?
-            """, (ad_id,))
-            row = cursor.fetchone()
-            
+        with self.get_connection(readonly=True) as conn:
+            row = conn.execute(f"{_MODERATION_AD_SELECT} WHERE a.id = ?", (ad_id,)).fetchone()
             if row:
-                return {
+                return _moderation_ad(row)
+            return None
+    
+    def claim_moderation_ads(self, ad_ids: List[int], status: str, moderator_id: int,
+                             moderator_name: str = None, moderation_message_id: int = None,
+                             moderation_chat_id: int = None) -> List[Dict[str, Any]]:
+        """
+        Забирает объявления у очереди модерации: статус меняется только у ожидающих
+    
+        Проверка и смена статуса — один UPDATE, поэтому из одновременных нажатий
+        объявление достаётся ровно одному; остальные получают пустой список.
+    
+        :param ad_ids: ID объявлений
+        :param status: Новый статус (approved, rejected)
+        :param moderator_id: ID модератора
+        :param moderator_name: Имя модератора для ответа опоздавшим
+        :param moderation_message_id: ID карточки в чате модерации (по умолчанию сохранённая)
+        :param moderation_chat_id: ID чата модерации
+        :return: Забранные объявления, старые первыми
+        """
+        if not ad_ids:
+            return []
+        placeholders = ",".join("?" * len(ad_ids))
+        with self.get_connection() as conn:
+            claimed = [row[0] for row in conn.execute(f"""
+                UPDATE ads
+                SET status = ?, moderator_id = ?, moderator_name = ?, moderated_at = CURRENT_TIMESTAMP
+                WHERE id IN ({placeholders}) AND status = 'pending'
+                RETURNING id
+            """, (status, moderator_id, moderator_name, *ad_ids)).fetchall()]
+            if not claimed:
+                conn.commit()
+                return []
+            if moderation_message_id:
+                conn.executemany("""
+                    INSERT INTO ad_moderation_cards (ad_id, chat_id, message_id) VALUES (?, ?, ?)
+                    ON CONFLICT (ad_id) DO UPDATE SET chat_id = excluded.chat_id, message_id = excluded.message_id
+                """, [(ad_id, moderation_chat_id, moderation_message_id) for ad_id in claimed])
+            rows = conn.execute(f"""
+                {_MODERATION_AD_SELECT} WHERE a.id IN ({",".join("?" * len(claimed))})
+            """, claimed).fetchall()
+            conn.commit()
+        # Забранных объявлений не больше пачки: сортируем здесь, а не во временном B-дереве
+        ads = [_moderation_ad(row) for row in rows]
+        ads.sort(key=lambda ad: (ad['created_at'], ad['id']))
+        return ads
+    
+    def release_moderation_ads(self, ad_ids: List[int]) -> int:
+        """
+        Возвращает в очередь одобренные объявления, публикация которых не состоялась
+    
+        :param ad_ids: ID объявлений в статусе approved
+        :return: Количество возвращённых объявлений
+        """
+        if not ad_ids:
+            return 0
+        placeholders = ",".join("?" * len(ad_ids))
+        with self.get_connection() as conn:
+            cursor = conn.execute(f"""
+                UPDATE ads
+                SET status = 'pending', moderator_id = NULL, moderator_name = NULL, moderated_at = NULL
+                WHERE id IN ({placeholders}) AND status = 'approved'
+            """, list(ad_ids))
+            conn.commit()
+            return cursor.rowcount
+    
+    def get_moderation_queue(self, limit: int) -> Dict[str, Any]:
+        """
+        Очередь модерации по индексу (status, created_at)
+    
+        :param limit: Сколько самых старых объявлений вернуть
+        :return: {'total', 'oldest' — created_at самого старого, 'ads' — старые первыми}
+        """
+        with self.get_connection(readonly=True) as conn:
+            total, oldest = conn.execute("""
+                SELECT COUNT(*), MIN(created_at) FROM ads WHERE status = 'pending'
+            """).fetchone()
+            rows = conn.execute("""
+                SELECT id, category, title, price, created_at FROM ads
+                WHERE status = 'pending' ORDER BY created_at LIMIT ?
+            """, (limit,)).fetchall()
+            return {
+                'total': total,
+                'oldest': oldest,
+                'ads': [{
                     'id': row['id'],
-                    'user_id': row['user_id'],
                     'category': row['category'],
-                    'photos': json.loads(row['photos']) if row['photos'] else [],
                     'title': row['title'],
-                    'description': row['description'],
                     'price': row['price'],
-                    'user_mention': row['user_mention'],
-                    'user_display': row['user_display'],
-                    'moderation_message_id': row['moderation_message_id'],
-                    'moderation_chat_id': row['moderation_chat_id'],
-                    'status': row['status'],
                     'created_at': row['created_at']
-                }
-            return None
+                } for row in rows]
+            }
     
-    def update_moderation_status(self, ad_id: int, status: str, moderator_id: int, 
-                               moderation_message_id: int = None, moderation_chat_id: int = None):
-        """Обновляет статус модерации"""
+    def set_moderation_card(self, ad_id: int, message_id: int, chat_id: int, text: str = None) -> None:
+        """Запоминает карточку объявления в чате модерации и её HTML-текст, чтобы закрыть её при решении через /queue"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE moderation_ads 
-                SET status = ?, moderator_id = ?, moderated_at = CURRENT_TIMESTAMP,
-                    moderation_message_id = ?, moderation_chat_id = ?
-                WHERE id = ?
-            """, (status, moderator_id, moderation_message_id, moderation_chat_id, ad_id))
+            conn.execute("""
+                INSERT OR REPLACE INTO ad_moderation_cards (ad_id, chat_id, message_id, text) VALUES (?, ?, ?, ?)
+            """, (ad_id, chat_id, message_id, text))
             conn.commit()
-            logger.info(f"Статус объявления {ad_id} обновлен на {status}")
     
-    def save_published_ad(self, user_id: int, ad_data: Dict[str, Any], 
-                         channel_message_id: int, channel_chat_id: int) -> int:
-        """Сохраняет опубликованное объявление"""
+    def publish_ad(self, ad_id: int, channel_message_id: int, channel_chat_id: int, caption: str = None) -> bool:
+        """
+        Отмечает одобренное объявление опубликованным и запоминает пост в канале вместе с подписью
+    
+        :return: False, если объявление уже не в статусе approved (статус не меняется)
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO published_ads (
-                    user_id, category, photos, title, description, price,
-                    user_mention, user_display, channel_message_id, channel_chat_id
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                user_id,
-                ad_data.get('category'),
-                json.dumps(ad_data.get('photos', []), ensure_ascii=False),
-                ad_data.get('title'),
-                ad_data.get('description'),
-                ad_data.get('price'),
-                ad_data.get('user_mention'),
-                ad_data.get('user_display'),
-                channel_message_id,
-                channel_chat_id
-            ))
+                UPDATE ads SET status = 'active', published_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'approved'
+            """, (ad_id,))
+            published = cursor.rowcount
+            # Пост уже в канале — запоминаем его в любом случае
+            cursor.execute("""
+                INSERT OR REPLACE INTO ad_channel_posts (ad_id, chat_id, message_id, caption) VALUES (?, ?, ?, ?)
+            """, (ad_id, channel_chat_id, channel_message_id, caption))
             conn.commit()
-            ad_id = cursor.lastrowid
-            logger.info(f"Объявление {ad_id} пользователя {user_id} опубликовано")
-            return ad_id
+            if not published:
+                logger.warning(f"Объявление {ad_id} опубликовано, но уже не в статусе approved")
+                return False
+            logger.info(f"Объявление {ad_id} опубликовано")
+            return True
     
     def get_published_ad(self, ad_id: int) -> Optional[Dict[str, Any]]:
-        """Получает опубликованное объявление"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM published_ads WHERE id = ?
-            """, (ad_id,))
-            row = cursor.fetchone()
-            
+        """Получает опубликованное объявление вместе с его постом в канале"""
+        with self.get_connection(readonly=True) as conn:
+            row = conn.execute("""
+                SELECT a.id, a.user_id, a.category, a.photos, a.title, a.description, a.price,
+                       a.user_mention, a.user_display, a.status, a.published_at, a.sold_at, a.sold_by_user_id,
+                       p.message_id AS channel_message_id, p.chat_id AS channel_chat_id, p.caption
+                FROM ads a LEFT JOIN ad_channel_posts p ON p.ad_id = a.id
+                WHERE a.id = ? AND a.published_at IS NOT NULL
+            """, (ad_id,)).fetchone()
+    
             if row:
                 return {
                     'id': row['id'],
@@ -230,44 +612,526 @@ class Database:
                     'user_display': row['user_display'],
                     'channel_message_id': row['channel_message_id'],
                     'channel_chat_id': row['channel_chat_id'],
+                    'caption': row['caption'],
                     'status': row['status'],
-                    'created_at': row['created_at'],
+                    'published_at': row['published_at'],
                     'sold_at': row['sold_at'],
                     'sold_by_user_id': row['sold_by_user_id']
                 }
             return None
     
-    def mark_ad_as_sold(self, ad_id: int, sold_by_user_id: int):
-        """Отмечает объявление как проданное"""
+    def mark_ad_as_sold(self, ad_id: int, sold_by_user_id: int) -> bool:
+        """Отмечает активное объявление как проданное, возвращает False, если оно уже не активно"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                UPDATE published_ads 
+                UPDATE ads
                 SET status = 'sold', sold_at = CURRENT_TIMESTAMP, sold_by_user_id = ?
-                WHERE id = ?
+                WHERE id = ? AND status = 'active'
             """, (sold_by_user_id, ad_id))
             conn.commit()
+            if not cursor.rowcount:
+                return False
             logger.info(f"Объявление {ad_id} отмечено как проданное пользователем {sold_by_user_id}")
+            return True
+    
+    def reopen_ad(self, ad_id: int, status: str) -> bool:
+        """
+        Возвращает объявление в active, если пост в канале пометить не удалось
+    
+        :param status: Статус, который ставили (sold, expired); другой статус не трогается
+        :return: False, если статус уже сменился
+        """
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                UPDATE ads SET status = 'active', sold_at = NULL, sold_by_user_id = NULL, expired_at = NULL
+                WHERE id = ? AND status = ?
+            """, (ad_id, status))
+            conn.commit()
+            return bool(cursor.rowcount)
+    
+    def get_published_ad_by_message(self, channel_message_id: int) -> Optional[Dict[str, Any]]:
+        """Находит опубликованное объявление по ID сообщения в канале: статус и подпись поста"""
+        with self.get_connection(readonly=True) as conn:
+            row = conn.execute("""
+                SELECT a.id, a.status, p.caption, a.photos
+                FROM ad_channel_posts p JOIN ads a ON a.id = p.ad_id
+                WHERE p.message_id = ?
+            """, (channel_message_id,)).fetchone()
+            if row:
+                return {
+                    'id': row['id'],
+                    'status': row['status'],
+                    'caption': row['caption'],
+                    'has_photos': bool(row['photos'] and json.loads(row['photos']))
+                }
+            return None
+    
+    def find_ads_with_photos(self, file_unique_ids: List[str], before_ad_id: int,
+                             limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Находит более ранние объявления с теми же фото
+    
+        Для каждого фото — поиск по первичному ключу ad_photos, поэтому стоимость
+        не зависит от числа сохранённых фото.
+    
+        :param file_unique_ids: file_unique_id фото нового объявления
+        :param before_ad_id: ID нового объявления; ищутся объявления до него
+        :param limit: Сколько последних объявлений вернуть
+        :return: Объявления, новые сверху, с числом общих фото (shared)
+        """
+        ads = {}
+        with self.get_connection(readonly=True) as conn:
+            for uid in file_unique_ids:
+                rows = conn.execute("""
+                    SELECT a.id, a.user_id, a.status, a.created_at
+                    FROM ad_photos p
+                    JOIN ads a ON a.id = p.ad_id
+                    WHERE p.file_unique_id = ? AND p.ad_id < ?
+                    ORDER BY p.ad_id DESC
+                    LIMIT ?
+                """, (uid, before_ad_id, limit)).fetchall()
+                for row in rows:
+                    ad = ads.get(row['id'])
+                    if ad is None:
+                        ad = ads[row['id']] = {
+                            'id': row['id'],
+                            'user_id': row['user_id'],
+                            'status': row['status'],
+                            'created_at': row['created_at'],
+                            'shared': 0
+                        }
+                    ad['shared'] += 1
+        return sorted(ads.values(), key=lambda ad: ad['id'], reverse=True)[:limit]
+    
+    def search_published_ads(self, words: List[str], category: Optional[str] = None,
+                             status: Optional[str] = None, limit: int = 10,
+                             offset: int = 0, candidates: int = SEARCH_CANDIDATES) -> List[Dict[str, Any]]:
+        """
+        Полнотекстовый поиск по опубликованным объявлениям
+        
+        Все совпадения ранжируются bm25 (заголовок весит больше описания).
+        С candidates ранжирование идёт только среди стольких самых свежих
+        совпадений: частое слово не заставляет считать релевантность всей
+        таблицы, но более старые объявления не находятся.
+        
+        Страницы идут через OFFSET по ранжированному списку: keyset по
+        (bm25, id) не годится, потому что оценка bm25 меняется с каждым новым
+        объявлением. Глубина OFFSET ограничена candidates, а в боте ещё и
+        SEARCH_MAX_PAGES.
+        
+        :param words: Слова запроса (все должны встретиться)
+        :param category: Код категории или None — любая
+        :param status: active, sold или None — любой из опубликованных
+        :param limit: Объявлений на странице
+        :param offset: Сколько объявлений пропустить
+        :param candidates: Предел совпадений для ранжирования, 0 — без предела
+        :return: Объявления по убыванию релевантности
+        """
+        filters, params = "", [_fts_query(words)]
+        if category:
+            filters += " AND a.category = ?"
+            params.append(category)
+        if status:
+            filters += " AND a.status = ?"
+            params.append(status)
+        else:
+            # В индексе и объявления с модерации
+            filters += f" AND a.status IN ({','.join('?' * len(PUBLISHED_STATUSES))})"
+            params += PUBLISHED_STATUSES
+        matches = f"""
+            SELECT a.id, a.category, a.title, a.price, a.status,
+                   bm25(ads_fts, 10.0, 1.0) AS score
+            FROM ads_fts
+            JOIN ads a ON a.id = ads_fts.rowid
+            WHERE ads_fts MATCH ?{filters}
+        """
+        if candidates:
+            matches += " ORDER BY ads_fts.rowid DESC LIMIT ?"
+            params.append(candidates)
+        params += [limit, offset]
+        with self.get_connection(readonly=True) as conn:
+            rows = conn.execute(f"""
+                SELECT a.*, p.message_id AS channel_message_id, p.chat_id AS channel_chat_id
+                FROM ({matches}) a
+                LEFT JOIN ad_channel_posts p ON p.ad_id = a.id
+                ORDER BY a.score, a.id DESC
+                LIMIT ? OFFSET ?
+            """, params).fetchall()
+            return [{
+                'id': row['id'],
+                'category': row['category'],
+                'title': row['title'],
+                'price': row['price'],
+                'status': row['status'],
+                'channel_message_id': row['channel_message_id'],
+                'channel_chat_id': row['channel_chat_id']
+            } for row in rows]
+    
+    def browse_published_ads(self, words: List[str], category: Optional[str] = None,
+                             after: Optional[Tuple[str, int]] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Страница активных объявлений каталога, новые сверху
     
-    def get_user_ads(self, user_id: int) -> List[Dict[str, Any]]:
-        """Получает все объявления пользователя"""
+        Листание по ключу, а не OFFSET: следующая страница начинается сразу за
+        последним объявлением предыдущей, поэтому дальние страницы стоят столько же,
+        сколько первая. Без слов — по индексу (category, status, published_at, id),
+        со словами — по индексу FTS5 в порядке убывания id.
+    
+        :param words: Слова запроса (может быть пустым)
+        :param category: Код категории или None — любая
+        :param after: (published_at, id) последнего объявления предыдущей страницы
+        :param limit: Объявлений на странице
+        :return: Объявления с полями для карточки
+        """
+        columns = ("a.id, a.category, a.title, a.price, a.photos, a.published_at, "
+                   "p.caption, p.message_id AS channel_message_id, p.chat_id AS channel_chat_id")
+        # Пост в канале — по первичному ключу для каждой строки страницы
+        posts = "LEFT JOIN ad_channel_posts p ON p.ad_id = a.id"
+        params: List[Any] = []
+        if words:
+            sql = f"""
+                SELECT {columns} FROM ads_fts
+                JOIN ads a ON a.id = ads_fts.rowid {posts}
+                WHERE ads_fts MATCH ? AND a.status = 'active'
+            """
+            params.append(_fts_query(words))
+            if category:
+                sql += " AND a.category = ?"
+                params.append(category)
+            if after:
+                sql += " AND ads_fts.rowid < ?"
+                params.append(after[1])
+            queries = [(sql + " ORDER BY ads_fts.rowid DESC LIMIT ?", params)]
+        else:
+            where = "a.status = 'active'"
+            if category:
+                where += " AND a.category = ?"
+                params.append(category)
+            order = "ORDER BY a.published_at DESC, a.id DESC LIMIT ?"
+            if after:
+                # (published_at, id) < (?, ?) SQLite ищет по индексу только по published_at и
+                # перебирает все объявления с той же секундой. Две выборки — «та же секунда,
+                # id меньше», затем «раньше» — идут по индексу в нужном порядке без сортировки
+                # и стоят одинаково на любой странице; вторая нужна, если первая не заполнила страницу
+                queries = [
+                    (f"SELECT {columns} FROM ads a {posts} WHERE {where} AND a.published_at = ? AND a.id < ? {order}",
+                     params + [after[0], after[1]]),
+                    (f"SELECT {columns} FROM ads a {posts} WHERE {where} AND a.published_at < ? {order}",
+                     params + [after[0]]),
+                ]
+            else:
+                queries = [(f"SELECT {columns} FROM ads a {posts} WHERE {where} {order}", params)]
+    
+        rows = []
+        with self.get_connection(readonly=True) as conn:
+            for sql, query_params in queries:
+                if len(rows) < limit:
+                    rows += conn.execute(sql, query_params + [limit - len(rows)]).fetchall()
+            return [{
+                'id': row['id'],
+                'category': row['category'],
+                'title': row['title'],
+                'price': row['price'],
+                'photo': (json.loads(row['photos']) or [None])[0] if row['photos'] else None,
+                'caption': row['caption'],
+                'published_at': row['published_at'],
+                'channel_message_id': row['channel_message_id'],
+                'channel_chat_id': row['channel_chat_id']
+            } for row in rows]
+    
+    def mark_ad_as_expired(self, ad_id: int, user_id: int) -> bool:
+        """Снимает активное объявление автора с публикации, возвращает False, если оно уже не активно"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT * FROM published_ads WHERE user_id = ? ORDER BY created_at DESC
-            """, (user_id,))
-            rows = cursor.fetchall()
-            
+                UPDATE ads SET status = 'expired', expired_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND user_id = ? AND status = 'active'
+            """, (ad_id, user_id))
+            conn.commit()
+            if not cursor.rowcount:
+                return False
+            logger.info(f"Объявление {ad_id} снято с публикации пользователем {user_id}")
+            return True
+    
+    def expire_stale_ads(self, category: str, ttl_seconds: int, limit: int) -> int:
+        """
+        Снимает с публикации не больше limit активных объявлений категории старше ttl_seconds
+    
+        Объявления находятся по индексу (category, status, published_at, id), смена
+        статуса и постановка в очередь правки поста идут одной транзакцией.
+    
+        :return: Количество снятых объявлений
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE ads SET status = 'expired', expired_at = CURRENT_TIMESTAMP
+                WHERE id IN (
+                    SELECT id FROM ads
+                    WHERE category = ? AND status = 'active' AND published_at < datetime('now', ?)
+                    ORDER BY published_at LIMIT ?
+                )
+                RETURNING id
+            """, (category, f"-{int(ttl_seconds)} seconds", limit))
+            ad_ids = [(row[0],) for row in cursor.fetchall()]
+            cursor.executemany("INSERT OR IGNORE INTO expiry_queue (ad_id) VALUES (?)", ad_ids)
+            conn.commit()
+            return len(ad_ids)
+    
+    def get_expiry_queue(self, limit: int) -> List[Dict[str, Any]]:
+        """Снятые объявления, пост которых ещё не помечен, в порядке снятия"""
+        with self.get_connection(readonly=True) as conn:
+            rows = conn.execute("""
+                SELECT a.id, a.user_id, a.title, a.photos, a.status,
+                       p.caption, p.message_id AS channel_message_id, p.chat_id AS channel_chat_id
+                FROM expiry_queue q
+                JOIN ads a ON a.id = q.ad_id
+                LEFT JOIN ad_channel_posts p ON p.ad_id = q.ad_id
+                ORDER BY q.ad_id LIMIT ?
+            """, (limit,)).fetchall()
+            return [{
+                'id': row['id'],
+                'user_id': row['user_id'],
+                'title': row['title'],
+                'has_photos': bool(row['photos'] and json.loads(row['photos'])),
+                'caption': row['caption'],
+                'status': row['status'],
+                'channel_message_id': row['channel_message_id'],
+                'channel_chat_id': row['channel_chat_id']
+            } for row in rows]
+    
+    def remove_from_expiry_queue(self, ad_id: int) -> None:
+        """Убирает объявление из очереди правки постов"""
+        with self.get_connection() as conn:
+            conn.execute("DELETE FROM expiry_queue WHERE ad_id = ?", (ad_id,))
+            conn.commit()
+    
+    def renew_ad(self, ad_id: int, user_id: int) -> bool:
+        """
+        Возвращает снятое объявление автора в каталог со свежей датой
+    
+        :return: False, если объявление не снято или принадлежит другому пользователю
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE ads SET status = 'active', published_at = CURRENT_TIMESTAMP, expired_at = NULL
+                WHERE id = ? AND user_id = ? AND status = 'expired'
+            """, (ad_id, user_id))
+            renewed = cursor.rowcount
+            if renewed:
+                # Пост ещё не успели пометить — и не нужно
+                cursor.execute("DELETE FROM expiry_queue WHERE ad_id = ?", (ad_id,))
+            conn.commit()
+            if not renewed:
+                return False
+            logger.info(f"Объявление {ad_id} возвращено в каталог пользователем {user_id}")
+            return True
+    
+    def get_user_ads(self, user_id: int, before_id: Optional[int] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Страница опубликованных объявлений пользователя, новые сверху
+    
+        Листание по ключу (published_at, id) по индексу (user_id, published_at): в память
+        попадает одна страница, сколько бы объявлений ни было у продавца.
+    
+        :param user_id: ID пользователя
+        :param before_id: ID последнего объявления предыдущей страницы или None
+        :param limit: Объявлений на странице
+        :return: Объявления с полями для списка
+        """
+        # Пост в канале — по первичному ключу для каждой строки страницы
+        sql = """
+            SELECT a.id, a.category, a.title, a.price, a.status, a.published_at,
+                   p.message_id AS channel_message_id, p.chat_id AS channel_chat_id
+            FROM ads a LEFT JOIN ad_channel_posts p ON p.ad_id = a.id
+            WHERE a.user_id = ? AND a.published_at IS NOT NULL
+        """
+        params: List[Any] = [user_id]
+        with self.get_connection(readonly=True) as conn:
+            if before_id:
+                after = conn.execute("SELECT published_at FROM ads WHERE id = ?", (before_id,)).fetchone()
+                if after is None:
+                    return []
+                # Как в browse_published_ads: сравнение пар (published_at, id) SQLite
+                # не сужает по индексу, а отдельная граница published_at <= ? — сужает
+                sql += " AND a.published_at <= ? AND (a.published_at < ? OR a.id < ?)"
+                params += [after['published_at'], after['published_at'], before_id]
+            sql += " ORDER BY a.published_at DESC, a.id DESC LIMIT ?"
+            params.append(limit)
+            rows = conn.execute(sql, params).fetchall()
             return [{
                 'id': row['id'],
                 'category': row['category'],
                 'title': row['title'],
                 'price': row['price'],
                 'status': row['status'],
-                'created_at': row['created_at'],
+                'published_at': row['published_at'],
                 'channel_message_id': row['channel_message_id'],
                 'channel_chat_id': row['channel_chat_id']
             } for row in rows]
 
+class UnitOfWork:
+    """
+    Единица работы для асинхронного кода: записи копятся и фиксируются одним commit.
+    
+        async with db.unit_of_work() as uow:
+            uow.publish_ad(...)
+            uow.remove_from_expiry_queue(...)
+    
+    Методы Database вызываются без await — вызов только записывается.
+    При выходе из блока без ошибки записанное выполняется в потоке БД одной
+    транзакцией; ошибка любого вызова откатывает все. Писатель занят только
+    на время выполнения, а не всего блока. Результаты — в results, по порядку.
+    """
+    
+    def __init__(self, database: 'AsyncDatabase'):
+        self._database = database
+        self._calls = []
+        self.results = []
+    
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        func = getattr(self._database.sync, name)
+        
+        def record(*args, **kwargs):
+            self._calls.append((func, args, kwargs))
+        return record
+    
+    async def __aenter__(self) -> 'UnitOfWork':
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None and self._calls:
+            self.results = await self._database.run(self._database.sync.apply_unit_of_work, self._calls)
+        return False
+
+class AsyncDatabase:
+    """
+    Асинхронный интерфейс к Database.
+    
+    Все запросы выполняются в потоках БД, поэтому медленный fsync
+    SQLite не блокирует цикл событий и обработку апдейтов других пользователей.
+    """
+    
+    def __init__(self, database: Database):
+        self.sync = database
+        # Писатель и читатели пула работают параллельно в своих потоках
+        self._executor = ThreadPoolExecutor(max_workers=database.pool.size + 1, thread_name_prefix="db")
+    
+    async def run(self, func: Callable, *args, **kwargs):
+        """Выполняет синхронную функцию в потоке БД, замеряя время её выполнения"""
+        loop = asyncio.get_running_loop()
+        timed_func = timed(db_latency, func.__name__, func)
+        return await loop.run_in_executor(self._executor, functools.partial(timed_func, *args, **kwargs))
+    
+    def unit_of_work(self) -> UnitOfWork:
+        """Новая единица работы (см. UnitOfWork)"""
+        return UnitOfWork(self)
+    
+    async def get_user_state(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return await self.run(self.sync.get_user_state, user_id)
+    
+    async def set_user_state(self, user_id: int, state: Optional[str]):
+        return await self.run(self.sync.set_user_state, user_id, state)
+    
+    async def set_user_data(self, user_id: int, data: Dict[str, Any]):
+        return await self.run(self.sync.set_user_data, user_id, data)
+    
+    async def merge_user_data(self, user_id: int, data: Dict[str, Any],
+                              state: Optional[str] = None) -> Dict[str, Any]:
+        return await self.run(self.sync.merge_user_data, user_id, data, state)
+    
+    async def append_user_data(self, user_id: int, data: Dict[str, List[Any]],
+                               limit: int) -> Tuple[int, Dict[str, Any]]:
+        return await self.run(self.sync.append_user_data, user_id, data, limit)
+    
+    async def clear_user_state(self, user_id: int):
+        return await self.run(self.sync.clear_user_state, user_id)
+    
+    async def apply_user_states(self, saved: List[tuple], cleared: List[int]):
+        return await self.run(self.sync.apply_user_states, saved, cleared)
+    
+    async def delete_stale_user_states(self, ttl_seconds: int, limit: int) -> int:
+        return await self.run(self.sync.delete_stale_user_states, ttl_seconds, limit)
+    
+    async def incremental_vacuum(self, pages: int) -> int:
+        return await self.run(self.sync.incremental_vacuum, pages)
+    
+    async def save_moderation_ad(self, user_id: int, ad_data: Dict[str, Any]) -> int:
+        return await self.run(self.sync.save_moderation_ad, user_id, ad_data)
+    
+    async def get_moderation_ad(self, ad_id: int) -> Optional[Dict[str, Any]]:
+        return await self.run(self.sync.get_moderation_ad, ad_id)
+    
+    async def claim_moderation_ads(self, ad_ids: List[int], status: str, moderator_id: int,
+                                   moderator_name: str = None, moderation_message_id: int = None,
+                                   moderation_chat_id: int = None) -> List[Dict[str, Any]]:
+        return await self.run(self.sync.claim_moderation_ads, ad_ids, status, moderator_id,
+                              moderator_name, moderation_message_id, moderation_chat_id)
+    
+    async def release_moderation_ads(self, ad_ids: List[int]) -> int:
+        return await self.run(self.sync.release_moderation_ads, ad_ids)
+    
+    async def get_moderation_queue(self, limit: int) -> Dict[str, Any]:
+        return await self.run(self.sync.get_moderation_queue, limit)
+    
+    async def set_moderation_card(self, ad_id: int, message_id: int, chat_id: int, text: str = None) -> None:
+        return await self.run(self.sync.set_moderation_card, ad_id, message_id, chat_id, text)
+    
+    async def publish_ad(self, ad_id: int, channel_message_id: int, channel_chat_id: int,
+                         caption: str = None) -> bool:
+        return await self.run(self.sync.publish_ad, ad_id, channel_message_id, channel_chat_id, caption)
+    
+    async def get_published_ad(self, ad_id: int) -> Optional[Dict[str, Any]]:
+        return await self.run(self.sync.get_published_ad, ad_id)
+    
+    async def mark_ad_as_sold(self, ad_id: int, sold_by_user_id: int) -> bool:
+        return await self.run(self.sync.mark_ad_as_sold, ad_id, sold_by_user_id)
+    
+    async def reopen_ad(self, ad_id: int, status: str) -> bool:
+        return await self.run(self.sync.reopen_ad, ad_id, status)
+    
+    async def get_published_ad_by_message(self, channel_message_id: int) -> Optional[Dict[str, Any]]:
+        return await self.run(self.sync.get_published_ad_by_message, channel_message_id)
+    
+    async def find_ads_with_photos(self, file_unique_ids: List[str], before_ad_id: int,
+                                   limit: int = 5) -> List[Dict[str, Any]]:
+        return await self.run(self.sync.find_ads_with_photos, file_unique_ids, before_ad_id, limit)
+    
+    async def search_published_ads(self, words: List[str], category: Optional[str] = None,
+                                   status: Optional[str] = None, limit: int = 10,
+                                   offset: int = 0) -> List[Dict[str, Any]]:
+        return await self.run(self.sync.search_published_ads, words, category, status, limit, offset)
+    
+    async def browse_published_ads(self, words: List[str], category: Optional[str] = None,
+                                   after: Optional[Tuple[str, int]] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        return await self.run(self.sync.browse_published_ads, words, category, after, limit)
+    
+    async def mark_ad_as_expired(self, ad_id: int, user_id: int) -> bool:
+        return await self.run(self.sync.mark_ad_as_expired, ad_id, user_id)
+    
+    async def expire_stale_ads(self, category: str, ttl_seconds: int, limit: int) -> int:
+        return await self.run(self.sync.expire_stale_ads, category, ttl_seconds, limit)
+    
+    async def get_expiry_queue(self, limit: int) -> List[Dict[str, Any]]:
+        return await self.run(self.sync.get_expiry_queue, limit)
+    
+    async def remove_from_expiry_queue(self, ad_id: int) -> None:
+        return await self.run(self.sync.remove_from_expiry_queue, ad_id)
+    
+    async def renew_ad(self, ad_id: int, user_id: int) -> bool:
+        return await self.run(self.sync.renew_ad, ad_id, user_id)
+    
+    async def get_user_ads(self, user_id: int, before_id: Optional[int] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        return await self.run(self.sync.get_user_ads, user_id, before_id, limit)
+    
+    def close(self):
+        """Дожидается завершения запросов, останавливает потоки БД и закрывает соединения"""
+        self._executor.shutdown(wait=True)
+        self.sync.close()
+
 # Глобальный экземпляр базы данных
-db = Database()
+db = AsyncDatabase(Database())
@@ -0,0 +1,152 @@
+"""
+Автоматическое снятие устаревших объявлений для телеграм-бота объявлений Fixed Gear Perm.
+
+Раз в EXPIRY_INTERVAL объявления старше срока своей категории снимаются
+с публикации пакетами по EXPIRY_BATCH_SIZE из каждой категории: пакеты всех
+категорий — одна единица работы (одна транзакция), в которой меняется статус
+и объявления встают в очередь expiry_queue.
+Затем очередь разбирается: к посту в канале дописывается метка (не чаще
+EXPIRY_EDITS_PER_MINUTE, чтобы не отнимать лимит канала у новых публикаций),
+автору приходит вопрос «Ещё актуально?» с кнопкой возврата в каталог.
+Строка очереди удаляется после правки поста, поэтому после перезапуска
+разбор продолжается с того же места, а снятое объявление повторно не снимается.
+
+Правка поста выполняется хотя бы один раз, но не ровно один: если бот
+остановили между правкой и удалением строки очереди, после перезапуска пост
+правится ещё раз. Повтор безвреден — подпись берётся из БД, текст совпадает,
+и Telegram отвечает «message is not modified» (TelegramBadRequest). Удалять
+строку до правки нельзя: тогда сбой сети терял бы метку насовсем.
+Вопрос автору отправляется после удаления строки и не повторяется.
+"""
+
+import asyncio
+import html
+import logging
+from typing import Dict, Optional
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+
+from .bot import bot
+from .config import (
+    CHANNEL_ID, AD_TTL_DAYS, AD_TTL_DAYS_BY_CATEGORY, EXPIRY_INTERVAL, EXPIRY_BATCH_SIZE,
+    EXPIRY_EDITS_PER_MINUTE, EXPIRY_RENEW_PROMPT
+)
+from .database import db
+from .handlers.user_actions import mark_channel_post
+from .keyboards import get_renew_keyboard
+from .throttling import TokenBucket
+from .utils import CATEGORIES, EXPIRED_MARK
+
+logger = logging.getLogger(__name__)
+
+# Счётчики с момента запуска
+stats = {'expired_ads': 0, 'edited_posts': 0, 'renew_prompts': 0}
+
+def get_ad_ttls() -> Dict[str, int]:
+    """
+    Срок публикации по категориям
+
+    :return: Код категории -> секунд (категории без срока не попадают)
+    """
+    ttls = {}
+    for code in CATEGORIES:
+        days = AD_TTL_DAYS_BY_CATEGORY.get(code, AD_TTL_DAYS)
+        if days > 0:
+            ttls[code] = days * 24 * 3600
+    return ttls
+
+async def expire_stale_ads(ttls: Optional[Dict[str, int]] = None, batch_size: int = EXPIRY_BATCH_SIZE) -> int:
+    """
+    Снимает с публикации все устаревшие объявления пакетами
+
+    :param ttls: Срок по категориям, секунд (по умолчанию из настроек)
+    :param batch_size: Объявлений категории за одну транзакцию
+    :return: Количество снятых объявлений
+    """
+    expired = 0
+    pending = get_ad_ttls() if ttls is None else dict(ttls)
+    while pending:
+        # По пакету из каждой категории одним commit
+        async with db.unit_of_work() as uow:
+            for category, ttl in pending.items():
+                uow.expire_stale_ads(category, ttl, batch_size)
+        expired += sum(uow.results)
+        # Категория, вернувшая неполный пакет, закончилась
+        pending = {category: ttl for (category, ttl), count in zip(pending.items(), uow.results) if count == batch_size}
+        # Между пакетами даём записать остальным
+        await asyncio.sleep(0)
+    return expired
+
+async def process_expiry_queue(edits: TokenBucket, renew_prompt: bool = EXPIRY_RENEW_PROMPT,
+                               batch_size: int = EXPIRY_BATCH_SIZE) -> int:
+    """
+    Помечает посты снятых объявлений и спрашивает авторов
+
+    Ошибка сети прерывает разбор: объявление остаётся в очереди до следующего прохода.
+    Правка поста идёт до удаления из очереди, поэтому при остановке между ними
+    она повторится после перезапуска (см. описание модуля).
+
+    :param edits: Корзина токенов для правок постов
+    :param renew_prompt: Отправлять автору кнопку возврата в каталог
+    :param batch_size: Объявлений, читаемых из очереди за раз
+    :return: Количество разобранных объявлений
+    """
+    processed = 0
+    while True:
+        ads = await db.get_expiry_queue(batch_size)
+        if not ads:
+            return processed
+        for ad in ads:
+            # Объявление могли вернуть в каталог или продать, пока оно стояло в очереди
+            expired = ad['status'] == 'expired'
+            if expired and ad['channel_message_id']:
+                await edits.acquire()
+                try:
+                    await mark_channel_post(
+                        ad['id'], ad['channel_chat_id'] or CHANNEL_ID, ad['channel_message_id'],
+                        ad['caption'], ad['has_photos'], EXPIRED_MARK
+                    )
+                    stats['edited_posts'] += 1
+                except TelegramBadRequest as e:
+                    # Пост удалён или уже помечен — повтор не поможет
+                    logger.warning(f"Пост объявления {ad['id']} не помечен: {e}")
+            await db.remove_from_expiry_queue(ad['id'])
+            processed += 1
+
+            if expired and renew_prompt:
+                try:
+                    await bot.send_message(
+                        ad['user_id'],
+                        f"⏰ <b>Объявление снято с публикации</b>\n\n"
+                        f"«{html.escape(ad['title'] or 'Без названия')}» провисело в канале весь срок.\n"
+                        f"<i>Ещё актуально? Верни его в каталог.</i>",
+                        reply_markup=get_renew_keyboard(ad['id']),
+                        parse_mode="HTML"
+                    )
+                    stats['renew_prompts'] += 1
+                except TelegramAPIError as e:
+                    # Автор остановил бота или удалил чат
+                    logger.warning(f"Не удалось спросить автора объявления {ad['id']}: {e}")
+
+async def run_expiry(interval: int = EXPIRY_INTERVAL, edits_per_minute: float = EXPIRY_EDITS_PER_MINUTE):
+    """
+    Периодически снимает устаревшие объявления и разбирает очередь правок
+
+    :param interval: Секунд между проходами
+    :param edits_per_minute: Правок постов в минуту
+    """
+    edits = TokenBucket(edits_per_minute / 60, 1)
+    while True:
+        try:
+            expired = await expire_stale_ads()
+            stats['expired_ads'] += expired
+            if expired:
+                logger.info(f"Снято с публикации устаревших объявлений: {expired}")
+
+            processed = await process_expiry_queue(edits)
+            if processed:
+                logger.info(f"Помечено постов снятых объявлений: {processed}")
+        except Exception as e:
+            logger.error(f"Ошибка снятия устаревших объявлений: {e}")
+
+        await asyncio.sleep(interval)
@@ -2,9 +2,9 @@
 Модуль обработчиков для телеграм-бота объявлений Fixed Gear Perm.
 """
 
-from . import start, create_ad, moderation, user_actions
+from . import start, create_ad, moderation, user_actions, search, inline
 
-__all__ = ["start", "create_ad", "moderation", "user_actions"]
+__all__ = ["start", "create_ad", "moderation", "user_actions", "search", "inline"]
 
 def register_all_handlers(dp):
     """
@@ -12,15 +12,14 @@ def register_all_handlers(dp):
     
     :param dp: Диспетчер
     """
-    # Сначала регистрируем глобальные обработчики
-    from .create_ad import go_to_start
-    dp.callback_query.register(go_to_start, lambda c: c.data == "start_command")
-    
     handlers = [
         start,
+        # Команды /search и /my раньше мастера: иначе на шагах мастера они уйдут в текст объявления
+        search,
+        user_actions,
         create_ad,
         moderation,
-        user_actions
+        inline
     ]
     
     for handler in handlers:
@@ -5,16 +5,23 @@
 from aiogram import types
 from aiogram.fsm.context import FSMContext
 import logging
+from typing import List
 
+from ..albums import albums
 from ..bot import bot, dp
 from ..states import AdStates
 from ..keyboards import get_category_keyboard, get_photos_done_keyboard, get_review_keyboard, get_moderation_keyboard, get_error_keyboard, get_start_keyboard, get_create_new_ad_keyboard
 from ..utils import (
     format_price, get_user_mention, get_user_display, 
-    create_ad_text, create_media_group, get_category_name
+    create_ad_text, create_media_group, get_category_name, create_duplicates_text
 )
 from ..config import MODERATION_CHAT_ID
 from ..database import db
+from ..storage import set_state_and_data, append_data
+from ..callbacks import CreateAd, Category, PhotosDone, GoToStart, SendToModeration, get_callback_router
+
+# Фото в одном объявлении
+MAX_PHOTOS = 3
 
 def register_handlers(dp):
     """
@@ -22,18 +29,20 @@ def register_handlers(dp):
     
     :param dp: Диспетчер
     """
+    router = get_callback_router(dp)
+    
     # Начало создания объявления
-    dp.callback_query.register(create_ad, lambda c: c.data == "create_ad")
+    router.route(CreateAd, create_ad)
     
     # Обработка выбора категории
-    dp.callback_query.register(process_category, lambda c: c.data.startswith("category_"))
+    router.route(Category, process_category)
     
     # Обработка фотографий
     dp.message.register(process_photo, AdStates.waiting_for_photos, lambda message: message.photo)
-    dp.callback_query.register(photos_done, AdStates.waiting_for_photos, lambda c: c.data == "photos_done")
+    router.route(PhotosDone, photos_done, AdStates.waiting_for_photos)
     
-    # Обработка возврата в главное меню (глобальный обработчик)
-    dp.callback_query.register(go_to_start, lambda c: c.data == "start_command")
+    # Обработка возврата в главное меню (в любом состоянии)
+    router.route(GoToStart, go_to_start)
     
     # Обработка заголовка, описания и цены
     dp.message.register(process_title, AdStates.waiting_for_title)
@@ -41,7 +50,7 @@ def register_handlers(dp):
     dp.message.register(process_price, AdStates.waiting_for_price)
     
     # Отправка на модерацию
-    dp.callback_query.register(send_to_moderation, AdStates.review, lambda c: c.data == "send_to_moderation")
+    router.route(SendToModeration, send_to_moderation, AdStates.review)
 
 async def create_ad(callback: types.CallbackQuery, state: FSMContext):
     """
@@ -65,58 +74,81 @@ async def create_ad(callback: types.CallbackQuery, state: FSMContext):
     # Устанавливаем состояние ожидания выбора категории
     await state.set_state(AdStates.waiting_for_category)
 
-async def process_category(callback: types.CallbackQuery, state: FSMContext):
+async def process_category(callback: types.CallbackQuery, state: FSMContext, callback_data: Category):
     """
     Обработчик выбора категории
     
     :param callback: Обратный вызов
     :param state: Состояние FSM
+    :param callback_data: Данные кнопки
     """
     await callback.answer()
     
-    # Извлекаем код категории из callback_data
-    category_code = callback.data.split("_")[1]
+    category_code = callback_data.code
     category_name = get_category_name(category_code)
     
-    # Сохраняем категорию
-    await state.update_data(category=category_code)
-    
-    # Создаем пустой список для фотографий
-    await state.update_data(photos=[])
+    # Сохраняем категорию, создаем пустой список для фотографий
+    # и устанавливаем состояние ожидания фотографий одной записью
+    await set_state_and_data(state, AdStates.waiting_for_photos, category=category_code, photos=[])
     
     await callback.message.answer(
         f"📸 <b>Загрузи фото</b>\n\n"
         f"Категория: <code>{category_name}</code>\n\n"
-        "<i>Присылай фото по одному (до 3-х штук). Хорошие фото = быстрая продажа!</i>",
+        "<i>Присылай до 3-х фото — по одному или альбомом. Хорошие фото = быстрая продажа!</i>",
         reply_markup=get_photos_done_keyboard(),
         parse_mode="HTML"
     )
-    
-    # Устанавливаем состояние ожидания фотографий
-    await state.set_state(AdStates.waiting_for_photos)
 
 async def process_photo(message: types.Message, state: FSMContext):
     """
     Обработчик фотографий
     
+    Фото альбома приходят отдельными апдейтами: их копит сборщик альбомов,
+    а сохраняются они все вместе, одной записью и одним ответом.
+    
     :param message: Сообщение
     :param state: Состояние FSM
     """
-    data = await state.get_data()
+    if message.media_group_id:
+        async def save_album(messages):
+            # Пока альбом собирался, пользователь мог уйти с шага загрузки фото
+            if await state.get_state() == AdStates.waiting_for_photos.state:
+                await save_photos(messages, state)
+        
+        albums.add(message, save_album)
+        return
+    
+    await save_photos([message], state)
+
+async def save_photos(messages: List[types.Message], state: FSMContext):
+    """
+    Сохраняет фотографии из сообщений и отвечает на последнее
+    
+    :param messages: Сообщения с фото (одно или весь альбом)
+    :param state: Состояние FSM
+    """
+    message = messages[-1]
+    
+    # Сохраняем file_id фотографий для отправки и file_unique_id для поиска повторов.
+    # Дописываем одной атомарной записью: фото, присланные по одному, обрабатываются
+    # параллельно, и чтение с последующим update_data теряло бы часть из них
+    accepted, data = await append_data(
+        state, MAX_PHOTOS,
+        photos=[m.photo[-1].file_id for m in messages],
+        photo_uids=[m.photo[-1].file_unique_id for m in messages]
+    )
     photos = data.get("photos", [])
     
     # Проверяем, что у нас не больше 3-х фотографий
-    if len(photos) >= 3:
+    if not accepted:
         await message.answer("<b>Хватит фото!</b> 📸\n<i>Нажми 'Дальше'.</i>", parse_mode="HTML")
         return
     
-    # Сохраняем file_id фотографии
-    photo_id = message.photo[-1].file_id
-    photos.append(photo_id)
-    await state.update_data(photos=photos)
-    
+    text = f"👍 <b>Фото {len(photos)}/{MAX_PHOTOS}</b> сохранено."
+    if len(messages) > accepted:
+        text += f"\n<i>Больше {MAX_PHOTOS} фото нельзя, лишние не сохранены.</i>"
     await message.answer(
-        f"👍 <b>Фото {len(photos)}/3</b> сохранено.\n<i>Продолжай или нажми 'Дальше'.</i>", 
+        f"{text}\n<i>Продолжай или нажми 'Дальше'.</i>",
         reply_markup=get_photos_done_keyboard(),
         parse_mode="HTML"
     )
@@ -158,8 +190,8 @@ async def process_title(message: types.Message, state: FSMContext):
         await message.answer("❌ <b>Слишком длинно!</b>\n<i>Сократи до 50 символов.</i>", reply_markup=get_error_keyboard(), parse_mode="HTML")
         return
     
-    # Сохраняем заголовок
-    await state.update_data(title=message.text)
+    # Сохраняем заголовок и устанавливаем состояние ожидания описания
+    await set_state_and_data(state, AdStates.waiting_for_description, title=message.text)
     
     await message.answer(
         "📝 <b>Описание</b>\n\n"
@@ -168,9 +200,6 @@ async def process_title(message: types.Message, state: FSMContext):
         "📏 <code>Максимум 500 символов</code>",
         parse_mode="HTML"
     )
-    
-    # Устанавливаем состояние ожидания описания
-    await state.set_state(AdStates.waiting_for_description)
 
 async def process_description(message: types.Message, state: FSMContext):
     """
@@ -183,17 +212,14 @@ async def process_description(message: types.Message, state: FSMContext):
         await message.answer("❌ <b>Слишком много текста!</b>\n<i>Сократи до 500 символов.</i>", reply_markup=get_error_keyboard(), parse_mode="HTML")
         return
     
-    # Сохраняем описание
-    await state.update_data(description=message.text)
+    # Сохраняем описание и устанавливаем состояние ожидания цены
+    await set_state_and_data(state, AdStates.waiting_for_price, description=message.text)
     
     await message.answer(
         "💰 <b>Цена</b>\n\n"
         "<i>Укажи цену в рублях (только число) или напиши</i> <code>Даром</code>",
         parse_mode="HTML"
     )
-    
-    # Устанавливаем состояние ожидания цены
-    await state.set_state(AdStates.waiting_for_price)
 
 async def process_price(message: types.Message, state: FSMContext):
     """
@@ -219,16 +245,16 @@ async def process_price(message: types.Message, state: FSMContext):
     logger = logging.getLogger(__name__)
     logger.info(f"Проверка username пользователя: ID={message.from_user.id}, username={message.from_user.username}")
     
-    await state.update_data(
+    # Устанавливаем состояние просмотра и получаем все собранные данные
+    data = await set_state_and_data(
+        state,
+        AdStates.review,
         price=formatted_price,
         user_id=message.from_user.id,
         user_mention=user_mention,
         user_display=user_display
     )
     
-    # Получаем все собранные данные
-    data = await state.get_data()
-    
     # Создаем текст объявления
     preview_text = create_ad_text(data)
     
@@ -257,9 +283,6 @@ async def process_price(message: types.Message, state: FSMContext):
         reply_markup=get_review_keyboard(),
         parse_mode="HTML"
     )
-    
-    # Устанавливаем состояние просмотра
-    await state.set_state(AdStates.review)
 
 async def send_to_moderation(callback: types.CallbackQuery, state: FSMContext):
     """
@@ -292,6 +315,7 @@ async def send_to_moderation(callback: types.CallbackQuery, state: FSMContext):
         "user_id": data["user_id"],
         "category": data.get("category", "sell"),  # Добавляем категорию
         "photos": data["photos"],
+        "photo_uids": data.get("photo_uids", []),
         "title": data["title"],
         "description": data["description"],
         "price": data["price"],
@@ -300,7 +324,7 @@ async def send_to_moderation(callback: types.CallbackQuery, state: FSMContext):
     }
     
     # Сохраняем объявление в базу данных
-    ad_id = db.save_moderation_ad(data['user_id'], post_data)
+    ad_id = await db.save_moderation_ad(data['user_id'], post_data)
     
     # Формируем текст объявления для модерации
     mod_text = create_ad_text(data, is_moderation=True)
@@ -311,13 +335,22 @@ async def send_to_moderation(callback: types.CallbackQuery, state: FSMContext):
         media_group = create_media_group(photos, mod_text, "HTML")
         await bot.send_media_group(chat_id=MODERATION_CHAT_ID, media=media_group)
 
+    # Ищем более ранние объявления с теми же фото, чтобы модератор увидел повтор
+    card_text = "🧠 <b>Новое объявление на модерации</b>"
+    if post_data["photo_uids"]:
+        duplicates = await db.find_ads_with_photos(post_data["photo_uids"], ad_id)
+        if duplicates:
+            card_text += "\n\n" + create_duplicates_text(duplicates, data['user_id'])
+    
     # Всегда отправляем сообщение с кнопками модерации
-    await bot.send_message(
+    card = await bot.send_message(
         chat_id=MODERATION_CHAT_ID,
-        text="🧠 <b>Новое объявление на модерации</b>",
+        text=card_text,
         reply_markup=get_moderation_keyboard(ad_id),
         parse_mode="HTML"
     )
+    # Карточку закроет и решение, принятое пакетом через /queue
+    await db.set_moderation_card(ad_id, card.message_id, card.chat.id, card_text)
     
     # Сообщаем пользователю, что объявление отправлено на модерацию
     await callback.message.answer(
@@ -0,0 +1,108 @@
+"""
+Обработчики инлайн-режима (каталог объявлений) для телеграм-бота объявлений Fixed Gear Perm.
+"""
+
+import html
+from typing import Optional, Tuple
+
+from aiogram import types
+from aiogram.types import InlineQueryResultArticle, InlineQueryResultCachedPhoto, InputTextMessageContent
+
+from ..cache import TTLCache
+from ..config import INLINE_PAGE_SIZE, INLINE_CACHE_TTL, INLINE_CACHE_SIZE, INLINE_CACHE_TIME
+from ..database import db
+from ..keyboards import get_channel_post_keyboard
+from ..utils import get_category_name
+from .search import parse_search_query
+
+# Страницы каталога: (слова, категория, offset) -> (карточки, next_offset)
+results_cache = TTLCache(INLINE_CACHE_SIZE, INLINE_CACHE_TTL)
+
+def register_handlers(dp):
+    """
+    Регистрирует все обработчики модуля
+
+    :param dp: Диспетчер
+    """
+    dp.inline_query.register(inline_catalog)
+
+def parse_offset(offset: str) -> Optional[Tuple[str, int]]:
+    """
+    Разбирает offset инлайн-запроса
+
+    :param offset: "<published_at>|<id>" последнего объявления предыдущей страницы или ""
+    :return: (published_at, id) или None для первой страницы
+    """
+    published_at, _, ad_id = offset.rpartition('|')
+    if not published_at or not ad_id.isdigit():
+        return None
+    return published_at, int(ad_id)
+
+def ad_result(ad):
+    """
+    Карточка объявления для ответа на инлайн-запрос
+
+    :param ad: Объявление из browse_published_ads
+    :return: Фото с подписью поста или текстовая карточка, если фото нет
+    """
+    title = ad['title'] or "Без названия"
+    description = f"{get_category_name(ad['category'])} · {ad['price'] or ''}"
+    # Подпись поста в канале; у старых объявлений её нет — собираем короткую
+    text = ad['caption'] or (
+        f"{get_category_name(ad['category'])}\n"
+        f"🚲 <b>{html.escape(title)}</b>\n"
+        f"💰 Цена: {html.escape(ad['price'] or '')}"
+    )
+    keyboard = None
+    if ad['channel_message_id'] and ad['channel_chat_id']:
+        keyboard = get_channel_post_keyboard(ad['channel_chat_id'], ad['channel_message_id'])
+
+    if ad['photo']:
+        return InlineQueryResultCachedPhoto(
+            id=str(ad['id']),
+            photo_file_id=ad['photo'],
+            title=title,
+            description=description,
+            caption=text,
+            parse_mode="HTML",
+            reply_markup=keyboard
+        )
+    return InlineQueryResultArticle(
+        id=str(ad['id']),
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(message_text=text, parse_mode="HTML"),
+        reply_markup=keyboard
+    )
+
+async def load_page(words, category, after):
+    """
+    Загружает страницу каталога из БД
+
+    :return: (карточки, next_offset; пустой, если страница последняя)
+    """
+    ads = await db.browse_published_ads(words, category, after, INLINE_PAGE_SIZE)
+    next_offset = ""
+    if len(ads) == INLINE_PAGE_SIZE:
+        last = ads[-1]
+        next_offset = f"{last['published_at']}|{last['id']}"
+    return [ad_result(ad) for ad in ads], next_offset
+
+async def inline_catalog(inline_query: types.InlineQuery):
+    """
+    Обработчик инлайн-запроса: активные объявления по словам и хештегу категории
+
+    :param inline_query: Инлайн-запрос
+    """
+    words, category = parse_search_query(inline_query.query)
+    after = parse_offset(inline_query.offset)
+    # Каталог одинаков для всех, поэтому и страницы кэшируются без привязки к пользователю
+    key = (tuple(words), category, inline_query.offset if after else "")
+    results, next_offset = await results_cache.get(key, lambda: load_page(words, category, after))
+
+    await inline_query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=False,
+        next_offset=next_offset
+    )
@@ -2,67 +2,90 @@
 Обработчики модерации объявлений для телеграм-бота объявлений Fixed Gear Perm.
 """
 
+import asyncio
+import html
 import logging
+import time
+from typing import Set
+
 from aiogram import types
+from aiogram.filters import Command
 
 from ..bot import bot, dp
-from ..config import CHANNEL_ID
-from ..utils import create_ad_text, create_media_group
-from ..keyboards import get_sold_keyboard, get_create_new_ad_keyboard
+from ..config import CHANNEL_ID, MODERATION_CHAT_ID, QUEUE_PAGE_SIZE, QUEUE_BULK_LIMIT
+from ..utils import create_ad_text, create_media_group, format_age, get_category_name
+from ..keyboards import get_sold_keyboard, get_create_new_ad_keyboard, get_queue_keyboard
 from ..database import db
+from ..callbacks import Approve, Reject, QueueToggle, QueueAction, get_callback_router
 
 logger = logging.getLogger(__name__)
 
+# Пакетные решения, идущие в фоне; при остановке бота новые публикации не начинаются
+bulk_jobs: Set[asyncio.Task] = set()
+bulk_closing = False
+
+# Что ответить модератору, нажавшему кнопку под уже забранным объявлением
+MODERATION_OUTCOMES = {
+    'approved': "Уже публикуется",
+    'rejected': "Уже отклонено",
+    'active': "Уже опубликовано",
+    'sold': "Уже опубликовано",
+    'expired': "Уже опубликовано",
+}
+
 def register_handlers(dp):
     """
     Регистрирует все обработчики модуля
     
     :param dp: Диспетчер
     """
+    dp.message.register(cmd_queue, Command("queue"))
     # Обработчики модерации
-    dp.callback_query.register(approve_ad, lambda c: c.data.startswith("approve_"))
-    dp.callback_query.register(reject_ad, lambda c: c.data.startswith("reject_"))
+    router = get_callback_router(dp)
+    router.route(Approve, approve_ad)
+    router.route(Reject, reject_ad)
+    router.route(QueueToggle, queue_toggle)
+    router.route(QueueAction, queue_action)
 
-async def approve_ad(callback: types.CallbackQuery):
+async def post_to_channel(ad_data):
     """
-    Обработчик одобрения объявления модератором
+    Публикует объявление в канале
     
-    :param callback: Обратный вызов
+    :param ad_data: Объявление на модерации
+    :return: (ID поста в канале, текст поста)
     """
-    await callback.answer()
-    
-    # Извлекаем ID объявления из callback_data
-    ad_id = int(callback.data.split("_")[1])
-    
-    # Получаем данные объявления из базы данных
-    ad_data = db.get_moderation_ad(ad_id)
-    
-    if not ad_data:
-        await callback.message.reply("Данные объявления не найдены!")
-        return
-    
     # Формируем текст объявления для публикации в канале
     post_text = create_ad_text(ad_data)
     
-    channel_msg_id = None
-    
     # Публикуем объявление в канале
     photos = ad_data['photos']
     if photos:
         # Создаем группу медиа для публикации в канале
         media_group = create_media_group(photos, post_text, "HTML")
-
+    
         # Отправляем группу фотографий в канал
         channel_msgs = await bot.send_media_group(chat_id=CHANNEL_ID, media=media_group)
-        channel_msg_id = channel_msgs[0].message_id
-    else:
-        # Если фотографий нет, публикуем текстовое сообщение
-        channel_msg = await bot.send_message(
-            chat_id=CHANNEL_ID,
-            text=post_text,
-            parse_mode="HTML"
-        )
-        channel_msg_id = channel_msg.message_id
+        return channel_msgs[0].message_id, post_text
+    
+    # Если фотографий нет, публикуем текстовое сообщение
+    channel_msg = await bot.send_message(
+        chat_id=CHANNEL_ID,
+        text=post_text,
+        parse_mode="HTML"
+    )
+    return channel_msg.message_id, post_text
+
+async def complete_approval(ad_data, channel_msg_id: int, post_text: str):
+    """
+    Записывает публикацию и сообщает автору
+    
+    :param ad_data: Объявление, забранное со статусом approved
+    :param channel_msg_id: ID поста в канале
+    :param post_text: Текст поста
+    """
+    # Запоминаем пост вместе с подписью — до того, как автор получит кнопку
+    # «Продано», иначе нажатие может опередить запись
+    await db.publish_ad(ad_data['id'], channel_msg_id, int(CHANNEL_ID), post_text)
     
     # Отправляем уведомление автору объявления
     try:
@@ -77,73 +100,331 @@ async def approve_ad(callback: types.CallbackQuery):
         )
     except Exception as e:
         logger.error(f"Не удалось отправить уведомление пользователю {ad_data['user_id']}: {e}")
+
+async def complete_rejection(ad_data):
+    """
+    Сообщает автору об отклонении
+    
+    :param ad_data: Объявление, забранное со статусом rejected
+    """
+    # Отправляем уведомление автору объявления
+    try:
+        await bot.send_message(
+            chat_id=ad_data['user_id'],
+            text=(
+                "❌ <b>Объявление отклонено</b>\n\n"
+                "🔄 <i>Создай новое объявление с лучшими фото и описанием.</i>"
+            ),
+            reply_markup=get_create_new_ad_keyboard(),
+            parse_mode="HTML"
+        )
+    except Exception as e:
+        logger.error(f"Не удалось отправить уведомление пользователю {ad_data['user_id']}: {e}")
+
+def moderator_name(user: types.User) -> str:
+    """Как показать модератора коллегам"""
+    return f"@{user.username}" if user.username else user.full_name
+
+async def answer_already_handled(callback: types.CallbackQuery, ad_id: int):
+    """
+    Отвечает на нажатие по объявлению, которое уже забрал другой модератор (или это повторное нажатие)
+    
+    :param callback: Обратный вызов
+    :param ad_id: ID объявления
+    """
+    ad_data = await db.get_moderation_ad(ad_id)
+    if not ad_data:
+        await callback.answer("Данные объявления не найдены!", show_alert=True)
+        return
+    
+    outcome = MODERATION_OUTCOMES.get(ad_data['status'], "Уже обработано")
+    if ad_data['moderator_id'] == callback.from_user.id:
+        by = "тобой"
+    else:
+        by = f"модератором {ad_data['moderator_name'] or ad_data['moderator_id']}"
+    await callback.answer(f"{outcome} {by}.", show_alert=True)
+
+async def approve_ad(callback: types.CallbackQuery, callback_data: Approve):
+    """
+    Обработчик одобрения объявления модератором
+    
+    :param callback: Обратный вызов
+    :param callback_data: Данные кнопки
+    """
+    ad_id = callback_data.ad_id
+    
+    # Забираем объявление до публикации: из одновременных нажатий проходит одно,
+    # остальные получают ответ без обращений к каналу
+    claimed = await db.claim_moderation_ads(
+        [ad_id], 'approved', callback.from_user.id, moderator_name(callback.from_user),
+        callback.message.message_id, callback.message.chat.id
+    )
+    if not claimed:
+        await answer_already_handled(callback, ad_id)
+        return
+    
+    await callback.answer()
+    ad_data = claimed[0]
+    
+    try:
+        channel_msg_id, post_text = await post_to_channel(ad_data)
+    except Exception:
+        # Пост не ушёл — объявление снова ждёт решения
+        await db.release_moderation_ads([ad_id])
+        raise
+    await complete_approval(ad_data, channel_msg_id, post_text)
     
     # Обновляем сообщение в чате модерации
     await callback.message.edit_text(
         f"{callback.message.text}\n\n✅ ОДОБРЕНО",
         reply_markup=None
     )
+
+async def reject_ad(callback: types.CallbackQuery, callback_data: Reject):
+    """
+    Обработчик отклонения объявления модератором
+    
+    :param callback: Обратный вызов
+    :param callback_data: Данные кнопки
+    """
+    ad_id = callback_data.ad_id
     
-    # Сохраняем объявление в базу данных как опубликованное
-    published_ad_id = db.save_published_ad(
-        ad_data['user_id'], 
-        ad_data, 
-        channel_msg_id, 
-        int(CHANNEL_ID)
+    claimed = await db.claim_moderation_ads(
+        [ad_id], 'rejected', callback.from_user.id, moderator_name(callback.from_user),
+        callback.message.message_id, callback.message.chat.id
     )
+    if not claimed:
+        await answer_already_handled(callback, ad_id)
+        return
+    
+    await callback.answer()
+    await complete_rejection(claimed[0])
     
-    # Обновляем статус модерации
-    db.update_moderation_status(
-        ad_id, 
-        'approved', 
-        callback.from_user.id,
-        callback.message.message_id,
-        callback.message.chat.id
+    # Обновляем сообщение в чате модерации
+    await callback.message.edit_text(
+        f"{callback.message.text}\n\n❌ ОТКЛОНЕНО",
+        reply_markup=None
     )
 
-async def reject_ad(callback: types.CallbackQuery):
+def is_moderation_chat(chat: types.Chat) -> bool:
+    """Команды очереди действуют только в чате модерации"""
+    return bool(MODERATION_CHAT_ID) and str(chat.id) == str(MODERATION_CHAT_ID)
+
+async def render_queue(selected=frozenset()):
     """
-    Обработчик отклонения объявления модератором
+    Готовит сообщение очереди модерации
+    
+    :param selected: ID отмеченных объявлений
+    :return: (текст, клавиатура)
+    """
+    queue = await db.get_moderation_queue(QUEUE_PAGE_SIZE)
+    if not queue['total']:
+        return "🗂 <b>Очередь модерации пуста</b>", get_queue_keyboard([], set(), 0)
+    
+    lines = [
+        f"🗂 <b>Очередь модерации: {queue['total']}</b>",
+        f"<i>Самое старое ждёт {format_age(queue['oldest'])}</i>",
+        ""
+    ]
+    for ad in queue['ads']:
+        lines.append(
+            f"№{ad['id']} · {format_age(ad['created_at'])} · {get_category_name(ad['category'])} "
+            f"{html.escape(ad['title'] or 'Без названия')}, {html.escape(ad['price'] or '')}"
+        )
+    if queue['total'] > len(queue['ads']):
+        lines.append(f"<i>…и ещё {queue['total'] - len(queue['ads'])}</i>")
+    # Выбор на странице имеет смысл только для объявлений, которые ещё в очереди
+    visible = {ad['id'] for ad in queue['ads']}
+    keyboard = get_queue_keyboard(queue['ads'], set(selected) & visible, min(queue['total'], QUEUE_BULK_LIMIT))
+    return "\n".join(lines), keyboard
+
+def selected_ads(message: types.Message) -> Set[int]:
+    """ID объявлений, отмеченных в клавиатуре сообщения /queue"""
+    selected = set()
+    for row in (message.reply_markup.inline_keyboard if message.reply_markup else []):
+        for button in row:
+            if (button.callback_data or '').startswith(f"{QueueToggle.__prefix__}:") and button.text.startswith('☑️'):
+                selected.add(QueueToggle.unpack(button.callback_data).ad_id)
+    return selected
+
+async def cmd_queue(message: types.Message):
+    """
+    Обработчик команды /queue в чате модерации
+    
+    :param message: Сообщение
+    """
+    if not is_moderation_chat(message.chat):
+        return
+    text, keyboard = await render_queue()
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+async def queue_toggle(callback: types.CallbackQuery, callback_data: QueueToggle):
+    """
+    Обработчик флажка объявления в /queue
     
     :param callback: Обратный вызов
+    :param callback_data: Данные кнопки
     """
     await callback.answer()
+    if not is_moderation_chat(callback.message.chat):
+        return
+    selected = selected_ads(callback.message) ^ {callback_data.ad_id}
+    text, keyboard = await render_queue(selected)
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+
+async def queue_action(callback: types.CallbackQuery, callback_data: QueueAction):
+    """
+    Обработчик действий над очередью: одобрить или отклонить выбранные, одобрить все, обновить
     
-    # Извлекаем ID объявления из callback_data
-    ad_id = int(callback.data.split("_")[1])
+    :param callback: Обратный вызов
+    :param callback_data: Данные кнопки
+    """
+    if not is_moderation_chat(callback.message.chat):
+        await callback.answer()
+        return
     
-    # Получаем данные объявления из базы данных
-    ad_data = db.get_moderation_ad(ad_id)
+    action = callback_data.action
+    if action == "refresh":
+        await callback.answer()
+        text, keyboard = await render_queue(selected_ads(callback.message))
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+        return
     
-    if not ad_data:
-        await callback.message.reply("Данные объявления не найдены.")
+    if action == "approve_all":
+        queue = await db.get_moderation_queue(QUEUE_BULK_LIMIT)
+        ad_ids = [ad['id'] for ad in queue['ads']]
+    else:
+        ad_ids = sorted(selected_ads(callback.message))
+    approve = action != "reject"
+    # Объявления, которые уже забрал другой модератор, сюда не попадут
+    ads = await db.claim_moderation_ads(
+        ad_ids, 'approved' if approve else 'rejected',
+        callback.from_user.id, moderator_name(callback.from_user)
+    )
+    if not ads:
+        await callback.answer("Нечего обрабатывать: очередь уже разобрана.", show_alert=True)
         return
     
-    # Отправляем уведомление автору объявления
+    await callback.answer(f"{'Публикую' if approve else 'Отклоняю'}: {len(ads)}")
+    await callback.message.edit_text(
+        f"⏳ <b>{'Публикация' if approve else 'Отклонение'}: 0 из {len(ads)}</b>",
+        parse_mode="HTML"
+    )
+    # Публикация упирается в лимит канала и может идти минутами — не держим обработчик
+    job = asyncio.create_task(run_bulk(ads, approve, callback.from_user.id, callback.message))
+    bulk_jobs.add(job)
+    job.add_done_callback(bulk_done)
+
+def bulk_done(job: asyncio.Task) -> None:
+    """Убирает завершённое пакетное решение и логирует его ошибку"""
+    bulk_jobs.discard(job)
+    if not job.cancelled() and job.exception() is not None:
+        logger.error("Ошибка пакетной модерации", exc_info=job.exception())
+
+async def close_card(ad_data, mark: str) -> None:
+    """Дописывает решение к карточке объявления в чате модерации и убирает кнопки"""
+    if not ad_data['moderation_message_id']:
+        return
+    # Текст карточки запомнен при отправке; у карточек, отправленных до этого, его нет
+    card_text = ad_data['moderation_text'] or "🧠 <b>Новое объявление на модерации</b>"
     try:
-        await bot.send_message(
-            chat_id=ad_data['user_id'],
-            text=(
-                "❌ <b>Объявление отклонено</b>\n\n"
-                "🔄 <i>Создай новое объявление с лучшими фото и описанием.</i>"
-            ),
-            reply_markup=get_create_new_ad_keyboard(),
+        await bot.edit_message_text(
+            chat_id=ad_data['moderation_chat_id'],
+            message_id=ad_data['moderation_message_id'],
+            text=f"{card_text}\n\n{mark}",
+            reply_markup=None,
             parse_mode="HTML"
         )
     except Exception as e:
-        logger.error(f"Не удалось отправить уведомление пользователю {ad_data['user_id']}: {e}")
+        logger.warning(f"Не удалось обновить карточку объявления {ad_data['id']}: {e}")
+
+async def publish_many(ads, progress=None) -> int:
+    """
+    Публикует объявления конвейером
     
-    # Обновляем сообщение в чате модерации
-    await callback.message.edit_text(
-        f"{callback.message.text}\n\n❌ ОТКЛОНЕНО",
-        reply_markup=None
-    )
+    Посты уходят в канал по одному и по порядку — их темп задаёт лимит канала.
+    Запись в БД, уведомление автора и правка карточки каждого объявления идут
+    отдельной задачей, пока следующий пост ждёт своей очереди к Bot API.
     
-    # Обновляем статус модерации
-    db.update_moderation_status(
-        ad_id, 
-        'rejected', 
-        callback.from_user.id,
-        callback.message.message_id,
-        callback.message.chat.id
-    ) 
\ No newline at end of file
+    :param ads: Объявления, забранные со статусом approved, старые первыми
+    :param progress: Корутина-функция (опубликовано, всего), вызывается после каждого поста
+    :return: Количество опубликованных объявлений
+    """
+    async def finish(ad_data, channel_msg_id, post_text):
+        await complete_approval(ad_data, channel_msg_id, post_text)
+        await close_card(ad_data, "✅ ОДОБРЕНО через /queue")
+    
+    follow_ups = []
+    for index, ad_data in enumerate(ads):
+        if bulk_closing:
+            # Остальные возвращаются в очередь модерации
+            await db.release_moderation_ads([ad['id'] for ad in ads[index:]])
+            break
+        try:
+            channel_msg_id, post_text = await post_to_channel(ad_data)
+        except Exception as e:
+            logger.error(f"Не удалось опубликовать объявление {ad_data['id']}: {e}")
+            await db.release_moderation_ads([ad_data['id']])
+            continue
+        follow_ups.append(asyncio.create_task(finish(ad_data, channel_msg_id, post_text)))
+        if progress is not None:
+            await progress(len(follow_ups), len(ads))
+    
+    for result in await asyncio.gather(*follow_ups, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error("Ошибка записи опубликованного объявления", exc_info=result)
+    return len(follow_ups)
+
+async def reject_many(ads) -> int:
+    """
+    Отклоняет объявления: уведомления авторам идут одновременно
+    
+    :param ads: Объявления, забранные со статусом rejected
+    :return: Количество отклонённых объявлений
+    """
+    async def reject(ad_data):
+        await complete_rejection(ad_data)
+        await close_card(ad_data, "❌ ОТКЛОНЕНО через /queue")
+    
+    results = await asyncio.gather(*(reject(ad_data) for ad_data in ads), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Ошибка отклонения объявления", exc_info=result)
+    return sum(1 for result in results if not isinstance(result, Exception))
+
+async def run_bulk(ads, approve: bool, moderator_id: int, message: types.Message) -> None:
+    """
+    Пакетное решение по объявлениям с ходом выполнения в сообщении /queue
+    
+    :param ads: Объявления на модерации
+    :param approve: Одобрить (иначе отклонить)
+    :param moderator_id: ID модератора
+    :param message: Сообщение /queue
+    """
+    started = time.monotonic()
+    # Ход выполнения — не чаще раза в 10 постов: чат модерации тоже ограничен 20 сообщениями в минуту
+    step = max(10, len(ads) // 5)
+    
+    async def progress(done, total):
+        if done % step == 0 and done < total:
+            try:
+                await message.edit_text(f"⏳ <b>Публикация: {done} из {total}</b>", parse_mode="HTML")
+            except Exception as e:
+                logger.warning(f"Не удалось обновить ход публикации: {e}")
+    
+    if approve:
+        done = await publish_many(ads, progress)
+        summary = f"✅ <b>Опубликовано {done} из {len(ads)}</b> за {time.monotonic() - started:.0f} с"
+    else:
+        done = await reject_many(ads)
+        summary = f"❌ <b>Отклонено {done} из {len(ads)}</b>"
+    logger.info(f"Модератор {moderator_id}: {summary}")
+    
+    text, keyboard = await render_queue()
+    await message.edit_text(f"{summary}\n\n{text}", reply_markup=keyboard, parse_mode="HTML")
+
+async def close_bulk_jobs() -> None:
+    """Останавливает пакетные решения: текущая публикация дописывается, новые не начинаются"""
+    global bulk_closing
+    bulk_closing = True
+    await asyncio.gather(*bulk_jobs, return_exceptions=True)
@@ -0,0 +1,127 @@
+"""
+Обработчики поиска по объявлениям для телеграм-бота объявлений Fixed Gear Perm.
+"""
+
+import html
+import re
+
+from aiogram import types
+from aiogram.filters import Command, CommandObject
+
+from ..callbacks import SearchPage, get_callback_router
+from ..config import SEARCH_PAGE_SIZE, SEARCH_CANDIDATES, SEARCH_MAX_PAGES
+from ..database import db
+from ..keyboards import get_search_keyboard
+from ..utils import get_category_code, get_category_name, get_post_link
+
+# Начало сообщения с результатами; по нему запрос восстанавливается при листании
+SEARCH_HEADER = "🔎 Поиск: "
+# Больше слов в запросе не нужно, а каждое слово — ещё один проход по индексу
+MAX_WORDS = 8
+
+def register_handlers(dp):
+    """
+    Регистрирует все обработчики модуля
+
+    :param dp: Диспетчер
+    """
+    dp.message.register(cmd_search, Command("search"))
+    get_callback_router(dp).route(SearchPage, search_page)
+
+def parse_search_query(query: str):
+    """
+    Разбирает запрос на слова и категорию
+
+    :param query: Текст запроса, например «рама 56 #продам»
+    :return: (слова в нижнем регистре, код категории или None)
+    """
+    category = None
+    words = []
+    for token in query.split():
+        if token.startswith('#'):
+            category = get_category_code(token) or category
+        else:
+            words.extend(re.findall(r"\w+", token.lower()))
+    return words[:MAX_WORDS], category
+
+async def render_search(query: str, status: str, page: int):
+    """
+    Находит страницу результатов и готовит сообщение
+
+    :param query: Текст запроса
+    :param status: active, sold или all
+    :param page: Номер страницы с нуля
+    :return: (текст, клавиатура)
+    """
+    words, category = parse_search_query(query)
+    header = f"<b>{SEARCH_HEADER}</b>{html.escape(query)}"
+    if not words:
+        return f"{header}\n\n<i>Добавь к хештегу хотя бы одно слово.</i>", None
+
+    # Дальше SEARCH_MAX_PAGES не листаем: OFFSET по ранжированным совпадениям остаётся коротким
+    page = max(0, min(page, SEARCH_MAX_PAGES - 1))
+    # Запрашиваем на одно объявление больше, чтобы знать, есть ли следующая страница
+    ads = await db.search_published_ads(
+        words, category, None if status == 'all' else status,
+        limit=SEARCH_PAGE_SIZE + 1, offset=page * SEARCH_PAGE_SIZE
+    )
+    more = len(ads) > SEARCH_PAGE_SIZE
+    has_next = more and page + 1 < SEARCH_MAX_PAGES
+    ads = ads[:SEARCH_PAGE_SIZE]
+
+    if not ads:
+        text = f"{header}\n\n<i>Ничего не нашлось.</i>" if page == 0 else f"{header}\n\n<i>Больше ничего нет.</i>"
+        return text, get_search_keyboard(status, page, False)
+
+    lines = [header, ""]
+    for number, ad in enumerate(ads, start=page * SEARCH_PAGE_SIZE + 1):
+        title = html.escape(ad['title'] or "Без названия")
+        if ad['channel_message_id'] and ad['channel_chat_id']:
+            title = f"<a href=\"{get_post_link(ad['channel_chat_id'], ad['channel_message_id'])}\">{title}</a>"
+        sold = {'sold': " — <i>продано</i>", 'expired': " — <i>снято</i>"}.get(ad['status'], "")
+        lines.append(f"{number}. {get_category_name(ad['category'])} {title}, {html.escape(ad['price'] or '')}{sold}")
+    if more and not has_next:
+        lines += ["", "<i>Дальше не листается — уточни запрос.</i>"]
+    return "\n".join(lines), get_search_keyboard(status, page, has_next)
+
+async def cmd_search(message: types.Message, command: CommandObject):
+    """
+    Обработчик команды /search <запрос>
+
+    :param message: Сообщение
+    :param command: Команда с аргументами
+    """
+    if not command.args:
+        text = (
+            "🔎 <b>Поиск по объявлениям</b>\n\n"
+            "<i>Напиши, что ищешь, после команды.</i> Хештег категории сузит поиск:\n"
+            "<code>/search рама 56</code>\n"
+            "<code>/search #продам колёса</code>"
+        )
+        if SEARCH_CANDIDATES:
+            text += f"\n\n<i>Ищу среди {SEARCH_CANDIDATES} самых свежих подходящих объявлений.</i>"
+        text += f"\n<i>Показываю до {SEARCH_MAX_PAGES * SEARCH_PAGE_SIZE} результатов ({SEARCH_MAX_PAGES} страниц).</i>"
+        await message.answer(text, parse_mode="HTML")
+        return
+
+    # Запрос должен уместиться в первой строке сообщения с результатами
+    text, keyboard = await render_search(" ".join(command.args.split()), 'active', 0)
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML", disable_web_page_preview=True)
+
+async def search_page(callback: types.CallbackQuery, callback_data: SearchPage):
+    """
+    Обработчик листания результатов и смены фильтра по статусу
+
+    :param callback: Обратный вызов
+    :param callback_data: Данные кнопки
+    """
+    await callback.answer()
+
+    # Запрос не помещается в callback_data (64 байта), поэтому берём его из сообщения
+    first_line = (callback.message.text or "").split("\n", 1)[0]
+    if not first_line.startswith(SEARCH_HEADER):
+        return
+    query = first_line[len(SEARCH_HEADER):]
+
+    text, keyboard = await render_search(query, callback_data.status, callback_data.page)
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML", disable_web_page_preview=True)
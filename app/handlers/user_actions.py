@@ -2,13 +2,20 @@
 Обработчики действий пользователя для телеграм-бота объявлений Fixed Gear Perm.
 """
 
+import html
 import logging
+from typing import Optional
+
 from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command
 
 from ..bot import bot
-from ..config import CHANNEL_ID
-from ..keyboards import get_error_keyboard
+from ..config import CHANNEL_ID, MY_ADS_PAGE_SIZE
+from ..keyboards import get_error_keyboard, get_my_ads_keyboard, get_start_keyboard
+from ..utils import create_ad_text, get_category_name, get_post_link, SOLD_MARK, EXPIRED_MARK
 from ..database import db
+from ..callbacks import Sold, MyAds, MyAdAction, Renew, get_callback_router
 
 logger = logging.getLogger(__name__)
 
@@ -18,132 +25,276 @@ def register_handlers(dp):
     
     :param dp: Диспетчер
     """
+    dp.message.register(cmd_my, Command("my"))
+    router = get_callback_router(dp)
     # Обработчик кнопки "Продано"
-    dp.callback_query.register(mark_as_sold, lambda c: c.data.startswith("sold_"))
+    router.route(Sold, mark_as_sold)
+    router.route(MyAds, my_ads_page)
+    router.route(MyAdAction, my_ad_action)
+    router.route(Renew, renew_ad)
+
+# Статус объявления в списке /my
+MY_AD_STATUSES = {
+    'active': "🟢",
+    'sold': "🔴 <i>продано</i>",
+    'expired': "⚪ <i>снято</i>",
+}
 
-async def mark_as_sold(callback: types.CallbackQuery):
+async def mark_channel_post(ad_id: int, chat_id: int, message_id: int, caption, has_photos: bool,
+                            mark: Optional[str]):
+    """
+    Дописывает метку к посту объявления в канале или убирает её
+    
+    :param ad_id: ID опубликованного объявления
+    :param chat_id: ID канала
+    :param message_id: ID поста в канале
+    :param caption: Сохранённая подпись поста или None
+    :param has_photos: Пост опубликован альбомом (меняется подпись) или текстом
+    :param mark: Метка (SOLD_MARK, EXPIRED_MARK) или None — вернуть исходную подпись
+    """
+    # Подпись поста сохраняется при одобрении; для объявлений, опубликованных
+    # до этого, собираем её заново из данных объявления
+    if caption is None:
+        caption = create_ad_text(await db.get_published_ad(ad_id))
+    
+    new_caption = f"{caption}\n\n{mark}" if mark else caption
+    if has_photos:
+        await bot.edit_message_caption(chat_id=chat_id, message_id=message_id, caption=new_caption, parse_mode="HTML")
+    else:
+        # Объявление без фото опубликовано текстовым сообщением
+        await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=new_caption, parse_mode="HTML")
+
+async def close_ad(ad_id: int, user_id: int, sold: bool, chat_id: int, message_id: Optional[int],
+                   caption, has_photos: bool) -> bool:
+    """
+    Помечает активное объявление проданным или снятым и затем правит пост в канале
+    
+    Статус меняется первым и только у активного объявления, поэтому из
+    одновременных нажатий пост правит ровно одно. Если правка не удалась,
+    объявление возвращается в active, а ошибка пробрасывается дальше.
+    
+    :param ad_id: ID объявления
+    :param user_id: Кто нажал кнопку
+    :param sold: True — «Продано», False — «Снять с публикации»
+    :param chat_id: ID канала
+    :param message_id: ID поста в канале или None
+    :param caption: Сохранённая подпись поста или None
+    :param has_photos: Пост опубликован альбомом
+    :return: False, если объявление уже не активно
+    """
+    status = 'sold' if sold else 'expired'
+    if sold:
+        claimed = await db.mark_ad_as_sold(ad_id, user_id)
+    else:
+        claimed = await db.mark_ad_as_expired(ad_id, user_id)
+    if not claimed:
+        return False
+    if not message_id:
+        return True
+    
+    try:
+        await mark_channel_post(ad_id, chat_id, message_id, caption, has_photos, SOLD_MARK if sold else EXPIRED_MARK)
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            # Метка на посте уже стоит
+            return True
+        await db.reopen_ad(ad_id, status)
+        raise
+    except Exception:
+        await db.reopen_ad(ad_id, status)
+        raise
+    return True
+
+async def mark_as_sold(callback: types.CallbackQuery, callback_data: Sold):
     """
     Обработчик кнопки "Товар обрёл нового владельца"
     
     :param callback: Обратный вызов
+    :param callback_data: Данные кнопки
     """
     await callback.answer()
     
-    # Извлекаем ID сообщения в канале из callback_data
-    message_id = int(callback.data.split("_")[1])
+    # ID сообщения в канале
+    message_id = callback_data.message_id
     
     # Находим объявление в базе данных по ID сообщения в канале
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id FROM published_ads 
-            WHERE channel_message_id = ? AND status = 'active'
-        """, (message_id,))
-        row = cursor.fetchone()
-        
-        if not row:
-            await callback.message.edit_text(
-                "❌ <b>Объявление не найдено или уже продано.</b>",
-                reply_markup=None,
-                parse_mode="HTML"
+    ad = await db.get_published_ad_by_message(message_id)
+    
+    if not ad:
+        await callback.message.edit_text(
+            "❌ <b>Объявление не найдено.</b>",
+            reply_markup=None,
+            parse_mode="HTML"
+        )
+        return
+    
+    try:
+        closed = ad['status'] == 'active' and await close_ad(
+            ad['id'], callback.from_user.id, True, CHANNEL_ID, message_id, ad['caption'], ad['has_photos']
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении поста {message_id} объявления {ad['id']}: {e}")
+        await callback.message.reply(
+            "⚠️ <b>Ошибка при обновлении статуса.</b>\n<i>Попробуй позже или обратись к администратору.</i>",
+            reply_markup=get_error_keyboard(),
+            parse_mode="HTML"
+        )
+        return
+    
+    # Уже помечено как продано или снято с публикации — возможно, соседним нажатием
+    if not closed:
+        ad = await db.get_published_ad_by_message(message_id) or ad
+        await callback.message.edit_text(
+            "ℹ️ <i>Объявление снято с публикации.</i>" if ad['status'] == 'expired' else "ℹ️ <i>Уже помечено как продано.</i>",
+            reply_markup=None,
+            parse_mode="HTML"
+        )
+        return
+    
+    # Отправляем подтверждение пользователю
+    await callback.message.edit_text(
+        "🎉 <b>Поздравляем с продажей!</b>\n\n"
+        "<i>Объявление помечено как</i> <u>«Продано»</u>.",
+        reply_markup=None,
+        parse_mode="HTML"
+    )
+    
+    logger.info(f"Объявление {ad['id']} (сообщение {message_id}) помечено как продано пользователем {callback.from_user.id}")
+
+async def render_my_ads(user_id: int, before_id: int):
+    """
+    Готовит страницу списка своих объявлений
+    
+    :param user_id: ID пользователя
+    :param before_id: ID последнего объявления предыдущей страницы (0 — первая страница)
+    :return: (текст, клавиатура)
+    """
+    # Запрашиваем на одно объявление больше, чтобы знать, есть ли следующая страница
+    ads = await db.get_user_ads(user_id, before_id or None, MY_ADS_PAGE_SIZE + 1)
+    has_next = len(ads) > MY_ADS_PAGE_SIZE
+    ads = ads[:MY_ADS_PAGE_SIZE]
+    
+    if not ads:
+        if before_id:
+            return "📋 <b>Мои объявления</b>\n\n<i>Больше ничего нет.</i>", get_my_ads_keyboard([], before_id, False)
+        return "📋 <b>Мои объявления</b>\n\n<i>Опубликованных объявлений пока нет.</i>", get_start_keyboard()
+    
+    lines = ["📋 <b>Мои объявления</b>", ""]
+    for number, ad in enumerate(ads, start=1):
+        title = html.escape(ad['title'] or "Без названия")
+        if ad['channel_message_id'] and ad['channel_chat_id']:
+            title = f"<a href=\"{get_post_link(ad['channel_chat_id'], ad['channel_message_id'])}\">{title}</a>"
+        # published_at в формате YYYY-MM-DD HH:MM:SS
+        date = ".".join(reversed((ad['published_at'] or "")[:10].split("-")))
+        status = MY_AD_STATUSES.get(ad['status'], ad['status'])
+        lines.append(
+            f"{number}. {status} {get_category_name(ad['category'])} {title}, "
+            f"{html.escape(ad['price'] or '')} · {date}"
+        )
+    return "\n".join(lines), get_my_ads_keyboard(ads, before_id, has_next)
+
+async def cmd_my(message: types.Message):
+    """
+    Обработчик команды /my — список своих объявлений
+    
+    :param message: Сообщение
+    """
+    text, keyboard = await render_my_ads(message.from_user.id, 0)
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML", disable_web_page_preview=True)
+
+async def my_ads_page(callback: types.CallbackQuery, callback_data: MyAds):
+    """
+    Обработчик листания списка /my
+    
+    :param callback: Обратный вызов
+    :param callback_data: Данные кнопки
+    """
+    await callback.answer()
+    text, keyboard = await render_my_ads(callback.from_user.id, callback_data.before_id)
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML", disable_web_page_preview=True)
+
+async def my_ad_action(callback: types.CallbackQuery, callback_data: MyAdAction):
+    """
+    Обработчик кнопок «Продано» и «Снять» в списке /my
+    
+    :param callback: Обратный вызов
+    :param callback_data: Данные кнопки
+    """
+    ad = await db.get_published_ad(callback_data.ad_id)
+    # Кнопки видит только автор, но callback_data можно подделать
+    if not ad or ad['user_id'] != callback.from_user.id:
+        await callback.answer("❌ Объявление не найдено.", show_alert=True)
+        return
+    
+    if callback_data.action == "renew":
+        if await restore_ad(ad):
+            await callback.answer("✅ Объявление снова в каталоге.")
+        else:
+            await callback.answer("ℹ️ Объявление уже не снято с публикации.")
+    elif ad['status'] == 'active':
+        sold = callback_data.action == "sold"
+        try:
+            closed = await close_ad(
+                ad['id'], callback.from_user.id, sold, ad['channel_chat_id'] or CHANNEL_ID,
+                ad['channel_message_id'], ad['caption'], bool(ad['photos'])
             )
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении поста объявления {ad['id']}: {e}")
+            await callback.answer("⚠️ Не удалось обновить пост в канале. Попробуй позже.", show_alert=True)
             return
         
-        ad_id = row['id']
+        if not closed:
+            await callback.answer("ℹ️ Объявление уже не в продаже.")
+        elif sold:
+            await callback.answer("🎉 Поздравляем с продажей!")
+        else:
+            await callback.answer("Объявление снято с публикации.")
+    else:
+        await callback.answer("ℹ️ Объявление уже не в продаже.")
     
-    try:
-        # Простой и надежный способ: получаем сообщение через forward_message
+    # Перерисовываем ту же страницу: у объявления сменился статус и пропали кнопки
+    text, keyboard = await render_my_ads(callback.from_user.id, callback_data.before_id)
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML", disable_web_page_preview=True)
+
+async def restore_ad(ad) -> bool:
+    """
+    Возвращает снятое объявление в каталог и убирает метку с поста
+    
+    :param ad: Объявление автора из get_published_ad
+    :return: False, если объявление не было снято
+    """
+    if not await db.renew_ad(ad['id'], ad['user_id']):
+        return False
+    if ad['channel_message_id']:
         try:
-            # Пересылаем сообщение пользователю (disable_notification=True чтобы не спамить)
-            forwarded_msg = await bot.forward_message(
-                chat_id=callback.from_user.id,
-                from_chat_id=CHANNEL_ID,
-                message_id=message_id,
-                disable_notification=True
-            )
-            
-            # Получаем текущую подпись
-            current_caption = forwarded_msg.caption or ""
-            
-            # Проверяем, не помечено ли уже как продано
-            if "🔴 ОБРЕЛО НОВОГО ВЛАДЕЛЬЦА" in current_caption:
-                # Удаляем пересланное сообщение
-                await bot.delete_message(
-                    chat_id=callback.from_user.id,
-                    message_id=forwarded_msg.message_id
-                )
-                await callback.message.edit_text(
-                    "ℹ️ <i>Уже помечено как продано.</i>",
-                    reply_markup=None,
-                    parse_mode="HTML"
-                )
-                return
-            
-            # Удаляем пересланное сообщение у пользователя
-            await bot.delete_message(
-                chat_id=callback.from_user.id,
-                message_id=forwarded_msg.message_id
+            await mark_channel_post(
+                ad['id'], ad['channel_chat_id'] or CHANNEL_ID, ad['channel_message_id'],
+                ad['caption'], bool(ad['photos']), None
             )
-            
-            # Добавляем метку ПРОДАНО
-            new_caption = f"{current_caption}\n\n🔴 ОБРЕЛО НОВОГО ВЛАДЕЛЬЦА"
-            
-            await bot.edit_message_caption(
-                chat_id=CHANNEL_ID,
-                message_id=message_id,
-                caption=new_caption,
-                parse_mode="HTML"
-            )
-            
-            # Отправляем подтверждение пользователю
-            await callback.message.edit_text(
-                "🎉 <b>Поздравляем с продажей!</b>\n\n"
-                "<i>Объявление помечено как</i> <u>«Продано»</u>.",
-                reply_markup=None,
-                parse_mode="HTML"
-            )
-            
-            # Обновляем статус в базе данных
-            db.mark_ad_as_sold(ad_id, callback.from_user.id)
-            
-            logger.info(f"Объявление {ad_id} (сообщение {message_id}) помечено как продано пользователем {callback.from_user.id}")
-            
-        except Exception as forward_error:
-            logger.error(f"Ошибка при получении сообщения через forward: {forward_error}")
-            
-            # Fallback: просто добавляем метку без получения текущего текста
-            try:
-                await bot.edit_message_caption(
-                    chat_id=CHANNEL_ID,
-                    message_id=message_id,
-                    caption="🔴 ОБРЕЛО НОВОГО ВЛАДЕЛЬЦА",
-                    parse_mode="HTML"
-                )
-                
-                await callback.message.edit_text(
-                    "🎉 <b>Поздравляем с продажей!</b>\n\n"
-                    "<i>Объявление помечено как</i> <u>«Продано»</u>.",
-                    reply_markup=None,
-                    parse_mode="HTML"
-                )
-                
-                # Обновляем статус в базе данных
-                db.mark_ad_as_sold(ad_id, callback.from_user.id)
-                
-                logger.info(f"Объявление {ad_id} (сообщение {message_id}) помечено как продано (fallback)")
-                
-            except Exception as fallback_error:
-                logger.error(f"Ошибка при fallback обновлении {message_id}: {fallback_error}")
-                await callback.message.reply(
-                    "⚠️ <b>Ошибка при обновлении статуса.</b>\n<i>Попробуй позже или обратись к администратору.</i>",
-                    reply_markup=get_error_keyboard(),
-                    parse_mode="HTML"
-                )
+        except TelegramBadRequest as e:
+            # Пост не успели пометить (подпись не изменилась) или его удалили
+            logger.warning(f"Подпись поста объявления {ad['id']} не восстановлена: {e}")
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении поста объявления {ad['id']}: {e}")
+    return True
+
+async def renew_ad(callback: types.CallbackQuery, callback_data: Renew):
+    """
+    Обработчик кнопки «Ещё актуально» под сообщением о снятии объявления
     
-    except Exception as e:
-        logger.error(f"Критическая ошибка при обновлении статуса объявления: {e}")
-        await callback.message.reply(
-            "❌ <b>Произошла ошибка.</b>\n<i>Обратись к администратору.</i>",
-            reply_markup=get_error_keyboard(),
-            parse_mode="HTML"
-        ) 
\ No newline at end of file
+    :param callback: Обратный вызов
+    :param callback_data: Данные кнопки
+    """
+    ad = await db.get_published_ad(callback_data.ad_id)
+    if not ad or ad['user_id'] != callback.from_user.id:
+        await callback.answer("❌ Объявление не найдено.", show_alert=True)
+        return
+    
+    await callback.answer()
+    if await restore_ad(ad):
+        text = "✅ <b>Объявление снова в каталоге.</b>\n\n<i>Срок публикации отсчитывается заново.</i>"
+    elif ad['status'] == 'active':
+        text = "ℹ️ <i>Объявление уже в каталоге.</i>"
+    else:
+        text = "ℹ️ <i>Объявление помечено как проданное.</i>"
+    await callback.message.edit_text(text, reply_markup=None, parse_mode="HTML")
@@ -4,71 +4,164 @@
 
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from .utils import get_post_link
+from .callbacks import (
+    CreateAd, Category, PhotosDone, GoToStart, SendToModeration, Approve, Reject, Sold, SearchPage,
+    MyAds, MyAdAction, Renew, QueueToggle, QueueAction
+)
+
 def get_start_keyboard():
     """Клавиатура для стартового сообщения"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🚲 Создать объявление", callback_data="create_ad")]
+        [InlineKeyboardButton(text="🚲 Создать объявление", callback_data=CreateAd().pack())]
     ])
 
 def get_category_keyboard():
     """Клавиатура для выбора категории объявления"""
     return InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="💰 Продам", callback_data="category_sell"),
-            InlineKeyboardButton(text="🛒 Куплю", callback_data="category_buy")
+            InlineKeyboardButton(text="💰 Продам", callback_data=Category(code="sell").pack()),
+            InlineKeyboardButton(text="🛒 Куплю", callback_data=Category(code="buy").pack())
         ],
         [
-            InlineKeyboardButton(text="🔄 Обмен", callback_data="category_trade"),
-            InlineKeyboardButton(text="⏰ Аренда", callback_data="category_rent")
+            InlineKeyboardButton(text="🔄 Обмен", callback_data=Category(code="trade").pack()),
+            InlineKeyboardButton(text="⏰ Аренда", callback_data=Category(code="rent").pack())
         ],
         [
-            InlineKeyboardButton(text="🎁 Даром", callback_data="category_free"),
-            InlineKeyboardButton(text="🔧 Услуги", callback_data="category_service")
+            InlineKeyboardButton(text="🎁 Даром", callback_data=Category(code="free").pack()),
+            InlineKeyboardButton(text="🔧 Услуги", callback_data=Category(code="service").pack())
         ],
         [
-            InlineKeyboardButton(text="🏁 Гонка", callback_data="category_race"),
-            InlineKeyboardButton(text="🎪 Мероприятие", callback_data="category_event")
+            InlineKeyboardButton(text="🏁 Гонка", callback_data=Category(code="race").pack()),
+            InlineKeyboardButton(text="🎪 Мероприятие", callback_data=Category(code="event").pack())
         ]
     ])
 
 def get_photos_done_keyboard():
     """Клавиатура для завершения загрузки фотографий"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⏩ Дальше", callback_data="photos_done")],
-        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start_command")]
+        [InlineKeyboardButton(text="⏩ Дальше", callback_data=PhotosDone().pack())],
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data=GoToStart().pack())]
     ])
 
 def get_review_keyboard():
     """Клавиатура для предпросмотра объявления"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Отправить на модерацию", callback_data="send_to_moderation")],
-        [InlineKeyboardButton(text="🔄 Начать заново", callback_data="create_ad")],
-        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start_command")]
+        [InlineKeyboardButton(text="✅ Отправить на модерацию", callback_data=SendToModeration().pack())],
+        [InlineKeyboardButton(text="🔄 Начать заново", callback_data=CreateAd().pack())],
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data=GoToStart().pack())]
     ])
 
 def get_moderation_keyboard(ad_id):
     """Клавиатура для модерации объявления"""
     return InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="✅ Одобрить", callback_data=f"approve_{ad_id}"),
-            InlineKeyboardButton(text="❌ Отклонить", callback_data=f"reject_{ad_id}")
+            InlineKeyboardButton(text="✅ Одобрить", callback_data=Approve(ad_id=ad_id).pack()),
+            InlineKeyboardButton(text="❌ Отклонить", callback_data=Reject(ad_id=ad_id).pack())
         ]
     ])
 
 def get_sold_keyboard(channel_msg_id):
     """Клавиатура с кнопкой 'Продано'"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔴 Продано", callback_data=f"sold_{channel_msg_id}")]
+        [InlineKeyboardButton(text="🔴 Продано", callback_data=Sold(message_id=channel_msg_id).pack())]
     ])
 
 def get_create_new_ad_keyboard():
     """Клавиатура для создания нового объявления"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🚲 Создать ещё", callback_data="create_ad")]
+        [InlineKeyboardButton(text="🚲 Создать ещё", callback_data=CreateAd().pack())]
     ])
 
 def get_error_keyboard():
     """Клавиатура для ошибок с кнопкой возврата в главное меню"""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start_command")]
-    ]) 
\ No newline at end of file
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data=GoToStart().pack())]
+    ])
+
+def get_renew_keyboard(ad_id):
+    """Клавиатура с кнопкой возврата снятого объявления в каталог"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 Ещё актуально", callback_data=Renew(ad_id=ad_id).pack())]
+    ])
+
+def get_channel_post_keyboard(chat_id, message_id):
+    """Клавиатура со ссылкой на пост в канале"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📢 Открыть в канале", url=get_post_link(chat_id, message_id))]
+    ])
+
+def get_search_keyboard(status, page, has_next):
+    """Клавиатура результатов поиска: фильтр по статусу и листание страниц"""
+    statuses = [("active", "🟢 В продаже"), ("sold", "🔴 Проданные"), ("all", "Все")]
+    rows = [[
+        InlineKeyboardButton(
+            text=f"• {text} •" if code == status else text,
+            callback_data=SearchPage(status=code, page=0).pack()
+        )
+        for code, text in statuses
+    ]]
+    pages = []
+    if page > 0:
+        pages.append(InlineKeyboardButton(text="◀️ Назад", callback_data=SearchPage(status=status, page=page - 1).pack()))
+    if has_next:
+        pages.append(InlineKeyboardButton(text="Вперёд ▶️", callback_data=SearchPage(status=status, page=page + 1).pack()))
+    if pages:
+        rows.append(pages)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def get_my_ads_keyboard(ads, before_id, has_next):
+    """Клавиатура /my: «Продано» и «Снять» для активных объявлений, «Вернуть» для снятых и листание страниц"""
+    rows = []
+    for number, ad in enumerate(ads, start=1):
+        if ad['status'] == 'expired':
+            rows.append([InlineKeyboardButton(
+                text=f"🔄 Вернуть №{number}",
+                callback_data=MyAdAction(action="renew", ad_id=ad['id'], before_id=before_id).pack()
+            )])
+        if ad['status'] != 'active':
+            continue
+        rows.append([
+            InlineKeyboardButton(
+                text=f"🔴 Продано №{number}",
+                callback_data=MyAdAction(action="sold", ad_id=ad['id'], before_id=before_id).pack()
+            ),
+            InlineKeyboardButton(
+                text=f"⚪ Снять №{number}",
+                callback_data=MyAdAction(action="expire", ad_id=ad['id'], before_id=before_id).pack()
+            )
+        ])
+    pages = []
+    if before_id:
+        pages.append(InlineKeyboardButton(text="⏮ В начало", callback_data=MyAds(before_id=0).pack()))
+    if has_next:
+        pages.append(InlineKeyboardButton(text="Дальше ▶️", callback_data=MyAds(before_id=ads[-1]['id']).pack()))
+    if pages:
+        rows.append(pages)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def get_queue_keyboard(ads, selected, total):
+    """
+    Клавиатура /queue: флажок на каждое объявление и действия над выбранными
+
+    :param ads: Объявления очереди (id, title)
+    :param selected: ID отмеченных объявлений
+    :param total: Всего объявлений в очереди
+    """
+    rows = [
+        [InlineKeyboardButton(
+            text=f"{'☑️' if ad['id'] in selected else '⬜'} №{ad['id']} {ad['title'] or 'Без названия'}"[:60],
+            callback_data=QueueToggle(ad_id=ad['id']).pack()
+        )]
+        for ad in ads
+    ]
+    if selected:
+        rows.append([
+            InlineKeyboardButton(text=f"✅ Одобрить ({len(selected)})", callback_data=QueueAction(action="approve").pack()),
+            InlineKeyboardButton(text=f"❌ Отклонить ({len(selected)})", callback_data=QueueAction(action="reject").pack())
+        ])
+    bottom = [InlineKeyboardButton(text="🔄 Обновить", callback_data=QueueAction(action="refresh").pack())]
+    if total:
+        bottom.insert(0, InlineKeyboardButton(text=f"✅ Одобрить все ({total})", callback_data=QueueAction(action="approve_all").pack()))
+    rows.append(bottom)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -0,0 +1,227 @@
+"""
+Метрики телеграм-бота объявлений Fixed Gear Perm в текстовом формате Prometheus.
+
+Гистограммы времени обработчиков, запросов к БД и вызовов Bot API и счётчики
+ошибок. Запись — поиск корзины и пара сложений под блокировкой, поэтому
+метрики можно не выключать в продакшене. Снимок отдаётся по HTTP на /metrics.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин по умолчанию, с
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    """Форматирует метки: {name="value",...}"""
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """Счётчик с метками"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Увеличивает счётчик"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        """Строки в формате Prometheus"""
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values]
+        return lines
+
+class Histogram:
+    """Гистограмма с метками"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Метки -> [счётчики корзин (не накопительные, последняя — +Inf), сумма]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Записывает наблюдение"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self) -> List[str]:
+        """Строки в формате Prometheus"""
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+handler_latency = Histogram(
+    'bot_handler_duration_seconds', "Время работы обработчика", ['handler']
+)
+handler_errors = Counter(
+    'bot_handler_errors_total', "Исключения в обработчиках", ['handler']
+)
+update_latency = Histogram(
+    'bot_update_duration_seconds', "Время обработки апдейта целиком (фильтры, FSM, обработчик)", ['type']
+)
+db_latency = Histogram(
+    'bot_db_query_duration_seconds', "Время выполнения метода Database в потоке БД", ['method']
+)
+api_latency = Histogram(
+    'bot_api_request_duration_seconds', "Время запроса к Bot API", ['method']
+)
+api_errors = Counter(
+    'bot_api_errors_total', "Ошибки запросов к Bot API", ['method', 'error']
+)
+
+REGISTRY = [handler_latency, handler_errors, update_latency, db_latency, api_latency, api_errors]
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.collect()
+    return '\n'.join(lines) + '\n'
+
+def timed(histogram: Histogram, label: str, func: Callable) -> Callable:
+    """Оборачивает синхронную функцию замером времени"""
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started, label)
+    return wrapper
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешняя мидлварь апдейтов: время обработки апдейта по его типу"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            update_latency.observe(time.perf_counter() - started, event.event_type)
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Мидлварь событий: время и ошибки обработчика по его имени"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        # Имя обработчика известно только после фильтров, поэтому это inner-мидлварь;
+        # для нажатий кнопок — обработчик, найденный маршрутизатором app/callbacks.py
+        route = data.get('callback_route')
+        callback = route.handler.callback if route else data['handler'].callback
+        name = getattr(callback, '__name__', type(callback).__name__)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_latency.observe(time.perf_counter() - started, name)
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """Мидлварь сессии бота: время и ошибки каждой попытки запроса к Bot API"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            api_errors.inc(name, 'retry_after')
+            raise
+        except Exception as e:
+            api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            api_latency.observe(time.perf_counter() - started, name)
+
+def setup_metrics(dispatcher) -> None:
+    """
+    Подключает мидлвари метрик к диспетчеру
+
+    :param dispatcher: Диспетчер
+    """
+    dispatcher.update.outer_middleware(UpdateMetricsMiddleware())
+    middleware = HandlerMetricsMiddleware()
+    for observer in dispatcher.observers.values():
+        if observer.event_name not in ('update', 'error'):
+            observer.middleware(middleware)
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Запускает HTTP-сервер с /metrics
+
+    :param host: Адрес
+    :param port: Порт
+    :return: Runner для остановки через cleanup()
+    """
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
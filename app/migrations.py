@@ -0,0 +1,422 @@
+"""
+Версионные миграции схемы базы данных телеграм-бота объявлений Fixed Gear Perm.
+
+Каждая миграция — это номер версии, описание и SQL-скрипт (или функция,
+принимающая соединение). Применённые версии записываются в таблицу
+schema_version; при запуске выполняются только недостающие, каждая в своей
+транзакции.
+"""
+
+import logging
+import sqlite3
+from typing import Callable, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Migration = Tuple[int, str, Union[str, Callable[[sqlite3.Connection], None]]]
+
+def _execute_all(conn: sqlite3.Connection, script: str) -> None:
+    """Выполняет операторы скрипта по одному: executescript завершил бы транзакцию миграции"""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+    if statement.strip():
+        conn.execute(statement)
+
+def unify_ads(conn: sqlite3.Connection) -> None:
+    """
+    Сводит moderation_ads и published_ads в одну таблицу ads
+    
+    Объявление получает ID своей записи на модерации: этот ID записан в кнопках
+    карточек и в ad_photos. Опубликованная запись находится по ad_photos, а для
+    объявлений, сохранённых до появления ad_photos, — по автору, категории и
+    тексту (первая одобренная запись с тем же содержимым — первой публикации).
+    Публикации без пары становятся новыми объявлениями. Ссылки на посты в
+    канале и карточки модерации переезжают в отдельные таблицы.
+    """
+    _execute_all(conn, """
+        -- Объявление на всех этапах: pending → approved/rejected → active → sold/expired.
+        -- approved — одобрено, пост ещё уходит в канал
+        CREATE TABLE ads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category TEXT,
+            photos TEXT,
+            title TEXT,
+            description TEXT,
+            price TEXT,
+            user_mention TEXT,
+            user_display TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            moderated_at TIMESTAMP,
+            moderator_id INTEGER,
+            moderator_name TEXT,
+            -- Публикация в канале; после возврата в каталог — дата возврата
+            published_at TIMESTAMP,
+            sold_at TIMESTAMP,
+            sold_by_user_id INTEGER,
+            expired_at TIMESTAMP
+        );
+        
+        -- Карточка объявления в чате модерации
+        CREATE TABLE ad_moderation_cards (
+            ad_id INTEGER PRIMARY KEY,
+            chat_id INTEGER,
+            message_id INTEGER
+        );
+        
+        -- Пост объявления в канале и его HTML-подпись для меток «Продано»/«Снято»
+        CREATE TABLE ad_channel_posts (
+            ad_id INTEGER PRIMARY KEY,
+            chat_id INTEGER,
+            message_id INTEGER,
+            caption TEXT
+        );
+        
+        INSERT INTO ads (
+            id, user_id, category, photos, title, description, price, user_mention, user_display,
+            status, created_at, moderated_at, moderator_id, moderator_name
+        )
+        SELECT id, user_id, category, photos, title, description, price, user_mention, user_display,
+               CASE status WHEN 'publishing' THEN 'approved' ELSE coalesce(status, 'pending') END,
+               created_at, moderated_at, moderator_id, moderator_name
+        FROM moderation_ads;
+        
+        INSERT INTO ad_moderation_cards (ad_id, chat_id, message_id)
+        SELECT id, moderation_chat_id, moderation_message_id FROM moderation_ads
+        WHERE moderation_message_id IS NOT NULL;
+        
+        CREATE TEMP TABLE published_ad_ids (
+            published_id INTEGER PRIMARY KEY,
+            ad_id INTEGER NOT NULL
+        );
+        
+        INSERT OR IGNORE INTO published_ad_ids (published_id, ad_id)
+        SELECT published_ad_id, moderation_ad_id FROM ad_photos WHERE published_ad_id IS NOT NULL
+    """)
+    
+    # Остальные публикации — по содержимому, в порядке одобрения
+    candidates = {}
+    for row in conn.execute("""
+        SELECT id, user_id, category, title, description, price FROM moderation_ads
+        WHERE status = 'approved' AND id NOT IN (SELECT ad_id FROM published_ad_ids)
+        ORDER BY id
+    """):
+        candidates.setdefault(tuple(row[1:]), []).append(row[0])
+    unmatched = []
+    for row in conn.execute("""
+        SELECT id, user_id, category, title, description, price FROM published_ads
+        WHERE id NOT IN (SELECT published_id FROM published_ad_ids)
+        ORDER BY id
+    """).fetchall():
+        same = candidates.get(tuple(row[1:]))
+        if same:
+            conn.execute("INSERT INTO published_ad_ids (published_id, ad_id) VALUES (?, ?)", (row[0], same.pop(0)))
+        else:
+            unmatched.append(row[0])
+    for published_id in unmatched:
+        cursor = conn.execute("""
+            INSERT INTO ads (user_id, category, photos, title, description, price, user_mention, user_display, created_at)
+            SELECT user_id, category, photos, title, description, price, user_mention, user_display, created_at
+            FROM published_ads WHERE id = ?
+        """, (published_id,))
+        conn.execute("INSERT INTO published_ad_ids (published_id, ad_id) VALUES (?, ?)", (published_id, cursor.lastrowid))
+    if unmatched:
+        logger.warning(f"Публикаций без записи модерации: {len(unmatched)}, они перенесены как новые объявления")
+    
+    _execute_all(conn, """
+        UPDATE ads SET status = p.status, published_at = p.created_at, sold_at = p.sold_at,
+                       sold_by_user_id = p.sold_by_user_id, expired_at = p.expired_at
+        FROM published_ads p JOIN published_ad_ids m ON m.published_id = p.id
+        WHERE ads.id = m.ad_id;
+        
+        INSERT OR REPLACE INTO ad_channel_posts (ad_id, chat_id, message_id, caption)
+        SELECT m.ad_id, p.channel_chat_id, p.channel_message_id, p.caption
+        FROM published_ads p JOIN published_ad_ids m ON m.published_id = p.id
+        WHERE p.channel_message_id IS NOT NULL;
+        
+        -- Фото и очередь снятия ссылаются на объявление
+        CREATE TABLE ad_photos_new (
+            file_unique_id TEXT NOT NULL,
+            ad_id INTEGER NOT NULL,
+            PRIMARY KEY (file_unique_id, ad_id)
+        ) WITHOUT ROWID;
+        INSERT INTO ad_photos_new (file_unique_id, ad_id) SELECT file_unique_id, moderation_ad_id FROM ad_photos;
+        DROP TABLE ad_photos;
+        ALTER TABLE ad_photos_new RENAME TO ad_photos;
+        
+        CREATE TABLE expiry_queue_new (
+            ad_id INTEGER PRIMARY KEY
+        );
+        INSERT OR IGNORE INTO expiry_queue_new (ad_id)
+        SELECT m.ad_id FROM expiry_queue q JOIN published_ad_ids m ON m.published_id = q.ad_id;
+        DROP TABLE expiry_queue;
+        ALTER TABLE expiry_queue_new RENAME TO expiry_queue;
+        
+        DROP TABLE published_ad_ids;
+        
+        -- Полнотекстовый индекс переезжает на ads; статус берётся из ads при поиске
+        DROP TRIGGER published_ads_fts_insert;
+        DROP TRIGGER published_ads_fts_delete;
+        DROP TRIGGER published_ads_fts_update;
+        DROP TABLE published_ads_fts;
+        DROP VIEW published_ads_fts_content;
+        DROP TABLE moderation_ads;
+        DROP TABLE published_ads;
+        
+        CREATE VIEW ads_fts_content AS
+            SELECT id,
+                   replace(replace(title, 'ё', 'е'), 'Ё', 'Е') AS title,
+                   replace(replace(description, 'ё', 'е'), 'Ё', 'Е') AS description
+            FROM ads;
+        
+        CREATE VIRTUAL TABLE ads_fts USING fts5(
+            title, description,
+            content='ads_fts_content', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        INSERT INTO ads_fts (ads_fts) VALUES ('rebuild');
+        
+        CREATE TRIGGER ads_fts_insert AFTER INSERT ON ads BEGIN
+            INSERT INTO ads_fts (rowid, title, description)
+            SELECT id, title, description FROM ads_fts_content WHERE id = new.id;
+        END;
+        
+        CREATE TRIGGER ads_fts_delete AFTER DELETE ON ads BEGIN
+            INSERT INTO ads_fts (ads_fts, rowid, title, description)
+            VALUES ('delete', old.id,
+                    replace(replace(old.title, 'ё', 'е'), 'Ё', 'Е'),
+                    replace(replace(old.description, 'ё', 'е'), 'Ё', 'Е'));
+        END;
+        
+        CREATE TRIGGER ads_fts_update AFTER UPDATE OF title, description ON ads BEGIN
+            INSERT INTO ads_fts (ads_fts, rowid, title, description)
+            VALUES ('delete', old.id,
+                    replace(replace(old.title, 'ё', 'е'), 'Ё', 'Е'),
+                    replace(replace(old.description, 'ё', 'е'), 'Ё', 'Е'));
+            INSERT INTO ads_fts (rowid, title, description)
+            SELECT id, title, description FROM ads_fts_content WHERE id = new.id;
+        END;
+        
+        -- Очередь модерации по возрасту
+        CREATE INDEX idx_ads_status_created ON ads (status, created_at);
+        
+        -- Каталог категории и снятие устаревших: по ключу (published_at, id), новые сверху
+        CREATE INDEX idx_ads_category_status_published ON ads (category, status, published_at, id);
+        
+        -- То же без категории
+        CREATE INDEX idx_ads_status_published ON ads (status, published_at, id);
+        
+        -- Объявления пользователя в /my
+        CREATE INDEX idx_ads_user_published ON ads (user_id, published_at);
+        
+        -- Кнопка «Продано» под уведомлением знает только ID поста в канале
+        CREATE INDEX idx_ad_channel_posts_message ON ad_channel_posts (message_id)
+    """)
+
+MIGRATIONS: List[Migration] = [
+    (1, "Начальная схема", """
+        -- Таблица для хранения состояния пользователей
+        CREATE TABLE IF NOT EXISTS user_states (
+            user_id INTEGER PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- Таблица для хранения объявлений на модерации
+        CREATE TABLE IF NOT EXISTS moderation_ads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category TEXT,
+            photos TEXT,
+            title TEXT,
+            description TEXT,
+            price TEXT,
+            user_mention TEXT,
+            user_display TEXT,
+            moderation_message_id INTEGER,
+            moderation_chat_id INTEGER,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            moderated_at TIMESTAMP,
+            moderator_id INTEGER
+        );
+
+        -- Таблица для опубликованных объявлений
+        CREATE TABLE IF NOT EXISTS published_ads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category TEXT,
+            photos TEXT,
+            title TEXT,
+            description TEXT,
+            price TEXT,
+            user_mention TEXT,
+            user_display TEXT,
+            channel_message_id INTEGER,
+            channel_chat_id INTEGER,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sold_at TIMESTAMP,
+            sold_by_user_id INTEGER
+        );
+    """),
+    (2, "Индексы для частых запросов", """
+        -- Поиск объявления по кнопке «Продано»
+        CREATE INDEX IF NOT EXISTS idx_published_ads_channel_message
+            ON published_ads (channel_message_id, status);
+
+        -- Объявления пользователя, новые сверху
+        CREATE INDEX IF NOT EXISTS idx_published_ads_user_created
+            ON published_ads (user_id, created_at);
+
+        -- Очередь модерации по статусу и возрасту
+        CREATE INDEX IF NOT EXISTS idx_moderation_ads_status_created
+            ON moderation_ads (status, created_at);
+    """),
+    (3, "Индекс для очистки устаревших состояний FSM", """
+        CREATE INDEX IF NOT EXISTS idx_user_states_updated
+            ON user_states (updated_at);
+    """),
+    (4, "Подпись опубликованного объявления", """
+        -- HTML-подпись поста в канале, чтобы отметка «Продано» не требовала её чтения из Telegram
+        ALTER TABLE published_ads ADD COLUMN caption TEXT;
+    """),
+    (5, "Фото объявлений для поиска повторов", """
+        -- file_unique_id каждого фото объявления; одно и то же фото у разных
+        -- пользователей и в разных сообщениях имеет один file_unique_id
+        CREATE TABLE IF NOT EXISTS ad_photos (
+            file_unique_id TEXT NOT NULL,
+            moderation_ad_id INTEGER NOT NULL,
+            published_ad_id INTEGER,
+            PRIMARY KEY (file_unique_id, moderation_ad_id)
+        ) WITHOUT ROWID;
+
+        -- Привязка фото к опубликованному объявлению при одобрении
+        CREATE INDEX IF NOT EXISTS idx_ad_photos_moderation_ad
+            ON ad_photos (moderation_ad_id);
+    """),
+    (6, "Полнотекстовый поиск по опубликованным объявлениям", """
+        -- Текст для индекса: unicode61 не приравнивает ё к е, поэтому ё заменяется
+        -- здесь и в запросе. Сам текст хранится только в published_ads
+        CREATE VIEW IF NOT EXISTS published_ads_fts_content AS
+            SELECT id,
+                   replace(replace(title, 'ё', 'е'), 'Ё', 'Е') AS title,
+                   replace(replace(description, 'ё', 'е'), 'Ё', 'Е') AS description
+            FROM published_ads;
+
+        -- Индекс FTS5 по заголовку и описанию
+        CREATE VIRTUAL TABLE IF NOT EXISTS published_ads_fts USING fts5(
+            title, description,
+            content='published_ads_fts_content', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        INSERT INTO published_ads_fts (published_ads_fts) VALUES ('rebuild');
+
+        -- Триггеры держат индекс в согласии с таблицей; статус и категория
+        -- берутся из published_ads при поиске, поэтому их смена индекс не трогает
+        CREATE TRIGGER IF NOT EXISTS published_ads_fts_insert AFTER INSERT ON published_ads BEGIN
+            INSERT INTO published_ads_fts (rowid, title, description)
+            SELECT id, title, description FROM published_ads_fts_content WHERE id = new.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS published_ads_fts_delete AFTER DELETE ON published_ads BEGIN
+            INSERT INTO published_ads_fts (published_ads_fts, rowid, title, description)
+            VALUES ('delete', old.id,
+                    replace(replace(old.title, 'ё', 'е'), 'Ё', 'Е'),
+                    replace(replace(old.description, 'ё', 'е'), 'Ё', 'Е'));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS published_ads_fts_update AFTER UPDATE OF title, description ON published_ads BEGIN
+            INSERT INTO published_ads_fts (published_ads_fts, rowid, title, description)
+            VALUES ('delete', old.id,
+                    replace(replace(old.title, 'ё', 'е'), 'Ё', 'Е'),
+                    replace(replace(old.description, 'ё', 'е'), 'Ё', 'Е'));
+            INSERT INTO published_ads_fts (rowid, title, description)
+            SELECT id, title, description FROM published_ads_fts_content WHERE id = new.id;
+        END;
+    """),
+    (7, "Индексы каталога для инлайн-режима", """
+        -- Листание активных объявлений категории по ключу (created_at, id), новые сверху
+        CREATE INDEX IF NOT EXISTS idx_published_ads_category_status_created
+            ON published_ads (category, status, created_at, id);
+
+        -- То же без категории
+        CREATE INDEX IF NOT EXISTS idx_published_ads_status_created
+            ON published_ads (status, created_at, id);
+    """),
+    (8, "Автоматическое снятие устаревших объявлений", """
+        ALTER TABLE published_ads ADD COLUMN expired_at TIMESTAMP;
+
+        -- Снятые объявления, пост которых ещё не помечен в канале. Строка
+        -- добавляется в той же транзакции, что и смена статуса, и удаляется
+        -- после правки поста, поэтому после перезапуска очередь дорабатывается
+        CREATE TABLE IF NOT EXISTS expiry_queue (
+            ad_id INTEGER PRIMARY KEY
+        );
+    """),
+    (9, "Имя модератора, забравшего объявление", """
+        -- Опоздавшему модератору отвечаем, кто уже взял объявление
+        ALTER TABLE moderation_ads ADD COLUMN moderator_name TEXT;
+    """),
+    (10, "Единая таблица объявлений ads", unify_ads),
+    (11, "Текст карточки модерации", """
+        -- HTML-текст карточки, чтобы решение через /queue дописывалось к нему, как решение кнопкой
+        ALTER TABLE ad_moderation_cards ADD COLUMN text TEXT;
+    """),
+]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Возвращает номер последней применённой миграции"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def migrate(conn: sqlite3.Connection, migrations: List[Migration] = MIGRATIONS) -> int:
+    """
+    Применяет недостающие миграции
+    
+    :param conn: Соединение с БД (для записи)
+    :param migrations: Список миграций по возрастанию версии
+    :return: Количество применённых миграций
+    """
+    current = get_schema_version(conn)
+    conn.commit()
+    applied = 0
+
+    for version, description, migration in migrations:
+        if version <= current:
+            continue
+
+        try:
+            if callable(migration):
+                conn.execute("BEGIN")
+                migration(conn)
+            else:
+                # executescript сам завершает открытую транзакцию, поэтому BEGIN внутри скрипта
+                conn.executescript(f"BEGIN;\n{migration}")
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Не удалось применить миграцию {version}: {description}")
+            raise
+
+        applied += 1
+        logger.info(f"Применена миграция {version}: {description}")
+
+    return applied
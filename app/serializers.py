@@ -0,0 +1,199 @@
+"""
+Форматы данных FSM в user_states.data для телеграм-бота объявлений Fixed Gear Perm.
+
+json — текст, как раньше; packed — поля мастера AdStates, упакованные struct;
+msgpack — пакет msgpack (ставится отдельно). Двоичные форматы хранятся как
+BLOB и начинаются с байта формата, поэтому loads читает строку любого формата
+независимо от FSM_SERIALIZER: после переключения старые строки не мигрируют,
+а перезаписываются при следующем шаге мастера.
+"""
+
+import json
+import struct
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Первый байт двоичной строки
+TAG_PACKED = 1
+TAG_MSGPACK = 2
+
+_HEADER = struct.Struct('<BH')  # Формат, маска упакованных полей
+_COUNT = struct.Struct('<B')
+_LENGTH = struct.Struct('<H')
+_INT = struct.Struct('<q')
+_EXTRA_LENGTH = struct.Struct('<I')
+
+# Поля мастера AdStates в порядке битов маски: (ключ, тип)
+AD_FIELDS = (
+    ('category', 'str'),
+    ('photos', 'list'),
+    ('photo_uids', 'list'),
+    ('title', 'str'),
+    ('description', 'str'),
+    ('price', 'str'),
+    ('user_id', 'int'),
+    ('user_mention', 'str'),
+    ('user_display', 'str'),
+)
+# Бит остальных ключей: они идут в конце одним JSON
+_EXTRA_BIT = 1 << 15
+
+def _pack_str(value: Any) -> Optional[bytes]:
+    """Строка: длина и UTF-8; None, если значение не строка или не помещается"""
+    if type(value) is not str:
+        return None
+    encoded = value.encode('utf-8')
+    if len(encoded) > 0xFFFF:
+        return None
+    return _LENGTH.pack(len(encoded)) + encoded
+
+def _pack_list(value: Any) -> Optional[bytes]:
+    """Список строк (file_id фото): число элементов и строки"""
+    if type(value) is not list or len(value) > 0xFF:
+        return None
+    parts = [_COUNT.pack(len(value))]
+    for item in value:
+        packed = _pack_str(item)
+        if packed is None:
+            return None
+        parts.append(packed)
+    return b''.join(parts)
+
+def _pack_int(value: Any) -> Optional[bytes]:
+    """Целое в 8 байтах"""
+    if type(value) is not int or not -2 ** 63 <= value < 2 ** 63:
+        return None
+    return _INT.pack(value)
+
+def _unpack_str(buffer: bytes, offset: int) -> Tuple[str, int]:
+    """Строка и смещение за ней"""
+    length, = _LENGTH.unpack_from(buffer, offset)
+    offset += _LENGTH.size
+    return buffer[offset:offset + length].decode('utf-8'), offset + length
+
+def _unpack_list(buffer: bytes, offset: int) -> Tuple[list, int]:
+    """Список строк и смещение за ним"""
+    count, = _COUNT.unpack_from(buffer, offset)
+    offset += _COUNT.size
+    items = []
+    for _ in range(count):
+        item, offset = _unpack_str(buffer, offset)
+        items.append(item)
+    return items, offset
+
+def _unpack_int(buffer: bytes, offset: int) -> Tuple[int, int]:
+    """Целое и смещение за ним"""
+    return _INT.unpack_from(buffer, offset)[0], offset + _INT.size
+
+_PACKERS: Dict[str, Callable[[Any], Optional[bytes]]] = {'str': _pack_str, 'list': _pack_list, 'int': _pack_int}
+_UNPACKERS = {'str': _unpack_str, 'list': _unpack_list, 'int': _unpack_int}
+_FIELDS = [(1 << bit, key, _PACKERS[kind], _UNPACKERS[kind]) for bit, (key, kind) in enumerate(AD_FIELDS)]
+_KNOWN = frozenset(key for key, _ in AD_FIELDS)
+
+class JsonSerializer:
+    """JSON-текст: слияние данных выполняет SQLite (json_set)"""
+    name = 'json'
+
+    def dumps(self, data: Dict[str, Any]) -> str:
+        """Значение для user_states.data"""
+        return json.dumps(data, ensure_ascii=False)
+
+class PackedSerializer:
+    """
+    Поля мастера AdStates через struct: маска полей и значения без ключей
+
+    Ключи не из AD_FIELDS и значения неожиданного типа (None вместо списка,
+    строка длиннее 64 КиБ) сохраняются без потерь в JSON-хвосте строки.
+    """
+    name = 'packed'
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        """Значение для user_states.data"""
+        mask = 0
+        parts = []
+        extra = {}
+        for bit, key, pack, _ in _FIELDS:
+            if key in data:
+                packed = pack(data[key])
+                if packed is None:
+                    extra[key] = data[key]
+                else:
+                    mask |= bit
+                    parts.append(packed)
+        for key, value in data.items():
+            if key not in _KNOWN:
+                extra[key] = value
+        if extra:
+            mask |= _EXTRA_BIT
+            encoded = json.dumps(extra, ensure_ascii=False).encode('utf-8')
+            parts.append(_EXTRA_LENGTH.pack(len(encoded)) + encoded)
+        return _HEADER.pack(TAG_PACKED, mask) + b''.join(parts)
+
+    @staticmethod
+    def loads(buffer: bytes) -> Dict[str, Any]:
+        """Данные из значения dumps"""
+        _, mask = _HEADER.unpack_from(buffer)
+        offset = _HEADER.size
+        data = {}
+        for bit, key, _, unpack in _FIELDS:
+            if mask & bit:
+                data[key], offset = unpack(buffer, offset)
+        if mask & _EXTRA_BIT:
+            length, = _EXTRA_LENGTH.unpack_from(buffer, offset)
+            offset += _EXTRA_LENGTH.size
+            data.update(json.loads(buffer[offset:offset + length].decode('utf-8')))
+        return data
+
+class MsgpackSerializer:
+    """msgpack: любые данные, которые понимает JSON"""
+    name = 'msgpack'
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("FSM_SERIALIZER=msgpack: установите пакет msgpack (pip install msgpack)")
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        """Значение для user_states.data"""
+        return bytes((TAG_MSGPACK,)) + msgpack.packb(data, use_bin_type=True)
+
+    @staticmethod
+    def loads(buffer: bytes) -> Dict[str, Any]:
+        """Данные из значения dumps"""
+        if msgpack is None:
+            raise RuntimeError("Данные FSM сохранены в msgpack: установите пакет msgpack (pip install msgpack)")
+        return msgpack.unpackb(buffer[1:], raw=False)
+
+SERIALIZERS = {
+    'json': JsonSerializer,
+    'packed': PackedSerializer,
+    'msgpack': MsgpackSerializer,
+}
+
+Serializer = Union[JsonSerializer, PackedSerializer, MsgpackSerializer]
+
+def get_serializer(name: str) -> Serializer:
+    """
+    Сериализатор по имени из FSM_SERIALIZER
+
+    :param name: json, packed или msgpack
+    """
+    try:
+        return SERIALIZERS[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестный FSM_SERIALIZER: {name} (доступны: {', '.join(SERIALIZERS)})") from None
+
+def loads(value: Union[str, bytes, None]) -> Dict[str, Any]:
+    """Данные FSM из строки user_states.data любого формата"""
+    if not value:
+        return {}
+    if isinstance(value, str):
+        return json.loads(value)
+    if value[0] == TAG_PACKED:
+        return PackedSerializer.loads(value)
+    if value[0] == TAG_MSGPACK:
+        return MsgpackSerializer.loads(value)
+    raise ValueError(f"Неизвестный формат данных FSM: {value[0]}")
@@ -1,62 +1,260 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import copy
+import logging
+import time
+from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from .config import FSM_CACHE_SIZE, FSM_CACHE_TTL, FSM_FLUSH_INTERVAL
 from .database import db
-import json
+
+logger = logging.getLogger(__name__)
+
+# Пометка пользователя без сохранённого состояния
+_EMPTY = {'state': None, 'data': {}}
+
+def _state_name(state: StateType) -> Optional[str]:
+    """Приводит состояние к строке"""
+    if state is None:
+        return None
+    return state.state if hasattr(state, 'state') else str(state)
+
+async def set_state_and_data(state: FSMContext, new_state: StateType, **data) -> Dict[str, Any]:
+    """
+    Дополняет данные и устанавливает состояние FSM одной записью
+    
+    :param state: Состояние FSM обработчика
+    :param new_state: Новое состояние
+    :param data: Данные для слияния с текущими
+    :return: Данные после слияния
+    """
+    return await state.storage.set_state_and_data(state.key, new_state, data)
+
+async def append_data(state: FSMContext, limit: int, **data) -> Tuple[int, Dict[str, Any]]:
+    """
+    Атомарно дописывает элементы в списки данных FSM, не больше limit в каждом
+    
+    :param state: Состояние FSM обработчика
+    :param limit: Наибольшая длина списка
+    :param data: Ключ -> новые элементы (списки одной длины, предел — по первому)
+    :return: Сколько элементов дописано и данные после записи
+    """
+    return await state.storage.append_data(state.key, data, limit)
 
 class DatabaseStorage(BaseStorage):
-    """Кастомное хранилище FSM на основе базы данных"""
+    """Кастомное хранилище FSM на основе базы данных: каждая операция — один атомарный запрос"""
     
     async def set_state(self, key: StorageKey, state: StateType = None) -> None:
         """Устанавливает состояние"""
-        user_id = key.user_id
-        current_data = db.get_user_state(user_id) or {'data': {}}
-        
         if state is None:
             # Очищаем состояние
-            db.clear_user_state(user_id)
+            await db.clear_user_state(key.user_id)
         else:
-            # Обновляем состояние
-            current_data['state'] = state.state if hasattr(state, 'state') else str(state)
-            db.save_user_state(user_id, current_data['state'], current_data['data'])
+            await db.set_user_state(key.user_id, _state_name(state))
     
     async def get_state(self, key: StorageKey) -> Optional[str]:
         """Получает состояние"""
-        user_id = key.user_id
-        state_data = db.get_user_state(user_id)
+        state_data = await db.get_user_state(key.user_id)
         return state_data['state'] if state_data else None
     
     async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
         """Устанавливает данные"""
-        user_id = key.user_id
-        current_state = db.get_user_state(user_id)
-        state = current_state['state'] if current_state else None
-        
-        db.save_user_state(user_id, state, data)
+        await db.set_user_data(key.user_id, data)
     
     async def get_data(self, key: StorageKey) -> Dict[str, Any]:
         """Получает данные"""
-        user_id = key.user_id
-        state_data = db.get_user_state(user_id)
+        state_data = await db.get_user_state(key.user_id)
         return state_data['data'] if state_data else {}
     
     async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
         """Обновляет данные"""
-        user_id = key.user_id
-        current_state = db.get_user_state(user_id)
-        state = current_state['state'] if current_state else None
-        current_data = current_state['data'] if current_state else {}
-        
-        # Обновляем данные
-        current_data.update(data)
-        
-        db.save_user_state(user_id, state, current_data)
-        return current_data
+        return await db.merge_user_data(key.user_id, data)
+    
+    async def set_state_and_data(self, key: StorageKey, state: StateType,
+                                 data: Dict[str, Any]) -> Dict[str, Any]:
+        """Дополняет данные и устанавливает состояние"""
+        return await db.merge_user_data(key.user_id, data, _state_name(state))
+    
+    async def append_data(self, key: StorageKey, data: Dict[str, List[Any]],
+                          limit: int) -> Tuple[int, Dict[str, Any]]:
+        """Дописывает элементы в списки данных"""
+        return await db.append_user_data(key.user_id, data, limit)
     
     async def clear(self, key: StorageKey) -> None:
         """Очищает состояние и данные"""
-        user_id = key.user_id
-        db.clear_user_state(user_id)
+        await db.clear_user_state(key.user_id)
 
     async def close(self) -> None:
         """Закрывает хранилище (совместимость с интерфейсом BaseStorage)"""
         return None
+
+class CachedDatabaseStorage(DatabaseStorage):
+    """
+    Хранилище FSM на основе базы данных с кэшем в памяти.
+
+    Состояния пользователей держатся в LRU-кэше с TTL, а изменения копятся
+    и сбрасываются в БД одной транзакцией раз в FSM_FLUSH_INTERVAL мс и при
+    остановке бота. При аварийном завершении теряется не больше одного окна.
+    """
+
+    def __init__(self, cache_size: int = FSM_CACHE_SIZE, cache_ttl: float = FSM_CACHE_TTL,
+                 flush_interval: int = FSM_FLUSH_INTERVAL):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval / 1000
+        # user_id -> (время последнего обращения, {'state': ..., 'data': ...})
+        self._cache: "OrderedDict[int, tuple]" = OrderedDict()
+        # user_id -> запись для сохранения или None для удаления
+        self._dirty: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def _load(self, user_id: int) -> Dict[str, Any]:
+        """Возвращает запись пользователя из кэша, при промахе читает из БД"""
+        cached = self._cache.get(user_id)
+        now = time.monotonic()
+        if cached and (user_id in self._dirty or now - cached[0] < self.cache_ttl):
+            self._cache.move_to_end(user_id)
+            self._cache[user_id] = (now, cached[1])
+            return cached[1]
+
+        record = await db.get_user_state(user_id) or _EMPTY
+        # Пока шло чтение, запись могла обновиться — она свежее БД
+        if user_id in self._cache and self._cache[user_id] is not cached:
+            return self._cache[user_id][1]
+        self._cache[user_id] = (now, record)
+        self._cache.move_to_end(user_id)
+        self._evict()
+        return record
+
+    async def _store(self, user_id: int, record: Dict[str, Any]) -> None:
+        """Кладёт запись в кэш и ставит её в очередь на запись"""
+        self._cache[user_id] = (time.monotonic(), record)
+        self._cache.move_to_end(user_id)
+        self._dirty[user_id] = record if record['state'] is not None or record['data'] else None
+
+        if not self.flush_interval:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+        self._evict()
+
+    def _evict(self) -> None:
+        """Вытесняет давно не использованные и устаревшие записи, кроме несохранённых"""
+        now = time.monotonic()
+        victims = []
+        # Записи упорядочены по времени обращения: достаточно пройти от самых старых
+        for user_id, (used, _) in self._cache.items():
+            if len(self._cache) - len(victims) <= self.cache_size and now - used < self.cache_ttl:
+                break
+            if user_id not in self._dirty:
+                victims.append(user_id)
+        for user_id in victims:
+            del self._cache[user_id]
+
+    async def _flush_later(self) -> None:
+        """Сбрасывает изменения по истечении окна записи, пока они появляются"""
+        while self._dirty:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Записывает все накопленные изменения одной транзакцией"""
+        # Сбросы идут строго по очереди, чтобы старый пакет не перезаписал новый
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+
+            batch, self._dirty = self._dirty, {}
+            saved = [
+                (user_id, record['state'], record['data'])
+                for user_id, record in batch.items() if record is not None
+            ]
+            cleared = [user_id for user_id, record in batch.items() if record is None]
+            try:
+                await db.apply_user_states(saved, cleared)
+            except Exception as e:
+                logger.error(f"Не удалось сохранить состояния FSM ({len(batch)} шт.): {e}")
+                # Возвращаем в очередь то, что не успело обновиться заново
+                for user_id, record in batch.items():
+                    self._dirty.setdefault(user_id, record)
+                return
+            self._evict()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        """Устанавливает состояние"""
+        user_id = key.user_id
+
+        if state is None:
+            # Очищаем состояние
+            await self._store(user_id, _EMPTY)
+        else:
+            # Обновляем состояние
+            current = await self._load(user_id)
+            await self._store(user_id, {'state': _state_name(state), 'data': current['data']})
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        """Получает состояние"""
+        return (await self._load(key.user_id))['state']
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        """Устанавливает данные"""
+        user_id = key.user_id
+        current = await self._load(user_id)
+        await self._store(user_id, {'state': current['state'], 'data': copy.deepcopy(data)})
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        """Получает данные"""
+        # Копия, чтобы изменения в обработчике не попадали в кэш в обход update_data
+        return copy.deepcopy((await self._load(key.user_id))['data'])
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Обновляет данные"""
+        user_id = key.user_id
+        current = await self._load(user_id)
+
+        # Обновляем данные
+        current_data = {**current['data'], **copy.deepcopy(data)}
+
+        await self._store(user_id, {'state': current['state'], 'data': current_data})
+        return copy.deepcopy(current_data)
+
+    async def set_state_and_data(self, key: StorageKey, state: StateType,
+                                 data: Dict[str, Any]) -> Dict[str, Any]:
+        """Дополняет данные и устанавливает состояние"""
+        user_id = key.user_id
+        current = await self._load(user_id)
+        current_data = {**current['data'], **copy.deepcopy(data)}
+
+        await self._store(user_id, {'state': _state_name(state), 'data': current_data})
+        return copy.deepcopy(current_data)
+
+    async def append_data(self, key: StorageKey, data: Dict[str, List[Any]],
+                          limit: int) -> Tuple[int, Dict[str, Any]]:
+        """Дописывает элементы в списки данных"""
+        user_id = key.user_id
+        # Между чтением из кэша и записью в него нет await: одновременные вызовы не теряют друг друга
+        current = await self._load(user_id)
+        first = next(iter(data))
+        accepted = max(0, min(limit - len(current['data'].get(first) or []), len(data[first])))
+        if not accepted:
+            return 0, copy.deepcopy(current['data'])
+        current_data = {
+            **current['data'],
+            **{k: (current['data'].get(k) or []) + copy.deepcopy(items[:accepted]) for k, items in data.items()}
+        }
+
+        await self._store(user_id, {'state': current['state'], 'data': current_data})
+        return accepted, copy.deepcopy(current_data)
+
+    async def clear(self, key: StorageKey) -> None:
+        """Очищает состояние и данные"""
+        await self._store(key.user_id, _EMPTY)
+
+    async def close(self) -> None:
+        """Сбрасывает несохранённые состояния в БД"""
+        # Сначала сброс: отмена посреди записи потеряла бы уже снятый пакет
+        await self.flush()
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
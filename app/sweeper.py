@@ -0,0 +1,59 @@
+"""
+Фоновая очистка брошенных состояний FSM для телеграм-бота объявлений Fixed Gear Perm.
+
+Пользователи, бросившие мастер на полпути, оставляют строки в user_states.
+Очистка удаляет их небольшими пакетами, чтобы не держать блокировку записи
+долго, и при желании возвращает освободившиеся страницы ОС.
+"""
+
+import asyncio
+import logging
+
+from .config import STATE_TTL, SWEEPER_INTERVAL, SWEEPER_BATCH_SIZE, SWEEPER_VACUUM_PAGES
+from .database import db
+
+logger = logging.getLogger(__name__)
+
+# Счётчики с момента запуска
+stats = {'reclaimed_rows': 0, 'freed_pages': 0}
+
+async def sweep_stale_states(ttl: int = STATE_TTL, batch_size: int = SWEEPER_BATCH_SIZE) -> int:
+    """
+    Удаляет все устаревшие состояния пакетами
+    
+    :param ttl: Сколько секунд состояние может не обновляться
+    :param batch_size: Строк за одно удаление
+    :return: Количество удалённых строк
+    """
+    reclaimed = 0
+    while True:
+        deleted = await db.delete_stale_user_states(ttl, batch_size)
+        reclaimed += deleted
+        if deleted < batch_size:
+            return reclaimed
+        # Между пакетами даём записать состояния активным пользователям
+        await asyncio.sleep(0)
+
+async def run_sweeper(interval: int = SWEEPER_INTERVAL, vacuum_pages: int = SWEEPER_VACUUM_PAGES):
+    """
+    Периодически очищает устаревшие состояния
+    
+    :param interval: Секунд между проходами
+    :param vacuum_pages: Страниц incremental_vacuum за проход (0 — не освобождать)
+    """
+    while True:
+        try:
+            reclaimed = await sweep_stale_states()
+            stats['reclaimed_rows'] += reclaimed
+            if reclaimed:
+                logger.info(f"Удалено устаревших состояний FSM: {reclaimed}")
+
+            if vacuum_pages:
+                freed = await db.incremental_vacuum(vacuum_pages)
+                stats['freed_pages'] += freed
+                if freed:
+                    logger.info(f"Возвращено ОС страниц БД: {freed}")
+        except Exception as e:
+            logger.error(f"Ошибка очистки состояний FSM: {e}")
+
+        await asyncio.sleep(interval)
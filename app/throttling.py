@@ -0,0 +1,181 @@
+"""
+Ограничение частоты исходящих запросов к Bot API для телеграм-бота объявлений Fixed Gear Perm.
+
+Telegram допускает около 30 сообщений в секунду на бота, около 20 в минуту
+на группу или канал и около одного в секунду в личный чат. Вместо ошибок 429
+запросы встают в очередь к корзинам токенов (общей и на каждый чат), а
+ответ RetryAfter приостанавливает корзину чата и общую и повторяет запрос
+автоматически. Корзины групп и каналов маленькие (RATE_LIMIT_GROUP_BURST):
+с полной корзиной на 20 сообщений в первую минуту ушло бы около 40.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMediaGroup, TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from .config import (
+    RATE_LIMIT_GLOBAL, RATE_LIMIT_GROUP, RATE_LIMIT_GROUP_BURST, RATE_LIMIT_PRIVATE,
+    RATE_LIMIT_PRIVATE_BURST, RATE_LIMIT_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Корзина токенов с очередью ожидающих в порядке поступления"""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: Токенов в секунду
+        :param capacity: Максимальный запас токенов (размер всплеска)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Начисляет токены за прошедшее время"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Приостанавливает выдачу токенов (после RetryAfter)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    @property
+    def idle(self) -> bool:
+        """Корзина полна и никто не ждёт — её можно забыть"""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """
+        Забирает токены, дожидаясь их при необходимости.
+        Если нужно больше, чем вмещает корзина (альбом), ждёт полную корзину и
+        уходит в минус: следующие запросы ждут, пока долг не погасится.
+
+        :param tokens: Сколько токенов нужно
+        :return: Сколько секунд пришлось ждать
+        """
+        needed = min(tokens, self.capacity)
+        waited = 0.0
+        # Ожидающие обслуживаются по очереди, чтобы не было голодания
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self.blocked_until - now
+                if delay <= 0:
+                    if self.tokens >= needed:
+                        self.tokens -= tokens
+                        return waited
+                    delay = (needed - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Мидлварь сессии бота: общая корзина и корзины на каждый чат"""
+
+    # Сколько корзин чатов держать, прежде чем забывать простаивающие
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self, global_rate: float = RATE_LIMIT_GLOBAL, group_per_minute: float = RATE_LIMIT_GROUP,
+                 group_burst: float = RATE_LIMIT_GROUP_BURST, private_rate: float = RATE_LIMIT_PRIVATE,
+                 private_burst: float = RATE_LIMIT_PRIVATE_BURST, max_retries: int = RATE_LIMIT_MAX_RETRIES):
+        """
+        :param global_rate: Сообщений в секунду на бота
+        :param group_per_minute: Сообщений в минуту в группу или канал
+        :param group_burst: Сообщений подряд в группу или канал
+        :param private_rate: Сообщений в секунду в личный чат
+        :param private_burst: Сообщений подряд в личный чат
+        :param max_retries: Сколько раз повторять запрос после RetryAfter
+        """
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.group_per_minute = group_per_minute
+        self.group_burst = group_burst
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.max_retries = max_retries
+        self.chat_buckets: Dict[str, TokenBucket] = {}
+        # Счётчики с момента запуска
+        self.stats = {
+            'requests': 0,
+            'throttled_requests': 0,
+            'wait_seconds': 0.0,
+            'retry_after': 0,
+        }
+
+    def split(self, parts: int, reserved_per_minute: float = 0.0) -> None:
+        """
+        Делит общие лимиты между parts процессами (личные чаты закреплены за одним процессом)
+
+        :param parts: Число процессов
+        :param reserved_per_minute: Сообщений в минуту в канал, которые отправляет главный процесс
+        """
+        rate = self.global_bucket.rate / parts
+        self.global_bucket = TokenBucket(rate, max(1.0, rate))
+        self.group_per_minute = max(1.0, self.group_per_minute - reserved_per_minute) / parts
+        self.group_burst /= parts
+        self.chat_buckets.clear()
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        """Возвращает корзину чата, создавая её при первом обращении"""
+        key = str(chat_id)
+        bucket = self.chat_buckets.get(key)
+        if bucket is None:
+            if len(self.chat_buckets) >= self.MAX_CHAT_BUCKETS:
+                for stale in [k for k, b in self.chat_buckets.items() if b.idle]:
+                    del self.chat_buckets[stale]
+            # Отрицательные ID и @username — группы и каналы
+            if key.startswith(('-', '@')):
+                bucket = TokenBucket(self.group_per_minute / 60, max(1.0, min(self.group_burst, self.group_per_minute)))
+            else:
+                bucket = TokenBucket(self.private_rate, self.private_burst)
+            self.chat_buckets[key] = bucket
+        return bucket
+
+    async def _acquire(self, chat_bucket: TokenBucket, tokens: int) -> None:
+        """Дожидается места в корзине чата, затем в общей"""
+        waited = await chat_bucket.acquire(tokens)
+        waited += await self.global_bucket.acquire(tokens)
+        if waited:
+            self.stats['throttled_requests'] += 1
+            self.stats['wait_seconds'] += waited
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id: Optional[Union[int, str]] = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            # Служебные запросы (getUpdates, answerCallbackQuery и т.п.) не ограничиваем
+            return await make_request(bot, method)
+
+        self.stats['requests'] += 1
+        # Альбом Telegram считает несколькими сообщениями
+        tokens = len(method.media) if isinstance(method, SendMediaGroup) else 1
+        chat_bucket = self._chat_bucket(chat_id)
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_bucket, tokens)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.stats['retry_after'] += 1
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"RetryAfter {e.retry_after} с для {method.__api_method__} в чат {chat_id}")
+                # Ограничение может быть и общим на бота: приостанавливаем обе корзины
+                chat_bucket.pause(e.retry_after)
+                self.global_bucket.pause(e.retry_after)
@@ -3,10 +3,27 @@
 """
 
 import logging
+from datetime import datetime, timezone
 from aiogram.types import InputMediaPhoto
 
 logger = logging.getLogger(__name__)
 
+# Коды категорий и их хештеги
+CATEGORIES = {
+    "sell": "#продам",
+    "buy": "#куплю", 
+    "trade": "#обмен",
+    "rent": "#аренда",
+    "free": "#даром",
+    "service": "#услуги",
+    "race": "#гонка",
+    "event": "#мероприятие"
+}
+
+# Метки, которые дописываются к посту в канале
+SOLD_MARK = "🔴 ОБРЕЛО НОВОГО ВЛАДЕЛЬЦА"
+EXPIRED_MARK = "⚪ СНЯТО С ПУБЛИКАЦИИ"
+
 def get_category_name(category_code: str) -> str:
     """
     Получает название категории по коду
@@ -14,17 +31,20 @@ def get_category_name(category_code: str) -> str:
     :param category_code: Код категории
     :return: Название категории с хештегом
     """
-    categories = {
-        "sell": "#продам",
-        "buy": "#куплю", 
-        "trade": "#обмен",
-        "rent": "#аренда",
-        "free": "#даром",
-        "service": "#услуги",
-        "race": "#гонка",
-        "event": "#мероприятие"
-    }
-    return categories.get(category_code, "#другое")
+    return CATEGORIES.get(category_code, "#другое")
+
+def get_category_code(hashtag: str):
+    """
+    Получает код категории по хештегу
+    
+    :param hashtag: Хештег (#продам, регистр не важен)
+    :return: Код категории или None
+    """
+    hashtag = hashtag.lower()
+    for code, name in CATEGORIES.items():
+        if name == hashtag:
+            return code
+    return None
 
 def format_price(price_text: str) -> str:
     """
@@ -89,6 +109,29 @@ def create_ad_text(data, is_moderation=False):
 
     return text
 
+def create_duplicates_text(duplicates, user_id):
+    """
+    Создает предупреждение о повторе для карточки модерации
+    
+    :param duplicates: Более ранние объявления с теми же фото (из find_ads_with_photos)
+    :param user_id: ID автора нового объявления
+    :return: Текст предупреждения
+    """
+    statuses = {
+        "pending": "на модерации",
+        "approved": "одобрено",
+        "rejected": "отклонено",
+        "active": "в канале",
+        "sold": "продано",
+        "expired": "снято"
+    }
+    lines = ["⚠️ <b>Фото уже были в объявлениях:</b>"]
+    for ad in duplicates:
+        status = statuses.get(ad['status'], ad['status'])
+        author = "" if ad['user_id'] == user_id else ", <b>другой автор</b>"
+        lines.append(f"• #{ad['id']} от {str(ad['created_at'])[:10]} — {status}, общих фото: {ad['shared']}{author}")
+    return "\n".join(lines)
+
 def create_media_group(photos, caption=None, parse_mode=None):
     """
     Создает медиа-группу для отправки фотографий
@@ -105,3 +148,28 @@ def create_media_group(photos, caption=None, parse_mode=None):
         else:
             media_group.append(InputMediaPhoto(media=photo_id))
     return media_group
+
+def get_post_link(chat_id, message_id):
+    """
+    Создает ссылку на пост в канале
+    
+    :param chat_id: ID канала (-100...)
+    :param message_id: ID сообщения в канале
+    :return: Ссылка вида https://t.me/c/<id>/<message_id> (открывается у подписчиков)
+    """
+    return f"https://t.me/c/{str(chat_id).removeprefix('-100')}/{message_id}"
+
+def format_age(created_at: str) -> str:
+    """
+    Возраст записи для списков
+
+    :param created_at: CURRENT_TIMESTAMP SQLite (UTC, YYYY-MM-DD HH:MM:SS)
+    :return: «5 мин», «3 ч» или «2 д»
+    """
+    created = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    minutes = max(0, int((datetime.now(timezone.utc) - created).total_seconds() // 60))
+    if minutes < 60:
+        return f"{minutes} мин"
+    if minutes < 48 * 60:
+        return f"{minutes // 60} ч"
+    return f"{minutes // (24 * 60)} д"
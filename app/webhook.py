@@ -0,0 +1,94 @@
+"""
+Режим webhook для телеграм-бота объявлений Fixed Gear Perm.
+
+Апдейты принимает aiohttp-приложение: запрос проверяется по секретному
+токену, сразу получает ответ 200, а сам апдейт обрабатывается в фоне.
+При запуске webhook регистрируется, только если адрес или типы апдейтов
+у Telegram другие (WEBHOOK_REGISTER=auto), и не снимается при остановке:
+экземпляры за балансировщиком перезапускаются по одному, не прерывая доставку.
+"""
+
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from .config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_REGISTER, WEBHOOK_HOST, WEBHOOK_PORT
+
+logger = logging.getLogger(__name__)
+
+# Общий секрет всех экземпляров: им регистрируется webhook и проверяются запросы
+secret_token = WEBHOOK_SECRET
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot, secret: str, path: str = WEBHOOK_PATH) -> web.Application:
+    """
+    Создаёт aiohttp-приложение, принимающее апдейты
+    
+    :param dispatcher: Диспетчер
+    :param bot: Бот
+    :param secret: Секретный токен из заголовка X-Telegram-Bot-Api-Secret-Token
+    :param path: Путь webhook
+    :return: Приложение
+    """
+    app = web.Application()
+    setup_application(app, dispatcher, bot=bot)
+    SimpleRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        secret_token=secret,
+        handle_in_background=True
+    ).register(app, path=path)
+    return app
+
+def register_webhook(dispatcher: Dispatcher, secret: str = secret_token, url: str = WEBHOOK_URL,
+                     path: str = WEBHOOK_PATH, mode: str = WEBHOOK_REGISTER):
+    """
+    Регистрирует установку webhook при запуске.
+    
+    Telegram не возвращает секрет в getWebhookInfo, поэтому в режиме auto смена
+    одного WEBHOOK_SECRET не замечается: после неё запустите один экземпляр с
+    WEBHOOK_REGISTER=always. Webhook при остановке не снимается — иначе
+    остановка одного экземпляра прекращает доставку апдейтов всем.
+    
+    :param dispatcher: Диспетчер
+    :param secret: Секретный токен
+    :param url: Публичный адрес бота
+    :param path: Путь webhook
+    :param mode: auto — если адрес или типы апдейтов другие, always — всегда, off — никогда
+    """
+    if mode == 'off':
+        return
+    
+    async def set_webhook(bot: Bot):
+        webhook_url = f"{url.rstrip('/')}{path}"
+        allowed_updates = dispatcher.resolve_used_update_types()
+        if mode == 'auto':
+            info = await bot.get_webhook_info()
+            if info.url == webhook_url and sorted(info.allowed_updates or []) == sorted(allowed_updates):
+                logger.info(f"Webhook уже установлен: {webhook_url}")
+                return
+        await bot.set_webhook(url=webhook_url, secret_token=secret, allowed_updates=allowed_updates)
+        logger.info(f"Webhook установлен: {webhook_url}")
+
+    dispatcher.startup.register(set_webhook)
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT):
+    """
+    Запускает приём апдейтов через webhook до отмены задачи.
+    Установка webhook регистрируется отдельно через register_webhook.
+    
+    :param dispatcher: Диспетчер
+    :param bot: Бот
+    :param host: Адрес для прослушивания
+    :param port: Порт
+    """
+    runner = web.AppRunner(create_webhook_app(dispatcher, bot, secret_token))
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Сервер webhook слушает {host}:{port}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
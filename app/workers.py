@@ -0,0 +1,241 @@
+"""
+Горизонтальное масштабирование телеграм-бота объявлений Fixed Gear Perm.
+
+Главный процесс только получает апдейты (long polling или webhook) и
+раскладывает их по N процессам-обработчикам по хешу ключа маршрутизации.
+Ключ — ID пользователя, поэтому состояние FSM каждого пользователя живёт в
+одном процессе и кэш состояний остаётся согласованным. Нажатия кнопок
+модерации и «Продано» маршрутизируются по объявлению, а внутри процесса
+апдейты с одним ключом обрабатываются строго по очереди — так одно
+объявление не обрабатывается двумя процессами одновременно.
+
+Процессы делят одну БД SQLite в режиме WAL, которая безопасна для
+нескольких процессов. Общие лимиты Bot API делятся между процессами поровну.
+"""
+
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import zlib
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from .callbacks import split_callback_data
+
+logger = logging.getLogger(__name__)
+
+# Префиксы callback_data, которые относятся к общему объекту, а не к пользователю.
+# Обработчики этих кнопок не должны менять состояние FSM нажавшего.
+SHARED_RESOURCE_CALLBACKS = {
+    'approve': 'ad',
+    'reject': 'ad',
+    'sold': 'sold',
+}
+
+def routing_key(update: Dict[str, Any]) -> str:
+    """
+    Возвращает ключ маршрутизации апдейта
+
+    :param update: Апдейт в виде словаря Bot API
+    :return: Ключ: объект для кнопок модерации, иначе пользователь или чат
+    """
+    callback = update.get('callback_query')
+    if callback:
+        prefix, value = split_callback_data(callback.get('data') or '')
+        if prefix in SHARED_RESOURCE_CALLBACKS and value:
+            return f"{SHARED_RESOURCE_CALLBACKS[prefix]}:{value}"
+
+    for event in update.values():
+        if isinstance(event, dict):
+            if event.get('from'):
+                return f"user:{event['from']['id']}"
+            if event.get('chat'):
+                return f"chat:{event['chat']['id']}"
+    return f"update:{update.get('update_id')}"
+
+def shard(key: str, count: int) -> int:
+    """Номер процесса для ключа (стабилен между процессами, в отличие от hash())"""
+    return zlib.crc32(key.encode()) % count
+
+class KeyedLock:
+    """Блокировки по ключу: апдейты с одним ключом обрабатываются по очереди"""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._holders = Counter()
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        """Захватывает блокировку ключа, удаляя её, когда она больше никому не нужна"""
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._holders[key] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._holders[key] -= 1
+            if not self._holders[key]:
+                del self._holders[key]
+                del self._locks[key]
+
+async def _serve(index: int, count: int, updates) -> None:
+    """Цикл процесса-обработчика"""
+    from .albums import albums
+    from .bot import bot, dp, rate_limiter
+    from .config import METRICS_HOST, METRICS_PORT, EXPIRY_EDITS_PER_MINUTE
+    from .database import db
+    from .expiry import get_ad_ttls
+    from .handlers import register_all_handlers
+    from .handlers.moderation import close_bulk_jobs
+    from .metrics import start_metrics_server
+
+    register_all_handlers(dp)
+    # Посты снятых объявлений правит главный процесс: его доля лимита канала не делится
+    rate_limiter.split(count, EXPIRY_EDITS_PER_MINUTE if get_ad_ttls() else 0.0)
+    # Каждый процесс отдаёт свои метрики на следующем за главным порту
+    metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT + index + 1) if METRICS_PORT else None
+    locks = KeyedLock()
+    tasks = set()
+    loop = asyncio.get_running_loop()
+
+    async def process(update: Dict[str, Any]):
+        async with locks.hold(routing_key(update)):
+            await dp.feed_raw_update(bot, update)
+
+    logger.info(f"Обработчик {index + 1}/{count} запущен")
+    while True:
+        update = await loop.run_in_executor(None, updates.get)
+        if update is None:
+            break
+        task = asyncio.create_task(process(update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    # Дорабатываем принятые апдейты и сохраняем состояние
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await albums.close()
+    await close_bulk_jobs()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+    await dp.storage.close()
+    await bot.session.close()
+    db.close()
+    logger.info(f"Обработчик {index + 1}/{count} остановлен")
+
+def worker_main(index: int, count: int, updates) -> None:
+    """Точка входа процесса-обработчика"""
+    try:
+        asyncio.run(_serve(index, count, updates))
+    except KeyboardInterrupt:
+        pass
+
+class WorkerPool:
+    """Процессы-обработчики и очереди апдейтов к ним"""
+
+    def __init__(self, count: int):
+        # spawn: дочерние процессы открывают свои соединения с БД и сессии, а не наследуют чужие
+        context = multiprocessing.get_context('spawn')
+        self.queues = [context.Queue() for _ in range(count)]
+        self.processes = [
+            context.Process(target=worker_main, args=(i, count, queue), name=f"worker-{i + 1}")
+            for i, queue in enumerate(self.queues)
+        ]
+
+    def start(self) -> None:
+        """Запускает процессы"""
+        for process in self.processes:
+            process.start()
+
+    def route(self, update: Dict[str, Any]) -> None:
+        """Отправляет апдейт процессу, отвечающему за его ключ"""
+        self.queues[shard(routing_key(update), len(self.queues))].put(update)
+
+    def stop(self, timeout: float = 30) -> None:
+        """Дожидается обработки очередей и останавливает процессы"""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} не завершился за {timeout} с, останавливаем")
+                process.terminate()
+
+async def poll_updates(pool: WorkerPool, bot: Bot, allowed_updates: Optional[List[str]], timeout: int = 30):
+    """
+    Забирает апдейты long polling и раскладывает их по процессам
+
+    :param pool: Процессы-обработчики
+    :param bot: Бот
+    :param allowed_updates: Типы апдейтов
+    :param timeout: Таймаут long polling, с
+    """
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=timeout, allowed_updates=allowed_updates)
+        except Exception as e:
+            logger.error(f"Ошибка получения апдейтов: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            pool.route(update.model_dump(mode='json', exclude_unset=True, by_alias=True))
+            offset = update.update_id + 1
+
+def create_routing_app(pool: WorkerPool, secret: str, path: str) -> web.Application:
+    """
+    Создаёт webhook-приложение, которое только раскладывает апдейты по процессам
+
+    :param pool: Процессы-обработчики
+    :param secret: Секретный токен webhook
+    :param path: Путь webhook
+    :return: Приложение
+    """
+    async def handle(request: web.Request) -> web.Response:
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(token, secret):
+            return web.Response(body="Unauthorized", status=401)
+        pool.route(await request.json())
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app
+
+async def run_workers(dispatcher: Dispatcher, bot: Bot, count: int, mode: str) -> None:
+    """
+    Запускает процессы-обработчики и приём апдейтов до отмены задачи
+
+    :param dispatcher: Диспетчер главного процесса (хуки запуска и типы апдейтов)
+    :param bot: Бот
+    :param count: Число процессов
+    :param mode: polling или webhook
+    """
+    from .config import WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH
+    from .webhook import secret_token
+
+    pool = WorkerPool(count)
+    pool.start()
+    logger.info(f"Запущено обработчиков: {count}")
+    await dispatcher.emit_startup(bot=bot, dispatcher=dispatcher)
+    runner = None
+    try:
+        if mode == 'webhook':
+            runner = web.AppRunner(create_routing_app(pool, secret_token, WEBHOOK_PATH))
+            await runner.setup()
+            await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+            logger.info(f"Сервер webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+            await asyncio.Event().wait()
+        else:
+            await poll_updates(pool, bot, dispatcher.resolve_used_update_types())
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        await dispatcher.emit_shutdown(bot=bot, dispatcher=dispatcher)
+        # Очереди дорабатываются в процессах, не блокируя цикл событий
+        await asyncio.get_running_loop().run_in_executor(None, pool.stop)
+        await bot.session.close()
@@ -0,0 +1,3 @@
+"""
+Бенчмарки телеграм-бота объявлений Fixed Gear Perm.
+"""
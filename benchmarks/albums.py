@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Загрузка фото альбомом: отдельные апдейты против сборщика альбомов.
+
+N пользователей на шаге загрузки фото одновременно присылают по 3 фото.
+Режим «по одному» — те же фото без media_group_id, как обрабатывался альбом
+раньше: три обработчика параллельно дописывают фото в список. Режим
+«альбом» — фото с общим media_group_id идут через сборщик альбомов.
+Для каждого режима печатает, сколько фото сохранилось, сколько было записей
+состояния в БД и сколько ответов ушло пользователям. Код выхода 1, если
+хоть одно фото потерялось.
+
+Запуск: python -m benchmarks.albums --users 200
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'albums.db')
+# Каждая запись состояния сразу идёт в БД, чтобы её можно было посчитать
+os.environ['FSM_FLUSH_INTERVAL'] = '0'
+os.environ['ALBUM_DEBOUNCE'] = os.environ.get('ALBUM_DEBOUNCE', '0.3')
+# Замеряется работа обработчиков, а не ограничитель частоты
+os.environ['RATE_LIMIT_GLOBAL'] = '100000'
+
+from benchmarks.fake_bot_api import FakeBotAPI
+
+PHOTOS = 3
+# Методы Database, которые записывают состояние FSM
+STATE_WRITES = ('set_user_state', 'set_user_data', 'merge_user_data', 'append_user_data')
+
+def db_calls(methods) -> int:
+    """Число вызовов методов Database по метрикам"""
+    from app.metrics import db_latency
+    return sum(sum(db_latency._series[(m,)][0]) for m in methods if (m,) in db_latency._series)
+
+def photo_update(update_id: int, user_id: int, index: int, media_group_id):
+    """Апдейт с фото от пользователя"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Bench', 'username': f"u{user_id}"}
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': user,
+        'photo': [{'file_id': f"photo-{user_id}-{index}", 'file_unique_id': f"u{user_id}p{index}", 'width': 1, 'height': 1}],
+    }
+    if media_group_id:
+        message['media_group_id'] = media_group_id
+    return {'update_id': update_id, 'message': message}
+
+async def run(mode: str, users: int, first_user: int, server: FakeBotAPI):
+    """Один режим: все пользователи одновременно присылают по 3 фото"""
+    from app.albums import albums
+    from app.bot import bot, dp
+    from app.config import ALBUM_DEBOUNCE
+    from app.database import db
+    from app.states import AdStates
+    from aiogram.fsm.storage.base import StorageKey
+
+    user_ids = range(first_user, first_user + users)
+    for user_id in user_ids:
+        key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+        await dp.storage.set_state_and_data(key, AdStates.waiting_for_photos, {'category': 'sell', 'photos': []})
+
+    writes, replies = db_calls(STATE_WRITES), server.calls['sendMessage']
+    updates = [
+        photo_update(user_id * 10 + i, user_id, i, f"album-{user_id}" if mode == 'album' else None)
+        for i in range(PHOTOS) for user_id in user_ids
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*(dp.feed_raw_update(bot, update) for update in updates))
+    if mode == 'album':
+        # Ждём срабатывания таймеров, а не сбрасываем альбомы досрочно
+        await asyncio.sleep(ALBUM_DEBOUNCE)
+        await albums.close()
+    elapsed = time.perf_counter() - started
+
+    saved = 0
+    for user_id in user_ids:
+        state = await db.get_user_state(user_id)
+        saved += len(state['data']['photos'])
+    return {
+        'saved': saved,
+        'writes': db_calls(STATE_WRITES) - writes,
+        'replies': server.calls['sendMessage'] - replies,
+        'elapsed': elapsed,
+    }
+
+async def main_async(args):
+    """Запуск обоих режимов против поддельного Bot API"""
+    server = FakeBotAPI(latency=args.latency, global_limit=None, group_limit=None)
+    os.environ['BOT_API_URL'] = await server.start()
+
+    from app.bot import bot, dp
+    from app.handlers import register_all_handlers
+
+    register_all_handlers(dp)
+    expected = args.users * PHOTOS
+    print(f"{args.users} пользователей по {PHOTOS} фото, задержка Bot API {args.latency * 1000:.0f} мс")
+    print(f"{'режим':<10}{'сохранено фото':>16}{'записей состояния':>19}{'ответов':>9}{'время, с':>10}")
+    lost = False
+    for index, mode in enumerate(('separate', 'album')):
+        result = await run(mode, args.users, 100000 + index * args.users, server)
+        name = 'по одному' if mode == 'separate' else 'альбом'
+        print(f"{name:<10}{result['saved']:>10}/{expected:<5}{result['writes']:>19}{result['replies']:>9}{result['elapsed']:>10.2f}")
+        lost = lost or result['saved'] < expected
+
+    await bot.session.close()
+    await server.stop()
+    return lost
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.01, help="Задержка ответа Bot API, с")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger('aiogram.event').setLevel(logging.WARNING)
+    if asyncio.run(main_async(args)):
+        print("Часть фото потеряна")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Разбор очереди модерации: одобрение по одному против конвейера /queue.
+
+Поднимает FakeBotAPI с задержкой ответа, кладёт в очередь модерации N
+объявлений (0–3 фото, с карточками в чате модерации) и одобряет их:
+  1. по одному — как модератор, нажимающий «Одобрить» под каждой карточкой
+     (чтение из БД, пост в канал, запись публикации, уведомление автору, правка карточки);
+  2. конвейером publish_many — посты в канал идут подряд, остальное параллельно.
+Лимит канала в ограничителе бота задаётся --channel-per-minute; печатается
+время против нижней границы, которую задают лимиты канала и бота (30 сообщений в секунду), и проверяется, что
+каждое объявление опубликовано ровно один раз.
+
+Код выхода 1, если объявление потерялось или опубликовано дважды.
+
+Запуск: python -m benchmarks.bulk_moderation --ads 50 --channel-per-minute 600 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_bot_api import FakeBotAPI
+
+CHANNEL_ID = -1001
+MODERATION_CHAT_ID = -1002
+
+def make_ad(i: int):
+    """Объявление на модерацию"""
+    return {
+        'category': random.choice(['sell', 'buy', 'trade']),
+        'photos': [f"photo-{i}-{n}" for n in range(random.randint(0, 3))],
+        'title': f"Рама {i}",
+        'description': "Стальная рама, размер 56",
+        'price': "10 000 ₽",
+        'user_mention': f"user{i}",
+        'user_display': f"@user{i}",
+    }
+
+async def fill_queue(server, db, ads: int):
+    """Объявления на модерации с карточками; возвращает их ID"""
+    ad_ids = []
+    for i in range(ads):
+        ad_id = await db.save_moderation_ad(100000 + i, make_ad(i))
+        card = server._message(str(MODERATION_CHAT_ID), text="🧠 Новое объявление на модерации")
+        await db.set_moderation_card(ad_id, card['message_id'], MODERATION_CHAT_ID)
+        ad_ids.append(ad_id)
+    return ad_ids
+
+async def one_by_one(ad_ids, moderation):
+    """Как нажатия «Одобрить» под каждой карточкой подряд"""
+    from app.bot import bot
+    from app.database import db
+    for ad_id in ad_ids:
+        ad_data, = await db.claim_moderation_ads([ad_id], 'approved', 1)
+        channel_msg_id, post_text = await moderation.post_to_channel(ad_data)
+        await moderation.complete_approval(ad_data, channel_msg_id, post_text)
+        await bot.edit_message_text(
+            chat_id=ad_data['moderation_chat_id'], message_id=ad_data['moderation_message_id'],
+            text="🧠 Новое объявление на модерации\n\n✅ ОДОБРЕНО"
+        )
+
+async def run(args) -> bool:
+    """Прогон; возвращает True, если проверки прошли"""
+    server = FakeBotAPI(latency=args.latency, global_limit=None, group_limit=None)
+    os.environ.update({
+        'BOT_API_URL': await server.start(),
+        'DB_PATH': os.path.join(tempfile.mkdtemp(prefix='bulk-moderation-'), 'bot_data.db'),
+        'CHANNEL_ID': str(CHANNEL_ID),
+        'MODERATION_CHAT_ID': str(MODERATION_CHAT_ID),
+        'RATE_LIMIT_GROUP': str(args.channel_per_minute),
+    })
+    from app.bot import bot, rate_limiter
+    from app.config import RATE_LIMIT_GLOBAL, RATE_LIMIT_GROUP_BURST
+    from app.database import db
+    from app.handlers import moderation
+
+    logging.getLogger().setLevel(logging.ERROR)
+    random.seed(42)
+    ok = True
+    print(f"{args.ads} объявлений, лимит канала {args.channel_per_minute:.0f}/мин, задержка Bot API {args.latency * 1000:.0f} мс")
+    print(f"{'способ':<14}{'время, с':>9}{'граница, с':>12}{'постов':>8}")
+    for name in ('по одному', 'конвейер'):
+        ad_ids = await fill_queue(server, db, args.ads)
+        ads = [await db.get_moderation_ad(ad_id) for ad_id in ad_ids]
+        # Альбом — столько сообщений, сколько в нём фото
+        messages = sum(len(ad['photos']) or 1 for ad in ads)
+        # Корзины начинают полными: первые сообщения уходят сразу. Кроме постов
+        # в общий лимит бота идут уведомление автору и правка карточки
+        burst = min(RATE_LIMIT_GROUP_BURST, args.channel_per_minute)
+        bound = max(
+            max(0.0, messages - burst) / args.channel_per_minute * 60,
+            max(0.0, messages + 2 * len(ads) - RATE_LIMIT_GLOBAL) / RATE_LIMIT_GLOBAL
+        )
+        sent_before = server.calls['sendMediaGroup'] + server.calls['sendMessage']
+        # Прогоны не должны делить корзины ограничителя: каждый начинает с полного запаса
+        rate_limiter.chat_buckets.clear()
+        rate_limiter.global_bucket.tokens = rate_limiter.global_bucket.capacity
+
+        started = time.perf_counter()
+        if name == 'по одному':
+            await one_by_one(ad_ids, moderation)
+        else:
+            await moderation.publish_many(await db.claim_moderation_ads(ad_ids, 'approved', 1))
+        elapsed = time.perf_counter() - started
+
+        with db.sync.get_connection(readonly=True) as conn:
+            placeholders = ','.join('?' * len(ad_ids))
+            published = conn.execute(
+                f"SELECT COUNT(*) FROM ad_channel_posts WHERE ad_id IN ({placeholders})", ad_ids
+            ).fetchone()[0]
+            pending = conn.execute(
+                f"SELECT COUNT(*) FROM ads WHERE status <> 'active' AND id IN ({placeholders})", ad_ids
+            ).fetchone()[0]
+        posts = server.calls['sendMediaGroup'] + server.calls['sendMessage'] - sent_before - args.ads  # минус уведомления
+        print(f"{name:<14}{elapsed:>9.2f}{bound:>12.2f}{posts:>8}")
+        if posts != args.ads or published != args.ads or pending:
+            print(f"  ошибка: постов {posts}, записей {published}, не опубликовано {pending}")
+            ok = False
+
+    await bot.session.close()
+    db.close()
+    await server.stop()
+    return ok
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=50)
+    parser.add_argument('--channel-per-minute', type=float, default=600)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Стоимость выбора обработчика нажатия в зависимости от числа маршрутов.
+
+Сравнивает два диспетчера с N обработчиками callback_query: цепочку
+фильтров-лямбд c.data.startswith(...), как было раньше, и маршрутизатор по
+префиксу из app/callbacks.py. Нажатия равномерно распределены по всем
+маршрутам; обработчики ничего не делают, так что замеряется только выбор
+обработчика и разбор данных. Выводит микросекунды на апдейт для каждого N.
+
+Запуск: python -m benchmarks.callback_dispatch --routes 8,32,128,512
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import types
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db из app.database не должен трогать bot_data.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='callback-dispatch-'), 'bot_data.db')
+
+from aiogram import Bot, Dispatcher
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery, Update
+
+from app.callbacks import get_callback_router
+
+async def noop(callback: CallbackQuery, callback_data=None):
+    """Обработчик, который ничего не делает"""
+    return None
+
+def make_data_class(index: int):
+    """Класс callback_data с префиксом r<index> и одним числовым полем"""
+    return types.new_class(
+        f"Route{index}", (CallbackData,), {'prefix': f"r{index}"},
+        lambda ns: ns.update({'__annotations__': {'value': int}})
+    )
+
+def linear_dispatcher(routes: int) -> Dispatcher:
+    """Обработчики с фильтрами-лямбдами, проверяемыми по очереди"""
+    dp = Dispatcher()
+    for i in range(routes):
+        prefix = f"r{i}:"
+        dp.callback_query.register(noop, lambda c, prefix=prefix: c.data.startswith(prefix))
+    return dp
+
+def routed_dispatcher(routes: int) -> Dispatcher:
+    """Один обработчик с маршрутизатором по префиксу"""
+    dp = Dispatcher()
+    router = get_callback_router(dp)
+    for i in range(routes):
+        router.route(make_data_class(i), noop)
+    return dp
+
+def make_updates(bot: Bot, routes: int, count: int):
+    """Нажатия, равномерно распределённые по маршрутам"""
+    updates = []
+    for i in range(count):
+        user = {'id': 100000 + i % 1000, 'is_bot': False, 'first_name': 'Bench'}
+        updates.append(Update.model_validate({
+            'update_id': i,
+            'callback_query': {
+                'id': str(i),
+                'from': user,
+                'chat_instance': 'bench',
+                'data': f"r{random.randrange(routes)}:{i}",
+                'message': {'message_id': i, 'date': 0, 'chat': {'id': user['id'], 'type': 'private'}, 'text': 't'},
+            },
+        }, context={'bot': bot}))
+    return updates
+
+async def per_update(dp: Dispatcher, bot: Bot, updates) -> float:
+    """Среднее время обработки апдейта, мкс"""
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+async def main_async(args):
+    """Прогон для каждого числа маршрутов"""
+    bot = Bot(token='0:benchmark')
+    print(f"{'маршрутов':>10}{'лямбды, мкс':>14}{'по префиксу, мкс':>19}")
+    for routes in args.routes:
+        updates = make_updates(bot, routes, args.updates)
+        linear, routed = linear_dispatcher(routes), routed_dispatcher(routes)
+        await per_update(linear, bot, updates[:200])
+        await per_update(routed, bot, updates[:200])
+        linear_us = min([await per_update(linear, bot, updates) for _ in range(args.rounds)])
+        routed_us = min([await per_update(routed, bot, updates) for _ in range(args.rounds)])
+        print(f"{routes:>10}{linear_us:>14.1f}{routed_us:>19.1f}")
+    await bot.session.close()
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--routes', type=lambda v: [int(x) for x in v.split(',')], default=[8, 32, 128, 512])
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    import logging
+    # Лог каждого апдейта исказил бы замер
+    logging.getLogger('aiogram.event').setLevel(logging.WARNING)
+    random.seed(42)
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Одновременные нажатия «Одобрить»/«Отклонить» под одной карточкой модерации.
+
+Поднимает FakeBotAPI с задержкой ответа и бота в режиме long polling
+(апдейты обрабатываются параллельно), кладёт объявление на модерацию и
+одним пакетом getUpdates присылает --clicks нажатий от разных модераторов,
+включая двойное нажатие одного из них. Прогоны:
+  1. все нажимают «Одобрить»;
+  2. половина нажимает «Одобрить», половина — «Отклонить».
+Проверяется, что объявление опубликовано (или отклонено) ровно один раз:
+один пост в канале, одна запись ad_channel_posts, одно сообщение автору, —
+а остальные модераторы получили ответ «уже обработано».
+
+Код выхода 1, если решение исполнено больше или меньше одного раза.
+
+Запуск: python -m benchmarks.concurrent_moderation --clicks 20 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_bot_api import FakeBotAPI
+
+CHANNEL_ID = -1001
+MODERATION_CHAT_ID = -1002
+AUTHOR_ID = 100001
+
+def drain(inbox: asyncio.Queue) -> list:
+    """Забирает все доставленные в чат сообщения"""
+    messages = []
+    while not inbox.empty():
+        messages.append(inbox.get_nowait())
+    return messages
+
+def count_published(db) -> int:
+    """Записей ad_channel_posts"""
+    with db.sync.get_connection(readonly=True) as conn:
+        return conn.execute("SELECT COUNT(*) FROM ad_channel_posts").fetchone()[0]
+
+async def race(server, db, clicks: int, mixed: bool, timeout: float, latency: float) -> dict:
+    """
+    Одно объявление, clicks одновременных нажатий
+
+    :return: Что получилось: посты, записи, сообщения автору, ответы опоздавшим
+    """
+    ad_id = await db.save_moderation_ad(AUTHOR_ID, {
+        'category': 'sell', 'photos': ['photo-1', 'photo-2'], 'title': "Рама", 'description': "Стальная рама",
+        'price': "10 000 ₽", 'user_mention': "author", 'user_display': "@author",
+    })
+    card = server._message(str(MODERATION_CHAT_ID), text=f"🧠 Объявление №{ad_id} на модерации")
+    await db.set_moderation_card(ad_id, card['message_id'], MODERATION_CHAT_ID)
+
+    published_before = count_published(db)
+    answers_before = server.calls['answerCallbackQuery']
+    edits_before = server.calls['editMessageText']
+    for i in range(clicks):
+        # Последний модератор нажимает дважды
+        moderator = min(i, clicks - 2) + 1
+        action = 'reject' if mixed and i % 2 else 'approve'
+        server.push_update({'callback_query': {
+            'id': f"{ad_id}-{i}",
+            'from': {'id': moderator, 'is_bot': False, 'first_name': f"Модератор {moderator}", 'username': f"mod{moderator}"},
+            'chat_instance': 'race',
+            'data': f"{action}:{ad_id}",
+            'message': card,
+        }})
+
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    while (server.calls['answerCallbackQuery'] - answers_before < clicks
+           or server.calls['editMessageText'] - edits_before < 1):
+        if time.monotonic() > deadline:
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    # Сервер считает запрос при получении: даём ответу на правку карточки дойти до бота
+    await asyncio.sleep(latency * 2)
+
+    ad_data = await db.get_moderation_ad(ad_id)
+    return {
+        'status': ad_data['status'],
+        'moderator': ad_data['moderator_name'],
+        'elapsed': elapsed,
+        'answers': server.calls['answerCallbackQuery'] - answers_before,
+        'card_edits': server.calls['editMessageText'] - edits_before,
+        'published': count_published(db) - published_before,
+    }
+
+async def run(args) -> bool:
+    """Прогоны; возвращает True, если проверки прошли"""
+    server = FakeBotAPI(latency=args.latency, global_limit=None, group_limit=None)
+    os.environ.update({
+        'BOT_API_URL': await server.start(),
+        'DB_PATH': os.path.join(tempfile.mkdtemp(prefix='concurrent-moderation-'), 'bot_data.db'),
+        'CHANNEL_ID': str(CHANNEL_ID),
+        'MODERATION_CHAT_ID': str(MODERATION_CHAT_ID),
+        # Проверяется гонка, а не лимиты Telegram
+        'RATE_LIMIT_GLOBAL': '1000000', 'RATE_LIMIT_GROUP': '60000000',
+        'RATE_LIMIT_PRIVATE': '1000000', 'RATE_LIMIT_PRIVATE_BURST': '1000000',
+    })
+    from app.bot import bot, dp
+    from app.database import db
+    from app.handlers import register_all_handlers
+
+    logging.getLogger().setLevel(logging.ERROR)
+    db.sync.init_database()
+    register_all_handlers(dp)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+    channel = server.subscribe(CHANNEL_ID)
+    author = server.subscribe(AUTHOR_ID)
+
+    ok = True
+    print(f"{args.clicks} одновременных нажатий, задержка Bot API {args.latency * 1000:.0f} мс")
+    print(f"{'прогон':<22}{'решение':>12}{'постов':>8}{'записей':>9}{'автору':>8}{'ответов':>9}{'время, с':>10}")
+    for name, mixed in (('все «Одобрить»', False), ('«Одобрить»/«Отклонить»', True)):
+        result = await race(server, db, args.clicks, mixed, args.timeout, args.latency)
+        # Альбом из двух фото — два сообщения в канале, но один пост
+        posts = len({m['message_id'] for m in drain(channel) if m.get('caption')})
+        notices = len(drain(author))
+        print(f"{name:<22}{result['status']:>12}{posts:>8}{result['published']:>9}{notices:>8}"
+              f"{result['answers']:>9}{result['elapsed']:>10.2f}")
+        expected_posts = 1 if result['status'] == 'active' else 0
+        if (result['status'] not in ('active', 'rejected') or posts != expected_posts
+                or result['published'] != expected_posts or notices != 1
+                or result['answers'] != args.clicks or result['card_edits'] != 1):
+            print(f"  ошибка: {result}, постов {posts}, сообщений автору {notices}")
+            ok = False
+        else:
+            print(f"  решение принял {result['moderator']}, остальные {args.clicks - 1} получили «уже обработано»")
+
+    await dp.stop_polling()
+    await polling
+    await dp.storage.close()
+    db.close()
+    await server.stop()
+    return ok
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clicks', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк пула соединений: ops/sec для get_user_state/set_user_data.
+
+«До» — прежнее поведение: новое соединение sqlite3 на каждый вызов с
+прагмами по умолчанию. «После» — Database с пулом соединений и прагмами
+из app/config.py.
+
+Запуск: python -m benchmarks.connection_pool --ops 5000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db из app.database не должен трогать bot_data.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='connection-pool-'), 'bot_data.db')
+
+from app.database import Database
+
+class LegacyDatabase(Database):
+    """Database с открытием соединения на каждый вызов, как до пула"""
+
+    @contextmanager
+    def get_connection(self, readonly: bool = False):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+def measure(database: Database, ops: int, users: int):
+    """Возвращает ops/sec для записи и чтения состояния"""
+    data = {'category': 'sell', 'photos': ['AgACAgIAAxkBAAI' * 4] * 3, 'title': 'Седло Brooks B17'}
+
+    started = time.perf_counter()
+    for i in range(ops):
+        database.set_user_data(i % users, data)
+    save_rate = ops / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i in range(ops):
+        database.get_user_state(i % users)
+    get_rate = ops / (time.perf_counter() - started)
+
+    return save_rate, get_rate
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ops', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, factory in (('до', LegacyDatabase), ('после', Database)):
+            database = factory(os.path.join(tmp, f'{factory.__name__}.db'))
+            save_rate, get_rate = measure(database, args.ops, args.users)
+            database.close()
+            print(f"{name:>6}: set_user_data {save_rate:,.0f} ops/s, get_user_state {get_rate:,.0f} ops/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Стоимость поиска повторов по file_unique_id в зависимости от числа сохранённых фото.
+
+Наполняет ad_photos (по 3 фото на объявление) до каждого из размеров и
+замеряет find_ads_with_photos для нового объявления из 3 фото: когда фото
+уже встречались (повтор) и когда нет. Поиск идёт по первичному ключу
+ad_photos, поэтому время на 1M фото должно быть примерно таким же, как на 1k.
+
+Запуск: python -m benchmarks.duplicate_photos --sizes 1000,1000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db из app.database не должен трогать bot_data.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='duplicate-photos-'), 'bot_data.db')
+
+from app.database import Database
+from benchmarks.handler_latency import percentile
+
+PHOTOS_PER_AD = 3
+
+def uid(index: int) -> str:
+    """file_unique_id фото с номером index (по длине как настоящий)"""
+    return f"AQADBAAD{index:012d}x"
+
+def seed(database: Database, start: int, stop: int) -> None:
+    """Дополняет ad_photos фото с номерами [start, stop) и их объявлениями"""
+    chunk = 60000
+    with database.get_connection() as conn:
+        for low in range(start, stop, chunk):
+            high = min(stop, low + chunk)
+            ads = range(low // PHOTOS_PER_AD, (high - 1) // PHOTOS_PER_AD + 1)
+            conn.executemany(
+                "INSERT OR IGNORE INTO ads (id, user_id, title, status) VALUES (?, ?, ?, 'active')",
+                ((ad + 1, ad // 5, 'Рама') for ad in ads)
+            )
+            conn.executemany(
+                "INSERT INTO ad_photos (file_unique_id, ad_id) VALUES (?, ?)",
+                ((uid(i), i // PHOTOS_PER_AD + 1) for i in range(low, high))
+            )
+            conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+
+def measure(database: Database, size: int, lookups: int, duplicate: bool) -> dict:
+    """Время find_ads_with_photos для lookups новых объявлений"""
+    latencies = []
+    next_ad = size // PHOTOS_PER_AD + 2
+    for _ in range(lookups):
+        if duplicate:
+            # Автор снова выкладывает фото одного из старых объявлений
+            first = random.randrange(size // PHOTOS_PER_AD) * PHOTOS_PER_AD
+            uids = [uid(first + i) for i in range(PHOTOS_PER_AD)]
+        else:
+            uids = [uid(size + random.randrange(10 ** 9)) for _ in range(PHOTOS_PER_AD)]
+        started = time.perf_counter()
+        found = database.find_ads_with_photos(uids, next_ad)
+        latencies.append(time.perf_counter() - started)
+        assert bool(found) == duplicate
+    return {
+        'p50_us': percentile(latencies, 50) * 1e6,
+        'p99_us': percentile(latencies, 99) * 1e6,
+    }
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=lambda v: [int(x) for x in v.split(',')], default=[1000, 1000000])
+    parser.add_argument('--lookups', type=int, default=5000)
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger('app.database').setLevel(logging.WARNING)
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(os.path.join(tmp, 'photos.db'))
+        print(f"{'фото':>10}{'повтор p50, мкс':>17}{'p99':>8}{'нет повтора p50, мкс':>22}{'p99':>8}")
+        seeded = 0
+        for size in sorted(args.sizes):
+            seed(database, seeded, size)
+            seeded = size
+            hit = measure(database, size, args.lookups, duplicate=True)
+            miss = measure(database, size, args.lookups, duplicate=False)
+            print(f"{size:>10}{hit['p50_us']:>17.1f}{hit['p99_us']:>8.1f}{miss['p50_us']:>22.1f}{miss['p99_us']:>8.1f}")
+        database.close()
+
+if __name__ == "__main__":
+    main()
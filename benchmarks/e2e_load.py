@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Сквозная нагрузка: тысячи симулированных пользователей против локального Bot API.
+
+Поднимает FakeBotAPI (с задержкой и случайными 429 по желанию), направляет на
+него app.bot.bot через BOT_API_URL и запускает настоящий бот (все обработчики,
+хранилище FSM, временная БД) в режиме long polling. Каждый пользователь
+проходит весь путь: /start → «Создать объявление» → категория → фото →
+«Дальше» → название → описание → цена → «Отправить на модерацию», а
+модераторы одобряют карточки из чата модерации; получив уведомление об
+одобрении, пользователь жмёт «Продано». На каждом шаге пользователь ждёт
+ответа бота, как живой человек.
+
+Печатает апдейтов в секунду, время прохождения мастера и полного цикла
+(p50/p95/p99) и долю ошибок: пользователей, застрявших на шаге, ответов 429 от
+сервера, исключений в обработчиках и ошибок Bot API на стороне бота.
+
+Запуск: python -m benchmarks.e2e_load --users 2000 --latency 0.02 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+
+from benchmarks.fake_bot_api import FakeBotAPI
+
+CHANNEL_ID = -1001
+MODERATION_CHAT_ID = -1002
+MODERATOR = {'id': 1, 'is_bot': False, 'first_name': 'Moderator', 'username': 'moderator'}
+
+class StepFailed(Exception):
+    """Бот не ответил на шаге за отведённое время"""
+
+def find_button(message: Dict[str, Any], prefix: str) -> Optional[str]:
+    """callback_data первой кнопки сообщения, начинающейся с prefix"""
+    markup = message.get('reply_markup') or {}
+    for row in markup.get('inline_keyboard', []):
+        for button in row:
+            if (button.get('callback_data') or '').startswith(prefix):
+                return button['callback_data']
+    return None
+
+class LoadHarness:
+    """Симулированные пользователи и модераторы поверх FakeBotAPI"""
+
+    def __init__(self, server: FakeBotAPI, args):
+        self.server = server
+        self.args = args
+        self.updates_sent = 0
+        self.failed_steps = Counter()
+        self.wizard_times = []
+        self.cycle_times = []
+        self._message_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+
+    def push(self, update: Dict[str, Any]) -> None:
+        """Отправляет апдейт боту через очередь getUpdates"""
+        self.server.push_update(update)
+        self.updates_sent += 1
+
+    def send_message(self, user: Dict[str, Any], **fields) -> None:
+        """Пользователь пишет боту"""
+        self.push({'message': {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user['id'], 'type': 'private'},
+            'from': user,
+            **fields,
+        }})
+
+    def press(self, user: Dict[str, Any], message: Dict[str, Any], data: str) -> None:
+        """Пользователь нажимает кнопку под сообщением бота"""
+        self.push({'callback_query': {
+            'id': str(next(self._callback_ids)),
+            'from': user,
+            'chat_instance': 'load',
+            'data': data,
+            'message': message,
+        }})
+
+    async def expect(self, inbox: asyncio.Queue, step: str,
+                     predicate: Callable[[Dict[str, Any]], bool] = lambda m: True) -> Dict[str, Any]:
+        """Ждёт сообщения бота, подходящего под условие"""
+        deadline = time.monotonic() + self.args.step_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                message = await asyncio.wait_for(inbox.get(), max(0.0, remaining))
+            except asyncio.TimeoutError:
+                raise StepFailed(step)
+            if predicate(message):
+                return message
+
+    async def think(self) -> None:
+        """Пауза пользователя между действиями"""
+        if self.args.think:
+            await asyncio.sleep(random.uniform(0, self.args.think))
+
+    async def user(self, user_id: int) -> None:
+        """Один пользователь проходит мастер, дожидается одобрения и отмечает продажу"""
+        await asyncio.sleep(random.uniform(0, self.args.ramp))
+        user = {'id': user_id, 'is_bot': False, 'first_name': 'Load', 'username': f"load{user_id}"}
+        inbox = self.server.subscribe(user_id)
+        started = time.perf_counter()
+        try:
+            self.send_message(user, text='/start', entities=[{'type': 'bot_command', 'offset': 0, 'length': 6}])
+            menu = await self.expect(inbox, 'start', lambda m: find_button(m, 'create_ad'))
+            await self.think()
+
+            self.press(user, menu, 'create_ad')
+            categories = await self.expect(inbox, 'create_ad', lambda m: find_button(m, 'category'))
+            await self.think()
+
+            self.press(user, categories, 'category_sell')
+            prompt = await self.expect(inbox, 'category', lambda m: find_button(m, 'photos_done'))
+            for i in range(random.randint(1, 3)):
+                await self.think()
+                self.send_message(user, photo=[{
+                    'file_id': f"photo-{user_id}-{i}", 'file_unique_id': f"u{user_id}p{i}",
+                    'width': 1280, 'height': 960,
+                }])
+                prompt = await self.expect(inbox, 'photo', lambda m: find_button(m, 'photos_done'))
+            await self.think()
+
+            self.press(user, prompt, 'photos_done')
+            await self.expect(inbox, 'photos_done')
+            await self.think()
+
+            self.send_message(user, text=f"Рама {user_id}")
+            await self.expect(inbox, 'title')
+            await self.think()
+
+            self.send_message(user, text="Сталь 4130, родная покраска, без вмятин.")
+            await self.expect(inbox, 'description')
+            await self.think()
+
+            self.send_message(user, text=str(random.randint(1000, 90000)))
+            review = await self.expect(inbox, 'price', lambda m: find_button(m, 'send_to_moderation'))
+            await self.think()
+
+            self.press(user, review, 'send_to_moderation')
+            await self.expect(inbox, 'send_to_moderation', lambda m: 'модерацию' in (m.get('text') or ''))
+            self.wizard_times.append(time.perf_counter() - started)
+
+            approved = await self.expect(inbox, 'approval', lambda m: find_button(m, 'sold'))
+            await self.think()
+
+            self.press(user, approved, find_button(approved, 'sold'))
+            # Бот правит сообщение с кнопкой: поздравлением или ошибкой
+            result = await self.expect(inbox, 'sold', lambda m: m['message_id'] == approved['message_id'])
+            if 'Поздравляем' not in (result.get('text') or ''):
+                raise StepFailed('sold')
+            self.cycle_times.append(time.perf_counter() - started)
+        except StepFailed as e:
+            self.failed_steps[str(e)] += 1
+
+    async def moderator(self, inbox: asyncio.Queue) -> None:
+        """Модератор одобряет каждую новую карточку"""
+        while True:
+            message = await inbox.get()
+            data = find_button(message, 'approve')
+            if data:
+                await asyncio.sleep(random.uniform(0, self.args.think))
+                self.press(MODERATOR, message, data)
+
+def distribution(values) -> Dict[str, float]:
+    """p50/p95/p99 в секундах"""
+    # Импорт здесь: benchmarks.handler_latency загружает app.config до того, как задан BOT_API_URL
+    from benchmarks.handler_latency import percentile
+
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None}
+    return {f"p{q}": round(percentile(values, q), 3) for q in (50, 95, 99)}
+
+def metric_total(counter) -> Dict[str, float]:
+    """Значения счётчика app.metrics по меткам"""
+    return {'/'.join(labels): value for labels, value in counter._values.items()}
+
+async def main_async(args) -> Dict[str, Any]:
+    """Поднимает сервер и бот, прогоняет пользователей и собирает отчёт"""
+    limits = {'global_limit': 30, 'group_limit': 20} if args.telegram_limits else {
+        'global_limit': None, 'group_limit': None
+    }
+    server = FakeBotAPI(latency=args.latency, error_rate=args.error_rate, retry_after=1, **limits)
+    url = await server.start()
+    os.environ.update({
+        'BOT_API_URL': url,
+        'DB_PATH': os.path.join(tempfile.mkdtemp(prefix='e2e-load-'), 'bot_data.db'),
+        'CHANNEL_ID': str(CHANNEL_ID),
+        'MODERATION_CHAT_ID': str(MODERATION_CHAT_ID),
+    })
+    if not args.telegram_limits:
+        # Ограничитель бота тоже снимаем: меряется сам бот, а не лимиты Telegram
+        os.environ.update({
+            'RATE_LIMIT_GLOBAL': '1000000', 'RATE_LIMIT_GROUP': '60000000',
+            'RATE_LIMIT_PRIVATE': '1000000', 'RATE_LIMIT_PRIVATE_BURST': '1000000',
+        })
+
+    from app import metrics
+    from app.bot import bot, dp
+    from app.database import db
+    from app.handlers import register_all_handlers
+
+    logging.getLogger().setLevel(logging.ERROR)
+    db.sync.init_database()
+    register_all_handlers(dp)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+
+    harness = LoadHarness(server, args)
+    moderation_inbox = server.subscribe(MODERATION_CHAT_ID)
+    moderators = [asyncio.create_task(harness.moderator(moderation_inbox)) for _ in range(args.moderators)]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(harness.user(200000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    for task in moderators:
+        task.cancel()
+    await dp.stop_polling()
+    await polling
+    await dp.storage.close()
+    db.close()
+    await server.stop()
+
+    api_calls = sum(server.calls.values()) - server.calls['getUpdates']
+    return {
+        'config': vars(args),
+        'elapsed_seconds': round(elapsed, 2),
+        'updates': harness.updates_sent,
+        'updates_per_sec': round(harness.updates_sent / elapsed, 1),
+        'wizard_completed': len(harness.wizard_times),
+        'cycle_completed': len(harness.cycle_times),
+        'wizard_seconds': distribution(harness.wizard_times),
+        'cycle_seconds': distribution(harness.cycle_times),
+        'failed_users': sum(harness.failed_steps.values()),
+        'failed_users_by_step': dict(harness.failed_steps),
+        'failed_user_rate': round(sum(harness.failed_steps.values()) / args.users, 4),
+        'api_calls': api_calls,
+        'api_calls_by_method': dict(server.calls),
+        'server_429': sum(server.rejected.values()),
+        'server_429_rate': round(sum(server.rejected.values()) / max(1, api_calls), 4),
+        'handler_errors': metric_total(metrics.handler_errors),
+        'bot_api_errors': metric_total(metrics.api_errors),
+    }
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Краткая сводка"""
+    users = report['config']['users']
+    print(f"пользователей: {users}, время: {report['elapsed_seconds']} с, "
+          f"апдейтов: {report['updates']} ({report['updates_per_sec']:,.0f} апд/с)")
+    wizard, cycle = report['wizard_seconds'], report['cycle_seconds']
+    print(f"мастер пройден: {report['wizard_completed']}/{users}, "
+          f"p50={wizard['p50']} p95={wizard['p95']} p99={wizard['p99']} с")
+    print(f"до «Продано»: {report['cycle_completed']}/{users}, "
+          f"p50={cycle['p50']} p95={cycle['p95']} p99={cycle['p99']} с")
+    print(f"застряли: {report['failed_users']} ({report['failed_user_rate']:.2%}) {report['failed_users_by_step']}")
+    print(f"вызовов Bot API: {report['api_calls']}, 429 от сервера: {report['server_429']} "
+          f"({report['server_429_rate']:.2%})")
+    print(f"исключений в обработчиках: {report['handler_errors']}, ошибок Bot API у бота: {report['bot_api_errors']}")
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--moderators', type=int, default=2)
+    parser.add_argument('--ramp', type=float, default=5.0, help="За сколько секунд приходят все пользователи")
+    parser.add_argument('--think', type=float, default=0.0, help="Максимальная пауза пользователя между шагами, с")
+    parser.add_argument('--latency', type=float, default=0.01, help="Задержка Bot API, с")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля запросов со случайным 429")
+    parser.add_argument('--telegram-limits', action='store_true',
+                        help="Ограничения частоты как у Telegram (на сервере и в боте)")
+    parser.add_argument('--step-timeout', type=float, default=60.0, help="Сколько ждать ответа бота на шаге, с")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Файл для JSON-отчёта")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Автоматическое снятие устаревших объявлений: пакеты, очередь правок и перезапуск.
+
+Наполняет ads (как benchmarks.search) объявлениями возрастом до
+90 дней и поднимает FakeBotAPI. Затем:
+  1. снимает устаревшие объявления пакетами и печатает время прохода и самой
+     долгой транзакции (столько ждут остальные писатели);
+  2. разбирает очередь правок постов и «обрывает» процесс на середине —
+     отменяет задачу, как при остановке бота;
+  3. после «перезапуска» дорабатывает очередь и проверяет, что каждый пост
+     снятого объявления помечен, повторных правок не больше одной, а второй
+     проход ничего не снимает заново. Правка выполняется хотя бы один раз
+     (см. app/expiry.py): обрыв между правкой поста и удалением строки
+     очереди повторяет ровно эту правку.
+
+Код выхода 1, если пост пропущен или объявление обработано повторно.
+
+Запуск: python -m benchmarks.expiry --ads 20000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.fake_bot_api import FakeBotAPI
+
+CHANNEL_ID = -1001
+
+class ChannelAPI(FakeBotAPI):
+    """FakeBotAPI, который считает правки постов канала, не храня сами посты"""
+
+    def __init__(self):
+        super().__init__(global_limit=None, group_limit=None)
+        self.edits = Counter()
+
+    async def _editMessageCaption(self, params):
+        self.edits[int(params['message_id'])] += 1
+        return self._message(params['chat_id'], caption=params.get('caption', ''))
+
+    _editMessageText = _editMessageCaption
+
+async def run(args) -> bool:
+    """Прогон; возвращает True, если проверки прошли"""
+    server = ChannelAPI()
+    os.environ.update({
+        'BOT_API_URL': await server.start(),
+        'DB_PATH': os.path.join(tempfile.mkdtemp(prefix='expiry-bench-'), 'bot_data.db'),
+        'CHANNEL_ID': str(CHANNEL_ID),
+        # Меряется сам разбор очереди, а не лимиты Telegram
+        'RATE_LIMIT_GLOBAL': '1000000', 'RATE_LIMIT_GROUP': '60000000',
+        'RATE_LIMIT_PRIVATE': '1000000', 'RATE_LIMIT_PRIVATE_BURST': '1000000',
+        # Снятие по умолчанию выключено
+        'AD_TTL_DAYS': '30', 'AD_TTL_DAYS_BY_CATEGORY': 'free=14,event=14,race=14', 'EXPIRY_RENEW_PROMPT': '1',
+    })
+    from app import expiry
+    from app.bot import bot
+    from app.database import db
+    from app.throttling import TokenBucket
+    from benchmarks.search import seed
+
+    logging.getLogger().setLevel(logging.ERROR)
+    random.seed(42)
+    seed(db.sync, args.ads)
+    with db.sync.get_connection() as conn:
+        conn.execute("""
+            UPDATE ads SET published_at = datetime('now', '-' || (abs(random()) % (90 * 86400)) || ' seconds')
+        """)
+        conn.execute("UPDATE ad_channel_posts SET chat_id = ?", (CHANNEL_ID,))
+        conn.commit()
+        active = conn.execute("SELECT COUNT(*) FROM ads WHERE status = 'active'").fetchone()[0]
+
+    # Самая долгая транзакция: обёртка над выполнением единицы работы
+    transactions = []
+    apply_batch = db.sync.apply_unit_of_work
+
+    def timed_batch(calls):
+        started = time.perf_counter()
+        try:
+            return apply_batch(calls)
+        finally:
+            transactions.append(time.perf_counter() - started)
+    db.sync.apply_unit_of_work = timed_batch
+
+    started = time.perf_counter()
+    expired = await expiry.expire_stale_ads(batch_size=args.batch)
+    elapsed = time.perf_counter() - started
+    print(f"{args.ads} объявлений, активных {active}; снято {expired} за {elapsed * 1000:.0f} мс, "
+          f"{len(transactions)} транзакций, самая долгая {max(transactions) * 1000:.1f} мс")
+
+    edits = TokenBucket(args.edits_per_minute / 60, 1)
+    task = asyncio.create_task(expiry.process_expiry_queue(edits, batch_size=args.batch))
+    while sum(server.edits.values()) < expired // 2:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    with db.sync.get_connection(readonly=True) as conn:
+        left = conn.execute("SELECT COUNT(*) FROM expiry_queue").fetchone()[0]
+    print(f"остановка на середине: помечено {sum(server.edits.values())} постов, в очереди осталось {left}")
+
+    started = time.perf_counter()
+    resumed = await expiry.process_expiry_queue(edits, batch_size=args.batch)
+    elapsed = time.perf_counter() - started
+    again = await expiry.expire_stale_ads(batch_size=args.batch)
+    print(f"после перезапуска: разобрано {resumed} за {elapsed:.1f} с "
+          f"({resumed / elapsed:.0f} правок/с вместе с вопросами авторам); повторный проход снял {again}")
+
+    with db.sync.get_connection(readonly=True) as conn:
+        expected = {row[0] for row in conn.execute("SELECT p.message_id FROM ads a JOIN ad_channel_posts p ON p.ad_id = a.id WHERE a.status = 'expired'")}
+    missing = expected - set(server.edits)
+    repeated = sum(1 for count in server.edits.values() if count > 1)
+    print(f"постов без метки: {len(missing)}, помеченных дважды: {repeated}, "
+          f"вопросов авторам: {server.calls['sendMessage']}")
+
+    await bot.session.close()
+    db.close()
+    await server.stop()
+    # Повторной может быть только правка, оборванная остановкой
+    return not missing and repeated <= 1 and again == 0
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=200)
+    parser.add_argument('--edits-per-minute', type=float, default=600000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Telegram Bot API для нагрузочных проверок.
+
+Принимает запросы aiogram по адресу /bot<token>/<method>, отвечает
+правдоподобными объектами и может добавлять задержку, случайные 429 и
+ограничения частоты, похожие на настоящие: общее на бота и на каждую группу
+или канал. Бот направляется сюда через TelegramAPIServer.from_base(url).
+Подписавшись на чат (subscribe), можно получать отправленные и изменённые
+ботом сообщения — так симулированные пользователи «видят» ответы бота.
+
+Запуск отдельно: python -m benchmarks.fake_bot_api --port 8081
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+# Методы, которые отправляют или меняют сообщения и подпадают под ограничения
+MESSAGE_METHODS = {
+    'sendMessage', 'sendPhoto', 'sendMediaGroup', 'forwardMessage', 'copyMessage',
+    'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup',
+}
+
+class FakeBotAPI:
+    """Поддельный сервер Bot API с настраиваемой задержкой и ошибками 429"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, retry_after: int = 1,
+                 global_limit: Optional[int] = 30, group_limit: Optional[int] = 20):
+        """
+        :param latency: Задержка ответа, с
+        :param error_rate: Доля запросов, получающих 429 случайно
+        :param retry_after: retry_after для случайных 429, с
+        :param global_limit: Сообщений в секунду на бота (None — без ограничения)
+        :param group_limit: Сообщений в минуту в группу или канал (None — без ограничения)
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.global_limit = global_limit
+        self.group_limit = group_limit
+
+        self.calls = Counter()
+        self.rejected = Counter()
+        self.messages: Dict[tuple, Dict[str, Any]] = {}
+        self._message_ids = itertools.count(1)
+        self._global_window = deque()
+        self._chat_windows = defaultdict(deque)
+        self._update_ids = itertools.count(1)
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.inboxes: Dict[str, asyncio.Queue] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    def make_app(self) -> web.Application:
+        """Создаёт aiohttp-приложение"""
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Запускает сервер и возвращает базовый URL для TelegramAPIServer.from_base"""
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        """Останавливает сервер"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def push_update(self, update: Dict[str, Any]) -> None:
+        """Кладёт апдейт в очередь getUpdates"""
+        self.updates.put_nowait({'update_id': next(self._update_ids), **update})
+
+    def subscribe(self, chat_id) -> asyncio.Queue:
+        """Очередь сообщений, которые бот отправляет или меняет в чате"""
+        return self.inboxes.setdefault(str(chat_id), asyncio.Queue())
+
+    def _deliver(self, message: Dict[str, Any]) -> None:
+        """Передаёт сообщение подписчику чата, если он есть"""
+        inbox = self.inboxes.get(str(message['chat']['id']))
+        if inbox is not None:
+            inbox.put_nowait(dict(message))
+
+    @staticmethod
+    def _error(code: int, description: str, **parameters) -> web.Response:
+        """Ответ с ошибкой в формате Bot API"""
+        body = {'ok': False, 'error_code': code, 'description': description}
+        if parameters:
+            body['parameters'] = parameters
+        return web.json_response(body, status=code)
+
+    def _limited(self, method: str, chat_id: Optional[str]) -> Optional[int]:
+        """Возвращает retry_after, если запрос превышает ограничения"""
+        if method not in MESSAGE_METHODS:
+            return None
+        if self.error_rate and random.random() < self.error_rate:
+            return self.retry_after
+
+        now = time.monotonic()
+        checks = []
+        if self.global_limit:
+            checks.append((self._global_window, self.global_limit, 1.0))
+        if self.group_limit and chat_id and chat_id.startswith(('-', '@')):
+            checks.append((self._chat_windows[chat_id], self.group_limit, 60.0))
+
+        for window, limit, period in checks:
+            while window and now - window[0] >= period:
+                window.popleft()
+            if len(window) >= limit:
+                return max(1, math.ceil(period - (now - window[0])))
+        for window, _, _ in checks:
+            window.append(now)
+        return None
+
+    def _message(self, chat_id: str, **fields) -> Dict[str, Any]:
+        """Создаёт и запоминает сообщение"""
+        chat_id = int(chat_id) if chat_id.lstrip('-').isdigit() else chat_id
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if str(chat_id)[0] != '-' else 'channel'},
+            **fields,
+        }
+        self.messages[(str(chat_id), message['message_id'])] = message
+        self._deliver(message)
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Обрабатывает вызов метода Bot API"""
+        method = request.match_info['method']
+        params = dict(await request.post())
+        self.calls[method] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        chat_id = params.get('chat_id')
+        retry_after = self._limited(method, chat_id)
+        if retry_after is not None:
+            self.rejected[method] += 1
+            return self._error(429, f"Too Many Requests: retry after {retry_after}", retry_after=retry_after)
+
+        handler = getattr(self, f"_{method}", None)
+        if handler is None:
+            return web.json_response({'ok': True, 'result': True})
+        result = await handler(params)
+        if isinstance(result, web.Response):
+            return result
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _getMe(self, params):
+        return {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+
+    async def _getUpdates(self, params):
+        timeout = float(params.get('timeout') or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self.updates.get(), timeout or 0.001))
+        except asyncio.TimeoutError:
+            return []
+        while not self.updates.empty() and len(updates) < 100:
+            updates.append(self.updates.get_nowait())
+        return updates
+
+    async def _sendMessage(self, params):
+        fields = {'text': params.get('text', '')}
+        if params.get('reply_markup'):
+            fields['reply_markup'] = json.loads(params['reply_markup'])
+        return self._message(params['chat_id'], **fields)
+
+    async def _sendMediaGroup(self, params):
+        media = json.loads(params['media'])
+        messages = []
+        for i, item in enumerate(media):
+            photo = [{'file_id': item['media'], 'file_unique_id': item['media'][-16:], 'width': 1280, 'height': 960}]
+            fields = {'photo': photo, 'media_group_id': 'fake'}
+            if item.get('caption'):
+                fields['caption'] = item['caption']
+            messages.append(self._message(params['chat_id'], **fields))
+        return messages
+
+    async def _forwardMessage(self, params):
+        original = self.messages.get((params['from_chat_id'], int(params['message_id'])))
+        if original is None:
+            return self._error(400, "Bad Request: message to forward not found")
+        fields = {k: v for k, v in original.items() if k in ('text', 'caption', 'photo')}
+        return self._message(params['chat_id'], **fields)
+
+    async def _editMessageText(self, params):
+        message = self.messages.get((params.get('chat_id'), int(params.get('message_id') or 0)))
+        if message is None:
+            return self._message(params.get('chat_id') or '0', text=params.get('text', ''))
+        message['text'] = params.get('text', '')
+        if params.get('reply_markup'):
+            message['reply_markup'] = json.loads(params['reply_markup'])
+        else:
+            message.pop('reply_markup', None)
+        self._deliver(message)
+        return message
+
+    async def _editMessageCaption(self, params):
+        message = self.messages.get((params.get('chat_id'), int(params.get('message_id') or 0)))
+        if message is None:
+            return self._error(400, "Bad Request: message to edit not found")
+        message['caption'] = params.get('caption', '')
+        self._deliver(message)
+        return message
+
+    async def _deleteMessage(self, params):
+        self.messages.pop((params['chat_id'], int(params['message_id'])), None)
+        return True
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeBotAPI(latency=args.latency, error_rate=args.error_rate)
+    web.run_app(server.make_app(), host='127.0.0.1', port=args.port)
+
+if __name__ == "__main__":
+    main()
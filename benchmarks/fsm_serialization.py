@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Форматы данных FSM: JSON против packed (struct) и msgpack.
+
+Собирает данные мастера AdStates на каждом шаге — от выбора категории до
+просмотра (три file_id фото, описание до 500 символов кириллицей) — и для
+каждого формата печатает время dumps и loads в микросекундах и байт на строку.
+Затем пишет --users строк шага «просмотр» в БД и замеряет set_user_data,
+get_user_state, merge_user_data и размер файла. msgpack участвует, если пакет
+установлен.
+
+Напоследок проверяется, что строки, записанные в JSON, читаются после
+переключения формата. Код выхода 1, если данные после записи и чтения
+не совпали с исходными.
+
+Запуск: python -m benchmarks.fsm_serialization --rounds 20000 --users 20000
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db из app.database не должен трогать bot_data.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='fsm-serialization-'), 'bot_data.db')
+
+from app import serializers
+from app.database import Database
+from benchmarks.handler_latency import percentile
+
+WORDS = ['рама', 'сталь', 'покраска', 'родная', 'без', 'вмятин', 'размер', 'вилка', 'колёса', 'торг',
+         'уместен', 'самовывоз', 'центр', 'Пермь', 'состояние', 'отличное', 'пробег', 'небольшой']
+
+def file_id(rng: random.Random) -> str:
+    """file_id фото по длине как настоящий"""
+    return 'AgACAgIAAxkBAAI' + ''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_', k=68))
+
+def wizard_steps(rng: random.Random):
+    """Данные мастера после каждого шага: (шаг, данные)"""
+    photos = [file_id(rng) for _ in range(3)]
+    description = ''
+    while len(description) < 480:
+        description += rng.choice(WORDS) + ' '
+    data = {'category': 'sell', 'photos': []}
+    yield 'категория', dict(data)
+    data.update(photos=photos, photo_uids=[f"AQAD{rng.randrange(10 ** 12):012d}" for _ in photos])
+    yield 'фото', dict(data)
+    data.update(title="Рама Surly Steamroller 56, сталь 4130")
+    yield 'заголовок', dict(data)
+    data.update(description=description.strip())
+    yield 'описание', dict(data)
+    data.update(price="25 000 ₽", user_id=123456789, user_mention='@fixed_rider', user_display='Фикс Райдер')
+    yield 'просмотр', dict(data)
+
+def timed_us(func, value, rounds: int) -> float:
+    """Медианное время вызова по пачкам, мкс"""
+    batches = []
+    batch = 100
+    for _ in range(max(1, rounds // batch)):
+        started = time.perf_counter()
+        for _ in range(batch):
+            func(value)
+        batches.append((time.perf_counter() - started) / batch)
+    return percentile(batches, 50) * 1e6
+
+def available():
+    """Сериализаторы, которые можно создать здесь"""
+    result = []
+    for name in serializers.SERIALIZERS:
+        try:
+            result.append(serializers.get_serializer(name))
+        except RuntimeError as e:
+            print(f"{name}: пропущен — {e}")
+    return result
+
+def compare_codecs(formats, rounds: int) -> bool:
+    """dumps/loads и размер на каждом шаге мастера"""
+    ok = True
+    print(f"\n{'шаг':<11}{'формат':<9}{'dumps, мкс':>11}{'loads, мкс':>11}{'байт':>7}{'к JSON':>8}")
+    for step, data in wizard_steps(random.Random(42)):
+        json_size = None
+        for serializer in formats:
+            encoded = serializer.dumps(data)
+            size = len(encoded.encode('utf-8') if isinstance(encoded, str) else encoded)
+            json_size = json_size or size
+            if serializers.loads(encoded) != data:
+                print(f"  ошибка: {serializer.name} на шаге «{step}» вернул другие данные")
+                ok = False
+            dumps_us = timed_us(serializer.dumps, data, rounds)
+            loads_us = timed_us(serializers.loads, encoded, rounds)
+            print(f"{step:<11}{serializer.name:<9}{dumps_us:>11.2f}{loads_us:>11.2f}{size:>7}{size / json_size:>8.0%}")
+    return ok
+
+def compare_database(formats, users: int, tmp: str) -> bool:
+    """Строки шага «просмотр» в БД: операции и размер файла"""
+    *_, (_, data) = wizard_steps(random.Random(7))
+    ok = True
+    print(f"\n{users} строк «просмотр»")
+    print(f"{'формат':<9}{'save, оп/с':>12}{'get, оп/с':>11}{'merge, оп/с':>13}{'файл, КиБ':>11}")
+    for serializer in formats:
+        path = os.path.join(tmp, f"{serializer.name}.db")
+        database = Database(path, fsm_serializer=serializer.name)
+
+        started = time.perf_counter()
+        with database.transaction():
+            for user_id in range(users):
+                database.set_user_data(user_id, data)
+        save_rate = users / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for user_id in range(users):
+            database.get_user_state(user_id)
+        get_rate = users / (time.perf_counter() - started)
+
+        merges = min(users, 5000)
+        started = time.perf_counter()
+        for user_id in range(merges):
+            database.merge_user_data(user_id, {'price': "24 000 ₽"}, 'AdStates:review')
+        merge_rate = merges / (time.perf_counter() - started)
+
+        if database.get_user_state(0)['data'] != {**data, 'price': "24 000 ₽"}:
+            print(f"  ошибка: {serializer.name} вернул из БД другие данные")
+            ok = False
+        with database.get_connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        database.close()
+        size_kib = os.path.getsize(path) / 1024
+        print(f"{serializer.name:<9}{save_rate:>12,.0f}{get_rate:>11,.0f}{merge_rate:>13,.0f}{size_kib:>11,.0f}")
+    return ok
+
+def check_switch(formats, tmp: str) -> bool:
+    """Строки в JSON читаются и дополняются после переключения формата"""
+    *_, (_, data) = wizard_steps(random.Random(9))
+    ok = True
+    for serializer in formats:
+        if serializer.name == 'json':
+            continue
+        path = os.path.join(tmp, f"switch-{serializer.name}.db")
+        database = Database(path, fsm_serializer='json')
+        database.set_user_data(1, data)
+        database.close()
+        database = Database(path, fsm_serializer=serializer.name)
+        same = database.get_user_state(1)['data'] == data
+        merged = database.merge_user_data(1, {'title': "Новая рама"}) == {**data, 'title': "Новая рама"}
+        database.close()
+        print(f"JSON → {serializer.name}: чтение {'OK' if same else 'ОШИБКА'}, слияние {'OK' if merged else 'ОШИБКА'}")
+        ok = ok and same and merged
+    return ok
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=20000)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    formats = available()
+    ok = compare_codecs(formats, args.rounds)
+    with tempfile.TemporaryDirectory() as tmp:
+        ok = compare_database(formats, args.users, tmp) and ok
+        print()
+        ok = check_switch(formats, tmp) and ok
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
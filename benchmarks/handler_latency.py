@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк задержки обработчиков: синхронная БД против AsyncDatabase.
+
+Моделирует N одновременных пользователей, каждый из которых проходит шаги
+мастера создания объявления. Шаг обработчика — чтение и запись состояния FSM
+плюс ожидание ответа Bot API. Параллельно идут «лёгкие» обработчики без БД
+(вроде /start): их задержка показывает, насколько запросы к SQLite блокируют
+цикл событий. Выводит p50/p99 для обоих видов обработчиков.
+
+БД лежит во временном каталоге, где fsync почти бесплатен, поэтому каждый
+commit писателя дополнительно ждёт --commit-delay (по умолчанию 5 мс — fsync
+обычного облачного диска). Именно это ожидание синхронная БД проводит в цикле
+событий; с --commit-delay 0 видна только цена перехода в поток БД.
+
+Запуск: python -m benchmarks.handler_latency --users 200 --steps 10 --commit-delay 0.005
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db из app.database не должен трогать bot_data.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='handler-latency-'), 'bot_data.db')
+
+from app.database import Database, AsyncDatabase
+
+class SlowCommitConnection:
+    """Соединение писателя, у которого commit ждёт, как fsync медленного диска"""
+
+    def __init__(self, conn, delay: float):
+        self._conn = conn
+        self._delay = delay
+
+    def commit(self):
+        self._conn.commit()
+        time.sleep(self._delay)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def slow_database(path: str, commit_delay: float) -> Database:
+    """Database, commit писателя которой стоит commit_delay секунд"""
+    database = Database(path)
+    if commit_delay:
+        database.pool._writer = SlowCommitConnection(database.pool._writer, commit_delay)
+    return database
+
+def percentile(values, q):
+    """Возвращает q-й перцентиль списка значений"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def light_handlers(done: asyncio.Event, api_delay: float):
+    """Обработчики без обращения к БД, идущие на фоне нагрузки"""
+    latencies = []
+    while not done.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(api_delay)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+async def with_light_handlers(load, api_delay: float):
+    """Запускает нагрузку и параллельно измеряет лёгкие обработчики"""
+    done = asyncio.Event()
+    probe = asyncio.create_task(light_handlers(done, api_delay))
+    latencies = await load
+    done.set()
+    return latencies, await probe
+
+async def run_sync(database: Database, users: int, steps: int, api_delay: float):
+    """Шаги мастера с синхронными вызовами БД прямо в цикле событий"""
+    latencies = []
+
+    async def user(user_id):
+        for step in range(steps):
+            started = time.perf_counter()
+            database.get_user_state(user_id)
+            database.merge_user_data(user_id, {f'step_{step}': 'x' * 50}, f'step_{step}')
+            await asyncio.sleep(api_delay)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(user(i) for i in range(users)))
+    return latencies
+
+async def run_async(database: AsyncDatabase, users: int, steps: int, api_delay: float):
+    """Шаги мастера с вызовами БД в отдельном потоке"""
+    latencies = []
+
+    async def user(user_id):
+        for step in range(steps):
+            started = time.perf_counter()
+            await database.get_user_state(user_id)
+            await database.merge_user_data(user_id, {f'step_{step}': 'x' * 50}, f'step_{step}')
+            await asyncio.sleep(api_delay)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(user(i) for i in range(users)))
+    return latencies
+
+def report(name, latencies, light, elapsed):
+    """Печатает сводку по задержкам"""
+    print(
+        f"{name:>6}: шагов={len(latencies)} за {elapsed:.2f} с, "
+        f"p50={statistics.median(latencies) * 1000:.1f} мс, "
+        f"p99={percentile(latencies, 99) * 1000:.1f} мс; "
+        f"без БД p50={statistics.median(light) * 1000:.1f} мс, "
+        f"p99={percentile(light, 99) * 1000:.1f} мс"
+    )
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--api-delay', type=float, default=0.02, help="Задержка Bot API, с")
+    parser.add_argument('--commit-delay', type=float, default=0.005, help="Время fsync при commit, с")
+    args = parser.parse_args()
+
+    print(f"{args.users} пользователей × {args.steps} шагов, Bot API {args.api_delay * 1000:.0f} мс, "
+          f"commit {args.commit_delay * 1000:.0f} мс")
+    with tempfile.TemporaryDirectory() as tmp:
+        database = slow_database(os.path.join(tmp, 'sync.db'), args.commit_delay)
+        started = time.perf_counter()
+        latencies, light = asyncio.run(with_light_handlers(
+            run_sync(database, args.users, args.steps, args.api_delay), args.api_delay
+        ))
+        report('sync', latencies, light, time.perf_counter() - started)
+
+        async_database = AsyncDatabase(slow_database(os.path.join(tmp, 'async.db'), args.commit_delay))
+        started = time.perf_counter()
+        latencies, light = asyncio.run(with_light_handlers(
+            run_async(async_database, args.users, args.steps, args.api_delay), args.api_delay
+        ))
+        report('async', latencies, light, time.perf_counter() - started)
+        async_database.close()
+
+if __name__ == "__main__":
+    main()
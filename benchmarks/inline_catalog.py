@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Каталог в инлайн-режиме на 100k объявлений: листание по ключу против OFFSET и кэш страниц.
+
+Наполняет ads (как benchmarks.search) и:
+  1. проходит все страницы категории и всего каталога по ключу (published_at, id) и проверяет,
+     что каждое активное объявление встретилось ровно один раз — в том числе
+     при одинаковом published_at у многих объявлений;
+  2. замеряет страницу N по ключу и через OFFSET для каталога категории и
+     для поиска по слову: по ключу дальняя страница стоит столько же, сколько первая;
+  3. прогоняет «набор текста» — серию инлайн-запросов от многих пользователей —
+     через кэш страниц и печатает долю попаданий и время ответа.
+
+Код выхода 1, если листание по ключу потеряло или повторило объявление.
+
+Запуск: python -m benchmarks.inline_catalog --ads 100000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Optional
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='inline-bench-'), 'bot_data.db')
+
+from app.database import db, _fts_query
+from benchmarks.handler_latency import percentile
+from benchmarks.search import seed
+
+PAGE = 20
+
+def walk_category(category: Optional[str]) -> bool:
+    """Проходит все страницы категории (None — всего каталога) по ключу и сверяет с полным списком"""
+    seen, after = [], None
+    while True:
+        ads = db.sync.browse_published_ads([], category, after, PAGE)
+        seen.extend(ad['id'] for ad in ads)
+        if len(ads) < PAGE:
+            break
+        after = (ads[-1]['published_at'], ads[-1]['id'])
+    with db.sync.get_connection(readonly=True) as conn:
+        expected = [row[0] for row in conn.execute(
+            "SELECT id FROM ads WHERE coalesce(?, category) = category AND status = 'active' "
+            "ORDER BY published_at DESC, id DESC",
+            (category,)
+        )]
+    ok = seen == expected
+    print(f"листание {'#' + category if category else 'каталога'}: {len(seen)} объявлений, {len(expected)} ожидалось — {'OK' if ok else 'РАСХОЖДЕНИЕ'}")
+    return ok
+
+def keyset_after(words, category, page: int):
+    """Ключ начала страницы page (его получил бы клиент из next_offset); None — первая страница или страницы нет"""
+    after = None
+    for _ in range(page):
+        ads = db.sync.browse_published_ads(words, category, after, PAGE)
+        if len(ads) < PAGE:
+            # Каталог закончился раньше: следующей страницы клиент бы не получил
+            return None
+        after = (ads[-1]['published_at'], ads[-1]['id'])
+    return after
+
+def offset_page(words, category, page: int):
+    """Та же страница через OFFSET"""
+    with db.sync.get_connection(readonly=True) as conn:
+        if words:
+            return conn.execute("""
+                SELECT a.id, a.title, a.photos, p.caption FROM ads_fts
+                JOIN ads a ON a.id = ads_fts.rowid
+                LEFT JOIN ad_channel_posts p ON p.ad_id = a.id
+                WHERE ads_fts MATCH ? AND a.status = 'active'
+                ORDER BY ads_fts.rowid DESC LIMIT ? OFFSET ?
+            """, (_fts_query(words), PAGE, page * PAGE)).fetchall()
+        return conn.execute("""
+            SELECT a.id, a.title, a.photos, p.caption FROM ads a
+            LEFT JOIN ad_channel_posts p ON p.ad_id = a.id
+            WHERE a.category = ? AND a.status = 'active'
+            ORDER BY a.published_at DESC, a.id DESC LIMIT ? OFFSET ?
+        """, (category, PAGE, page * PAGE)).fetchall()
+
+def timed(func, rounds: int) -> float:
+    """Медианное время вызова, мс"""
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return percentile(latencies, 50) * 1000
+
+def compare_pages(rounds: int) -> None:
+    """Страница N по ключу и через OFFSET"""
+    print(f"\n{'запрос':<14}{'страница':>9}{'ключ, мс':>10}{'OFFSET, мс':>12}")
+    for name, words, category in (('#продам', [], 'sell'), ('«рама»', ['рама'], None)):
+        for page in (0, 10, 100, 400):
+            after = keyset_after(words, category, page)
+            if page and after is None:
+                print(f"{name:<14}{page + 1:>9}{'нет такой страницы':>22}")
+                continue
+            keyset_ms = timed(lambda: db.sync.browse_published_ads(words, category, after, PAGE), rounds)
+            offset_ms = timed(lambda: offset_page(words, category, page), rounds)
+            print(f"{name:<14}{page + 1:>9}{keyset_ms:>10.2f}{offset_ms:>12.2f}")
+
+async def typing_storm(users: int) -> None:
+    """Пользователи набирают запросы по буквам; страницы идут через кэш"""
+    from app.handlers.inline import load_page, results_cache
+    from app.handlers.search import parse_search_query
+
+    phrases = ['рама сталь', 'колесо', 'седло brooks', '#продам вилка', 'shimano', '#куплю рама']
+    queries = []
+    for _ in range(users):
+        phrase = random.choice(phrases)
+        # Клиент Telegram шлёт запрос почти на каждую букву
+        queries.extend(phrase[:length] for length in range(2, len(phrase) + 1))
+    random.shuffle(queries)
+
+    latencies = []
+
+    async def ask(query):
+        words, category = parse_search_query(query)
+        started = time.perf_counter()
+        await results_cache.get((tuple(words), category, ""), lambda: load_page(words, category, None))
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    # Пачками, как приходят апдейты при одновременном наборе
+    for i in range(0, len(queries), 50):
+        await asyncio.gather(*(ask(q) for q in queries[i:i + 50]))
+    elapsed = time.perf_counter() - started
+    total = results_cache.hits + results_cache.misses
+    print(f"\nнабор текста: {users} пользователей, {total} инлайн-запросов за {elapsed:.2f} с")
+    print(f"попаданий в кэш: {results_cache.hits} ({results_cache.hits / total:.0%}), запросов к БД: {results_cache.misses}")
+    print(f"ответ: p50={percentile(latencies, 50) * 1000:.2f} мс, p99={percentile(latencies, 99) * 1000:.2f} мс")
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--users', type=int, default=500)
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger('app.database').setLevel(logging.WARNING)
+    random.seed(42)
+    seed(db.sync, args.ads)
+    print(f"{args.ads} объявлений")
+
+    ok = all([walk_category('buy'), walk_category(None)])
+    compare_pages(args.rounds)
+    asyncio.run(typing_storm(args.users))
+    db.close()
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
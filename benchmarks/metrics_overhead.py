@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Накладные расходы метрик app/metrics.py.
+
+Прогоняет одни и те же синтетические апдейты через диспетчер с простым
+обработчиком без мидлварей метрик и с ними (setup_metrics), без сети и БД,
+и печатает время на апдейт. Отдельно — стоимость одного observe() и время
+отрисовки /metrics.
+
+Запуск: python -m benchmarks.metrics_overhead --updates 20000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db из app.database не должен трогать bot_data.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='metrics-overhead-'), 'bot_data.db')
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message, Update
+
+from app import metrics
+from benchmarks.webhook_load import make_update
+
+def make_dispatcher(with_metrics: bool) -> Dispatcher:
+    """Диспетчер с обработчиком, который ничего не отправляет"""
+    dp = Dispatcher()
+
+    @dp.message()
+    async def process_title(message: Message):
+        return message.text
+
+    if with_metrics:
+        metrics.setup_metrics(dp)
+    return dp
+
+async def per_update(dp: Dispatcher, bot: Bot, updates) -> float:
+    """Среднее время обработки апдейта, мкс"""
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+async def main_async(args):
+    """Сравнение диспетчеров и микрозамеры"""
+    bot = Bot(token='0:benchmark')
+    updates = [Update.model_validate(make_update(i), context={'bot': bot}) for i in range(args.updates)]
+    plain, measured = make_dispatcher(False), make_dispatcher(True)
+
+    # Прогрев, затем попеременные прогоны, чтобы сгладить шум
+    await per_update(plain, bot, updates[:1000])
+    await per_update(measured, bot, updates[:1000])
+    plain_us, measured_us = [], []
+    for _ in range(args.rounds):
+        plain_us.append(await per_update(plain, bot, updates))
+        measured_us.append(await per_update(measured, bot, updates))
+    plain_best, measured_best = min(plain_us), min(measured_us)
+    print(f"без метрик: {plain_best:.1f} мкс/апдейт")
+    print(
+        f" с метриками: {measured_best:.1f} мкс/апдейт "
+        f"(+{measured_best - plain_best:.1f} мкс, {(measured_best / plain_best - 1) * 100:+.1f}%)"
+    )
+
+    histogram = metrics.Histogram('bench_seconds', "Замер", ['label'])
+    started = time.perf_counter()
+    for i in range(args.updates):
+        histogram.observe(0.004, 'label')
+    print(f"observe(): {(time.perf_counter() - started) / args.updates * 1e9:.0f} нс")
+
+    started = time.perf_counter()
+    body = metrics.render()
+    print(f"render(): {(time.perf_counter() - started) * 1000:.2f} мс, {len(body)} байт")
+    await bot.session.close()
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=3)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Локальная проверка многопроцессного режима (WORKERS > 1).
+
+Поднимает FakeBotAPI, направляет на него процессы-обработчики из
+app/workers.py через BOT_API_URL и временную БД через DB_PATH и проверяет:
+
+1. пропускную способность: N пользователей шлют /start, считаем ответы;
+2. модерацию: несколько модераторов одновременно жмут «Одобрить» на одних
+   и тех же объявлениях — каждое должно попасть в канал ровно один раз.
+
+Запуск: python -m benchmarks.multiworker --workers 4 --updates 2000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+
+CHANNEL_ID = -1001
+MODERATION_CHAT_ID = -1002
+
+def start_update(update_id: int, users: int) -> dict:
+    """Команда /start от одного из users пользователей"""
+    user_id = 100000 + update_id % users
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench'},
+            'text': '/start',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+        },
+    }
+
+def approve_update(update_id: int, ad_id: int, moderator_id: int) -> dict:
+    """Нажатие «Одобрить» на карточке объявления"""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': {'id': moderator_id, 'is_bot': False, 'first_name': 'Moderator'},
+            'chat_instance': 'bench',
+            'data': f"approve_{ad_id}",
+            'message': {
+                'message_id': ad_id,
+                'date': int(time.time()),
+                'chat': {'id': MODERATION_CHAT_ID, 'type': 'supergroup'},
+                'text': 'Новое объявление',
+            },
+        },
+    }
+
+async def wait_for(predicate, timeout: float) -> bool:
+    """Ждёт выполнения условия"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.01)
+    return predicate()
+
+async def main_async(args):
+    """Поднимает сервер и процессы, прогоняет обе проверки"""
+    from benchmarks.fake_bot_api import FakeBotAPI
+
+    server = FakeBotAPI(latency=args.latency, global_limit=None, group_limit=None)
+    url = await server.start()
+    workdir = tempfile.mkdtemp(prefix='multiworker-')
+    # Процессы-обработчики запускаются через spawn и читают настройки из окружения
+    os.environ.update({
+        'BOT_API_URL': url,
+        'DB_PATH': os.path.join(workdir, 'bot_data.db'),
+        'CHANNEL_ID': str(CHANNEL_ID),
+        'MODERATION_CHAT_ID': str(MODERATION_CHAT_ID),
+        'RATE_LIMIT_GLOBAL': '100000',
+        'RATE_LIMIT_GROUP': '1000000',
+        'RATE_LIMIT_PRIVATE': '100000',
+        'RATE_LIMIT_PRIVATE_BURST': '100000',
+    })
+
+    from app.database import db
+    from app.workers import WorkerPool
+
+    db.sync.init_database()
+    ad_ids = [
+        await db.save_moderation_ad(200000 + i, {
+            'category': 'sell', 'photos': [f"photo-{i}"], 'title': f"Рама {i}",
+            'description': 'Сталь', 'price': '10000', 'user_mention': '@bench', 'user_display': 'Bench',
+        })
+        for i in range(args.ads)
+    ]
+
+    pool = WorkerPool(args.workers)
+    pool.start()
+    # Ждём, пока процессы поднимутся: по одному /start на каждого
+    for i in range(args.workers * 4):
+        pool.route(start_update(10**9 + i, args.workers * 4))
+    if not await wait_for(lambda: server.calls['sendMessage'] >= args.workers * 4, 60):
+        raise SystemExit("Процессы-обработчики не ответили")
+
+    baseline = server.calls['sendMessage']
+    started = time.perf_counter()
+    for update_id in range(1, args.updates + 1):
+        pool.route(start_update(update_id, args.users))
+    await wait_for(lambda: server.calls['sendMessage'] - baseline >= args.updates, 120)
+    elapsed = time.perf_counter() - started
+    answered = server.calls['sendMessage'] - baseline
+    print(
+        f"обработчиков: {args.workers}, /start: {answered}/{args.updates} за {elapsed:.2f} с "
+        f"({answered / elapsed:,.0f} апд/с)"
+    )
+
+    update_id = args.updates + 1
+    for ad_id in ad_ids:
+        for moderator in range(args.moderators):
+            pool.route(approve_update(update_id, ad_id, 300000 + moderator))
+            update_id += 1
+    await wait_for(lambda: server.calls['sendMediaGroup'] >= args.ads, 60)
+    # Даём время опоздавшим повторным публикациям, если они есть
+    await asyncio.sleep(1)
+
+    await asyncio.get_running_loop().run_in_executor(None, pool.stop)
+    published = server.calls['sendMediaGroup']
+    with db.sync.get_connection(readonly=True) as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM ad_channel_posts").fetchone()[0]
+    db.close()
+    await server.stop()
+
+    print(
+        f"одобрений: {args.ads} объявлений × {args.moderators} модераторов, "
+        f"публикаций в канал: {published}, постов в ad_channel_posts: {rows}"
+    )
+    if published != args.ads or rows != args.ads:
+        raise SystemExit("Объявления опубликованы не ровно по одному разу")
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--ads', type=int, default=20)
+    parser.add_argument('--moderators', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.005, help="Задержка Bot API, с")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Список /my у продавца с сотнями объявлений: страница по ключу против всей истории.
+
+Наполняет ads (как benchmarks.search) и добавляет продавцов с
+разным числом объявлений — многие опубликованы в одну секунду, как при
+массовой загрузке. Для каждого:
+  1. проходит все страницы get_user_ads по ключу и проверяет, что каждое
+     объявление встретилось ровно один раз;
+  2. сравнивает время первой и последней страницы со старой загрузкой всей
+     истории (SELECT * ... ORDER BY published_at DESC) и число прочитанных строк.
+
+Код выхода 1, если листание потеряло или повторило объявление.
+
+Запуск: python -m benchmarks.my_ads --ads 100000 --sellers 10,500,5000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='my-ads-bench-'), 'bot_data.db')
+
+from app.database import db
+from benchmarks.inline_catalog import timed
+from benchmarks.search import seed
+
+PAGE = 5
+
+def add_seller(user_id: int, ads: int) -> None:
+    """Объявления продавца: пачками по 50 в одну секунду"""
+    with db.sync.get_connection() as conn:
+        conn.executemany("""
+            INSERT INTO ads (user_id, category, title, price, status, published_at)
+            VALUES (?, 'sell', ?, '1 000 ₽', ?, datetime('2026-01-01', ? || ' seconds'))
+        """, [(user_id, f"Лот {i}", random.choice(['active', 'sold', 'expired']), i // 50) for i in range(ads)])
+        conn.commit()
+
+def walk(user_id: int):
+    """Все страницы по ключу: (ID объявлений, ID начала последней страницы)"""
+    seen, before_id, last_before = [], None, None
+    while True:
+        ads = db.sync.get_user_ads(user_id, before_id, PAGE)
+        seen.extend(ad['id'] for ad in ads)
+        if len(ads) < PAGE:
+            return seen, last_before if not ads else before_id
+        last_before, before_id = before_id, ads[-1]['id']
+
+def full_history(user_id: int):
+    """Как было: вся история продавца в памяти"""
+    with db.sync.get_connection(readonly=True) as conn:
+        return conn.execute(
+            "SELECT * FROM ads WHERE user_id = ? AND published_at IS NOT NULL ORDER BY published_at DESC", (user_id,)
+        ).fetchall()
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=100000)
+    parser.add_argument('--sellers', default='10,500,5000')
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger('app.database').setLevel(logging.WARNING)
+    random.seed(42)
+    seed(db.sync, args.ads)
+    print(f"{args.ads} объявлений")
+
+    ok = True
+    print(f"{'объявлений':>11}{'страниц':>9}{'первая, мс':>12}{'последняя, мс':>15}{'вся история, мс':>17}")
+    for number, size in enumerate(int(s) for s in args.sellers.split(',')):
+        user_id = 10 ** 9 + number
+        add_seller(user_id, size)
+        seen, last_before = walk(user_id)
+        with db.sync.get_connection(readonly=True) as conn:
+            expected = [row[0] for row in conn.execute(
+                "SELECT id FROM ads WHERE user_id = ? ORDER BY published_at DESC, id DESC", (user_id,)
+            )]
+        if seen != expected:
+            print(f"РАСХОЖДЕНИЕ у продавца с {size} объявлениями: {len(seen)} из {len(expected)}")
+            ok = False
+
+        first_ms = timed(lambda: db.sync.get_user_ads(user_id, None, PAGE + 1), args.rounds)
+        last_ms = timed(lambda: db.sync.get_user_ads(user_id, last_before, PAGE + 1), args.rounds)
+        full_ms = timed(lambda: full_history(user_id), args.rounds)
+        pages = -(-size // PAGE)
+        print(f"{size:>11}{pages:>9}{first_ms:>12.3f}{last_ms:>15.3f}{full_ms:>17.3f}")
+
+    print("листание по ключу: " + ("каждое объявление ровно один раз — OK" if ok else "есть расхождения"))
+    db.close()
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
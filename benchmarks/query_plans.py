@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Проверка планов частых запросов: каждый должен идти по индексу.
+
+Создаёт временную БД со всеми миграциями, наполняет её через методы Database
+и вызывает методы горячего пути, записывая через set_trace_callback запросы,
+которые они на самом деле выполняют. Для каждого записанного запроса
+выполняется EXPLAIN QUERY PLAN; код выхода 1, если хотя бы один из них
+сканирует таблицу целиком или сортирует результат во временном B-дереве.
+
+Запуск: python -m benchmarks.query_plans
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db из app.database не должен трогать bot_data.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='query-plans-'), 'bot_data.db')
+
+from app.database import Database
+
+CHANNEL_ID = -1001
+USER_ID = 1
+
+# Запросы, которые проверяются (служебные BEGIN, COMMIT, PRAGMA пропускаются)
+STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+# Допустимые обходы: очередь читается с головы в порядке первичного ключа, LIMIT останавливает обход
+ALLOWED_SCANS = {
+    'get_expiry_queue': {'SCAN q'},
+}
+
+def seed(database: Database, count: int = 30) -> dict:
+    """Объявления во всех статусах, как их создают обработчики; возвращает ключи для вызовов"""
+    ad_ids = []
+    for i in range(count):
+        ad_ids.append(database.save_moderation_ad(USER_ID + i % 3, {
+            'category': ('sell', 'buy', 'free')[i % 3],
+            'photos': [f"photo-{i}"],
+            'photo_uids': [f"uid-{i}", "uid-shared"],
+            'title': f"Рама {i}",
+            'description': "Сталь, покраска родная",
+            'price': "10 000 ₽",
+        }))
+    published = ad_ids[:count // 2]
+    database.claim_moderation_ads(published, 'approved', 1, "Модератор")
+    for ad_id in published:
+        database.publish_ad(ad_id, ad_id, CHANNEL_ID, caption="Пост")
+    database.merge_user_data(USER_ID, {'title': "Рама"}, 'AdStates:review')
+    return {'published': published, 'pending': ad_ids[count // 2:]}
+
+def hot_calls(database: Database, keys: dict) -> dict:
+    """Название -> вызов метода Database горячего пути"""
+    first, last = keys['published'][0], keys['published'][-1]
+    page = database.browse_published_ads([], 'sell', None, 2)
+    after = (page[-1]['published_at'], page[-1]['id'])
+    return {
+        'get_published_ad_by_message': lambda: database.get_published_ad_by_message(first),
+        'get_published_ad': lambda: database.get_published_ad(first),
+        'mark_ad_as_sold': lambda: database.mark_ad_as_sold(first, USER_ID),
+        'reopen_ad': lambda: database.reopen_ad(first, 'sold'),
+        'mark_ad_as_expired': lambda: database.mark_ad_as_expired(last, USER_ID),
+        'renew_ad': lambda: database.renew_ad(last, USER_ID),
+        'get_user_ads': lambda: database.get_user_ads(USER_ID, None, 6),
+        'get_user_ads (следующая страница)': lambda: database.get_user_ads(USER_ID, last, 6),
+        'get_moderation_queue': lambda: database.get_moderation_queue(10),
+        'claim_moderation_ads': lambda: database.claim_moderation_ads(keys['pending'][:2], 'rejected', 1),
+        'release_moderation_ads': lambda: database.release_moderation_ads(keys['pending'][:2]),
+        'find_ads_with_photos': lambda: database.find_ads_with_photos(["uid-shared", "uid-1"], last, 5),
+        'browse_published_ads': lambda: database.browse_published_ads([], 'sell', None, 20),
+        'browse_published_ads (следующая страница)': lambda: database.browse_published_ads([], 'sell', after, 20),
+        'expire_stale_ads': lambda: database.expire_stale_ads('sell', 30 * 86400, 200),
+        'get_expiry_queue': lambda: database.get_expiry_queue(200),
+        'get_user_state': lambda: database.get_user_state(USER_ID),
+        'merge_user_data': lambda: database.merge_user_data(USER_ID, {'price': "9 000 ₽"}),
+    }
+
+def traced(conn, call) -> list:
+    """Запросы, выполненные соединением за время вызова, с подставленными параметрами"""
+    statements = []
+
+    def trace(sql):
+        if sql.lstrip().upper().startswith(STATEMENTS) and sql not in statements:
+            statements.append(sql)
+    conn.set_trace_callback(trace)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return statements
+
+def query_plan(conn, sql):
+    """Возвращает строки плана запроса"""
+    return [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+def is_indexed(plan, allowed=()):
+    """Проверяет, что план не содержит полного сканирования и внешней сортировки"""
+    for detail in plan:
+        if detail.startswith('SCAN') and 'USING' not in detail and detail not in allowed:
+            return False
+        if 'TEMP B-TREE' in detail:
+            return False
+    return True
+
+def main():
+    """Главная функция"""
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Без читателей все запросы идут через соединение писателя — его и трассируем
+        database = Database(os.path.join(tmp, 'plans.db'), pool_readers=0)
+        calls = hot_calls(database, seed(database))
+        # Блокировку писателя берут сами вызовы, поэтому соединение — напрямую
+        conn = database.pool._writer
+        for name, call in calls.items():
+            statements = traced(conn, call)
+            if not statements:
+                print(f"FAIL {name}: ни одного запроса")
+                failed.append(name)
+            for sql in statements:
+                plan = query_plan(conn, sql)
+                ok = is_indexed(plan, ALLOWED_SCANS.get(name, ()))
+                print(f"{'OK  ' if ok else 'FAIL'} {name}: {'; '.join(plan) or 'без чтения таблиц'}")
+                if not ok:
+                    print(f"     {' '.join(sql.split())}")
+                    failed.append(name)
+        database.close()
+
+    if failed:
+        print(f"Запросы без индекса: {', '.join(dict.fromkeys(failed))}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Проверка ограничителя частоты запросов на всплеске одобрений.
+
+Поднимает локальный FakeBotAPI с ограничениями как у Telegram и одобряет N
+объявлений разом: альбом в канал, сообщение автору и правка карточки в чате
+модерации — как approve_ad. Сравнивает сессию без ограничителя и с
+RateLimitMiddleware: сколько вызовов упало с 429, сколько завершилось,
+сколько длилось и сколько пришлось ждать.
+
+Запуск: python -m benchmarks.rate_limit --ads 30
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db из app.database не должен трогать bot_data.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='rate-limit-'), 'bot_data.db')
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InputMediaPhoto
+
+from app.throttling import RateLimitMiddleware
+from benchmarks.fake_bot_api import FakeBotAPI
+
+CHANNEL_ID = -1001
+MODERATION_CHAT_ID = -1002
+
+async def approve_burst(bot: Bot, ads: int, photos: int):
+    """Одобряет объявления параллельно, возвращает (успешно, ошибок 429)"""
+    async def approve(ad_id):
+        media = [InputMediaPhoto(media=f"photo-{ad_id}-{i}") for i in range(photos)]
+        await bot.send_media_group(chat_id=CHANNEL_ID, media=media)
+        await bot.send_message(chat_id=100000 + ad_id, text="✅ Объявление одобрено!")
+        await bot.edit_message_text(chat_id=MODERATION_CHAT_ID, message_id=ad_id, text="✅ ОДОБРЕНО")
+
+    results = await asyncio.gather(*(approve(i) for i in range(ads)), return_exceptions=True)
+    failed = sum(isinstance(r, TelegramRetryAfter) for r in results)
+    errors = [r for r in results if isinstance(r, Exception) and not isinstance(r, TelegramRetryAfter)]
+    if errors:
+        raise errors[0]
+    return ads - failed, failed
+
+async def run(name: str, limiter, args):
+    """Прогон одного варианта против нового сервера"""
+    server = FakeBotAPI(latency=args.latency, global_limit=args.global_limit, group_limit=args.group_limit)
+    url = await server.start()
+    session = AiohttpSession(api=TelegramAPIServer.from_base(url))
+    if limiter is not None:
+        session.middleware(limiter)
+    bot = Bot(token='0:benchmark', session=session)
+
+    started = time.perf_counter()
+    done, failed = await approve_burst(bot, args.ads, args.photos)
+    elapsed = time.perf_counter() - started
+
+    await session.close()
+    await server.stop()
+
+    print(
+        f"{name:>16}: одобрено {done}/{args.ads}, упало с 429: {failed}, "
+        f"ответов 429 от сервера: {sum(server.rejected.values())}, время {elapsed:.2f} с"
+    )
+    if limiter is not None:
+        stats = limiter.stats
+        print(
+            f"{'':>16}  запросов {stats['requests']}, ждали {stats['throttled_requests']} "
+            f"(всего {stats['wait_seconds']:.2f} с), RetryAfter: {stats['retry_after']}"
+        )
+
+async def main_async(args):
+    """Оба варианта по очереди"""
+    await run('без ограничителя', None, args)
+    await run('с ограничителем', RateLimitMiddleware(
+        global_rate=args.global_limit, group_per_minute=args.group_limit
+    ), args)
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=30)
+    parser.add_argument('--photos', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.01, help="Задержка сервера, с")
+    parser.add_argument('--global-limit', type=int, default=30, help="Сообщений в секунду на бота")
+    parser.add_argument('--group-limit', type=int, default=1200,
+                        help="Сообщений в минуту в группу (у Telegram 20; больше — чтобы прогон был коротким)")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Время полнотекстового поиска (/search) на большом числе опубликованных объявлений.
+
+Наполняет ads опубликованными объявлениями (по умолчанию 100k строк; индекс FTS5 заполняется
+триггером) заголовками и описаниями из словаря с частотами по закону Ципфа
+и замеряет search_published_ads на разных запросах: частое и редкое слово,
+два слова, префикс, фильтр по категории и статусу, последняя страница (SEARCH_MAX_PAGES).
+Печатает p50/p99 в миллисекундах и число совпадений каждого запроса.
+
+Запуск: python -m benchmarks.search --ads 100000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db из app.database не должен трогать bot_data.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='search-bench-'), 'bot_data.db')
+
+from app.config import SEARCH_CANDIDATES, SEARCH_MAX_PAGES, SEARCH_PAGE_SIZE
+from app.database import Database
+from benchmarks.handler_latency import percentile
+
+# Слова, которые реально ищут; стоят в начале словаря и потому самые частые
+BIKE_WORDS = [
+    'рама', 'вилка', 'колесо', 'колёса', 'обод', 'втулка', 'покрышка', 'камера', 'седло', 'подседел',
+    'руль', 'вынос', 'шатуны', 'каретка', 'звезда', 'цепь', 'педали', 'тормоз', 'переключатель', 'манетка',
+    'фикс', 'синглспид', 'шоссе', 'трек', 'сталь', 'алюминий', 'карбон', 'хром', 'новый', 'бу',
+    'surly', 'brooks', 'shimano', 'sram', 'campagnolo', 'mavic', 'continental', 'schwalbe', 'cinelli', 'bianchi',
+]
+CATEGORIES = ['sell', 'sell', 'sell', 'buy', 'trade', 'free', 'service', 'event']
+QUERIES = {
+    'частое слово': (['рама'], None, 'active'),
+    'редкое слово': (['cinelli'], None, 'active'),
+    'два слова': (['рама', 'сталь'], None, 'active'),
+    'префикс': (['тор'], None, 'active'),
+    'категория': (['колесо'], 'buy', 'active'),
+    'проданные': (['седло'], None, 'sold'),
+    'все статусы': (['вилка'], None, None),
+}
+
+def vocabulary(size: int):
+    """
+    Словарь и веса по закону Ципфа со сдвигом: самое частое слово встречается
+    примерно в каждом шестом объявлении, как «рама» в барахолке
+    """
+    words = BIKE_WORDS + [f"слово{i}" for i in range(size - len(BIKE_WORDS))]
+    weights = [1 / (rank + 50) for rank in range(1, len(words) + 1)]
+    return words, weights
+
+def seed(database: Database, ads: int) -> None:
+    """Наполняет ads опубликованными объявлениями через вставки, на которых срабатывает триггер FTS"""
+    words, weights = vocabulary(5000)
+    chunk = 20000
+    with database.get_connection() as conn:
+        for low in range(0, ads, chunk):
+            rows = []
+            for i in range(low, min(ads, low + chunk)):
+                title = ' '.join(random.choices(words[:300], weights[:300], k=random.randint(2, 4)))
+                description = ' '.join(random.choices(words, weights, k=random.randint(10, 40)))
+                status = 'sold' if random.random() < 0.3 else 'active'
+                rows.append((i // 5, random.choice(CATEGORIES), title, description, '5 000 ₽', status))
+            conn.executemany("""
+                INSERT INTO ads (user_id, category, title, description, price, status, published_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, rows)
+            conn.commit()
+        # Пост в канале: ID сообщения совпадает с ID объявления
+        conn.execute("""
+            INSERT OR IGNORE INTO ad_channel_posts (ad_id, chat_id, message_id)
+            SELECT id, -1001, id FROM ads WHERE published_at IS NOT NULL
+        """)
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+
+def matches(database: Database, words) -> int:
+    """Число объявлений, подходящих под слова (без ограничения кандидатов)"""
+    from app.database import _fts_query
+    with database.get_connection(readonly=True) as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM ads_fts WHERE ads_fts MATCH ?", (_fts_query(words),)
+        ).fetchone()[0]
+
+def measure(database: Database, rounds: int, words, category, status, offset=0, candidates=0) -> dict:
+    """p50/p99 одного запроса, мс"""
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        database.search_published_ads(words, category, status, limit=9, offset=offset, candidates=candidates)
+        latencies.append(time.perf_counter() - started)
+    return {'p50': percentile(latencies, 50) * 1000, 'p99': percentile(latencies, 99) * 1000}
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--candidates', type=int, default=SEARCH_CANDIDATES,
+                        help="Предел совпадений для ранжирования (SEARCH_CANDIDATES), 0 — все")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger('app.database').setLevel(logging.WARNING)
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(os.path.join(tmp, 'search.db'))
+        started = time.perf_counter()
+        seed(database, args.ads)
+        print(f"{args.ads} объявлений вставлено за {time.perf_counter() - started:.1f} с (вместе с индексом FTS5)")
+        print(f"предел кандидатов: {args.candidates or 'нет'}")
+        print(f"{'запрос':<16}{'совпадений':>11}{'p50, мс':>9}{'p99, мс':>9}")
+        for name, (words, category, status) in QUERIES.items():
+            result = measure(database, args.rounds, words, category, status, candidates=args.candidates)
+            print(f"{name:<16}{matches(database, words):>11}{result['p50']:>9.2f}{result['p99']:>9.2f}")
+        last = SEARCH_MAX_PAGES - 1
+        result = measure(database, args.rounds, ['рама'], None, 'active', offset=last * SEARCH_PAGE_SIZE, candidates=args.candidates)
+        print(f"{f'страница {last + 1}':<16}{matches(database, ['рама']):>11}{result['p50']:>9.2f}{result['p99']:>9.2f}")
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Набор микробенчмарков слоя хранения: Database (через AsyncDatabase) и DatabaseStorage.
+
+Операции: чтение, запись и слияние данных FSM через DatabaseStorage,
+save_moderation_ad, publish_ad, mark_ad_as_sold и get_user_ads.
+Таблицы по очереди наполняются до каждого из размеров (по умолчанию 1k,
+100k и 1M строк в user_states и ads), и на
+каждом размере операции гоняются с разным числом одновременных
+пользователей. Результат — JSON с ops/sec и p50/p95/p99 по каждой
+комбинации; с --baseline печатается сравнение с прошлым прогоном.
+
+Запуск: python -m benchmarks.storage --output storage.json
+        python -m benchmarks.storage --sizes 1000 --baseline storage.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальные db и DatabaseStorage должны смотреть во временную БД
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='storage-bench-'), 'bot_data.db')
+# Хранилище без кэша: замеряется сама БД
+os.environ['FSM_FLUSH_INTERVAL'] = '0'
+
+from aiogram.fsm.storage.base import StorageKey
+
+from app.database import db
+from app.storage import DatabaseStorage
+from benchmarks.handler_latency import percentile
+
+# Пользователей на одно объявление при наполнении
+ADS_PER_USER = 5
+PHOTOS = ['AgACAgIAAxkBAAIBZ2X' + 'a' * 60] * 3
+AD = {
+    'category': 'sell', 'photos': PHOTOS, 'title': 'Рама Surly Steamroller 56',
+    'description': 'Сталь 4130, родная покраска, без вмятин. Торг уместен.',
+    'price': '25000', 'user_mention': '@bench', 'user_display': 'Bench',
+}
+FSM_DATA = {'category': 'sell', 'photos': PHOTOS, 'title': AD['title']}
+
+def seed(start: int, stop: int) -> None:
+    """Дополняет таблицы строками с номерами [start, stop)"""
+    photos = json.dumps(PHOTOS)
+    fsm_data = json.dumps(FSM_DATA, ensure_ascii=False)
+    chunk = 50000
+    with db.sync.get_connection() as conn:
+        for low in range(start, stop, chunk):
+            rows = range(low, min(stop, low + chunk))
+            conn.executemany(
+                "INSERT OR REPLACE INTO user_states (user_id, state, data) VALUES (?, ?, ?)",
+                ((i, 'AdStates:waiting_for_title', fsm_data) for i in rows)
+            )
+            conn.executemany("""
+                INSERT INTO ads (user_id, category, photos, title, description, price,
+                                 user_mention, user_display, status, published_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'active', CURRENT_TIMESTAMP)
+            """, ((i // ADS_PER_USER, AD['category'], photos, AD['title'], AD['description'], AD['price'],
+                   AD['user_mention'], AD['user_display']) for i in rows))
+            # Пост в канале: ID сообщения совпадает с ID объявления
+            conn.execute("""
+                INSERT OR IGNORE INTO ad_channel_posts (ad_id, chat_id, message_id)
+                SELECT id, -1001, id FROM ads WHERE status = 'active'
+            """)
+            conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+
+def operations(storage: DatabaseStorage, size: int):
+    """Операции бенчмарка: имя -> корутина от номера операции"""
+    users = max(1, size // ADS_PER_USER)
+
+    def key(i):
+        user_id = random.randrange(size)
+        return StorageKey(bot_id=0, chat_id=user_id, user_id=user_id)
+
+    return {
+        'fsm_get': lambda i: storage.get_data(key(i)),
+        'fsm_set': lambda i: storage.set_state(key(i), 'AdStates:waiting_for_description'),
+        'fsm_update': lambda i: storage.update_data(key(i), {'description': f"Описание {i}"}),
+        'save_moderation_ad': lambda i: db.save_moderation_ad(random.randrange(users), AD),
+        # Те же UPDATE по ключу, запись поста и commit, что и при одобрении; объявление
+        # уже активно, поэтому статус не меняется
+        'publish_ad': lambda i: db.publish_ad(random.randint(1, size), size + i + 1, -1001),
+        'mark_ad_as_sold': lambda i: db.mark_ad_as_sold(random.randint(1, size), 1),
+        'get_user_ads': lambda i: db.get_user_ads(random.randrange(users)),
+    }
+
+async def measure(operation, ops: int, concurrency: int) -> dict:
+    """Выполняет ops вызовов силами concurrency пользователей"""
+    latencies = []
+    counter = iter(range(ops))
+
+    async def user():
+        for i in counter:
+            started = time.perf_counter()
+            await operation(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'ops': ops,
+        'ops_per_sec': round(ops / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }
+
+def metadata(args) -> dict:
+    """Окружение прогона для сравнения между коммитами"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'ops': args.ops,
+        'sizes': args.sizes,
+        'concurrency': args.concurrency,
+    }
+
+def compare(results: list, baseline_path: str) -> None:
+    """Печатает изменение ops/sec и p99 относительно прошлого прогона"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {
+            (r['size'], r['concurrency'], r['operation']): r for r in json.load(f)['results']
+        }
+    print(f"{'операция':<20}{'строк':>9}{'польз.':>8}{'ops/s':>12}{'p99, мс':>14}", file=sys.stderr)
+    for result in results:
+        old = baseline.get((result['size'], result['concurrency'], result['operation']))
+        if old is None:
+            continue
+        ops_change = (result['ops_per_sec'] / old['ops_per_sec'] - 1) * 100
+        p99_change = (result['p99_ms'] / old['p99_ms'] - 1) * 100 if old['p99_ms'] else 0.0
+        print(
+            f"{result['operation']:<20}{result['size']:>9}{result['concurrency']:>8}"
+            f"{ops_change:>+11.1f}%{p99_change:>+13.1f}%",
+            file=sys.stderr
+        )
+
+async def main_async(args) -> dict:
+    """Наполняет БД до каждого размера и прогоняет все операции"""
+    db.sync.init_database()
+    storage = DatabaseStorage()
+    results = []
+    seeded = 0
+    for size in sorted(args.sizes):
+        started = time.perf_counter()
+        seed(seeded, size)
+        seeded = size
+        print(f"наполнено до {size} строк за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+        for name, operation in operations(storage, size).items():
+            if args.only and name not in args.only:
+                continue
+            for concurrency in args.concurrency:
+                result = await measure(operation, args.ops, concurrency)
+                results.append({'operation': name, 'size': size, 'concurrency': concurrency, **result})
+                print(
+                    f"{name:<20}{size:>9}{concurrency:>5} польз.: {result['ops_per_sec']:>10,.0f} ops/s "
+                    f"p50={result['p50_ms']:.2f} p95={result['p95_ms']:.2f} p99={result['p99_ms']:.2f} мс",
+                    file=sys.stderr
+                )
+    db.close()
+    return {'meta': metadata(args), 'results': results}
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    int_list = lambda value: [int(v) for v in value.split(',')]
+    parser.add_argument('--sizes', type=int_list, default=[1000, 100000, 1000000],
+                        help="Размеры таблиц через запятую")
+    parser.add_argument('--concurrency', type=int_list, default=[1, 10, 100, 500],
+                        help="Числа одновременных пользователей через запятую")
+    parser.add_argument('--ops', type=int, default=2000, help="Вызовов на каждую комбинацию")
+    parser.add_argument('--only', type=lambda v: v.split(','), help="Только эти операции через запятую")
+    parser.add_argument('--seed', type=int, default=42, help="Зерно генератора случайных ключей")
+    parser.add_argument('--output', help="Файл для JSON (по умолчанию stdout)")
+    parser.add_argument('--baseline', help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    # Логи каждой записи в БД исказили бы замеры
+    logging.getLogger().setLevel(logging.WARNING)
+    # publish_ad предупреждает о повторной публикации на каждом вызове
+    logging.getLogger('app.database').setLevel(logging.ERROR)
+    random.seed(args.seed)
+    report = asyncio.run(main_async(args))
+
+    body = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(body + '\n')
+    else:
+        print(body)
+    if args.baseline:
+        compare(report['results'], args.baseline)
+
+if __name__ == "__main__":
+    main()
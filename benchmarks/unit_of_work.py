@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Записи одобрения: отдельные commit против единицы работы.
+
+Наполняет ads одобренными объявлениями и записывает их публикацию — то, что
+делает complete_approval после поста в канале: publish_ad. Способы:
+  1. отдельно — вызов на одобрение со своим commit (так работает бот);
+  2. пакет — --batch одобрений в одной единице работы (фоновые задачи).
+Одобрения идут через AsyncDatabase от --concurrency обработчиков сразу;
+печатаются одобрений и commit в секунду при PRAGMA synchronous NORMAL
+(по умолчанию у бота) и FULL (fsync на каждый commit).
+
+Напоследок проверяется атомарность: ошибка второго вызова единицы работы
+откатывает и первый. Код выхода 1, если запись пережила откат.
+
+Запуск: python -m benchmarks.unit_of_work --ads 2000 --concurrency 8 --batch 500
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db должен смотреть во временную БД
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='unit-of-work-'), 'bot_data.db')
+os.environ.setdefault('CHANNEL_ID', '-1001')
+os.environ.setdefault('MODERATION_CHAT_ID', '-1002')
+
+from app.database import db
+
+CHANNEL_ID = -1001
+AD = {
+    'category': 'sell', 'photos': ['AgACAgIAAxkBAAIBZ2X' + 'a' * 60] * 3,
+    'title': 'Рама Surly Steamroller 56', 'description': 'Сталь 4130, родная покраска, без вмятин.',
+    'price': '25000', 'user_mention': '@bench', 'user_display': 'Bench',
+}
+
+def seed(ads: int):
+    """Объявления на модерации; возвращает их ID"""
+    ad_ids = []
+    with db.sync.transaction():
+        for i in range(ads):
+            ad_ids.append(db.sync.save_moderation_ad(100000 + i, dict(AD, photo_uids=[f"uid-{i}-{n}" for n in range(3)])))
+    return ad_ids
+
+async def separate(ad_data):
+    """Как в боте: вызов со своим commit"""
+    await db.publish_ad(ad_data['id'], ad_data['id'], CHANNEL_ID, caption="Пост")
+
+async def approve_all(approve, ads, concurrency: int) -> float:
+    """Одобряет объявления из concurrency обработчиков; возвращает время"""
+    pending = iter(ads)
+
+    async def handler():
+        for ad_data in pending:
+            await approve(ad_data)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+async def batched(ads, batch: int) -> float:
+    """Фоновая задача: batch одобрений на транзакцию; возвращает время"""
+    started = time.perf_counter()
+    for low in range(0, len(ads), batch):
+        async with db.unit_of_work() as uow:
+            for ad_data in ads[low:low + batch]:
+                uow.publish_ad(ad_data['id'], ad_data['id'], CHANNEL_ID, caption="Пост")
+    return time.perf_counter() - started
+
+def reset():
+    """Возвращает объявления в статус approved, как сразу после решения модератора"""
+    with db.sync.transaction() as database:
+        with database.get_connection() as conn:
+            conn.execute("DELETE FROM ad_channel_posts")
+            conn.execute("UPDATE ads SET status = 'approved', moderator_id = 1, published_at = NULL")
+
+async def check_rollback(ad_data) -> bool:
+    """Ошибка второго вызова откатывает первый"""
+    reset()
+    try:
+        async with db.unit_of_work() as uow:
+            uow.publish_ad(ad_data['id'], ad_data['id'], CHANNEL_ID, caption="Пост")
+            # Без ID поста publish_ad падает на вызове
+            uow.publish_ad(ad_data['id'])
+    except TypeError:
+        pass
+    with db.sync.get_connection(readonly=True) as conn:
+        published = conn.execute("SELECT COUNT(*) FROM ad_channel_posts").fetchone()[0]
+        status = conn.execute("SELECT status FROM ads WHERE id = ?", (ad_data['id'],)).fetchone()[0]
+        return published == 0 and status == 'approved'
+
+async def run(args) -> bool:
+    """Прогон; возвращает True, если проверка атомарности прошла"""
+    logging.getLogger().setLevel(logging.ERROR)
+    ad_ids = seed(args.ads)
+    ads = [await db.get_moderation_ad(ad_id) for ad_id in ad_ids]
+
+    print(f"{args.ads} одобрений, {args.concurrency} обработчиков")
+    print(f"{'synchronous':<13}{'способ':<18}{'одобрений/с':>12}{'commit/с':>10}{'commit на одобрение':>21}")
+    for synchronous in ('NORMAL', 'FULL'):
+        with db.sync.get_connection() as conn:
+            conn.execute(f"PRAGMA synchronous = {synchronous}")
+        runs = (
+            ('отдельно', 1, lambda: approve_all(separate, ads, args.concurrency)),
+            (f'пакет по {args.batch}', 1 / args.batch, lambda: batched(ads, args.batch)),
+        )
+        for name, commits, approve in runs:
+            reset()
+            elapsed = await approve()
+            rate = args.ads / elapsed
+            print(f"{synchronous:<13}{name:<18}{rate:>12.0f}{rate * commits:>10.0f}{commits:>21.3g}")
+
+    ok = await check_rollback(ads[0])
+    print(f"атомарность: {'ошибка второго вызова откатила первый' if ok else 'ОШИБКА — запись пережила откат'}")
+    db.close()
+    return ok
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Нагрузочное сравнение приёма апдейтов: webhook против long polling.
+
+Оба режима используют один и тот же простой обработчик (ответ на сообщение)
+и локальный FakeBotAPI, так что сравнивается только транспорт апдейтов.
+В режиме webhook синтетические апдейты отправляются POST-запросами в
+приложение из app/webhook.py, в режиме polling — кладутся в очередь
+getUpdates поддельного сервера. Выводит апдейтов в секунду, p50/p99
+задержки от отправки апдейта до окончания обработки и для webhook —
+задержку HTTP-ответа.
+
+Запуск: python -m benchmarks.webhook_load --updates 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+# Глобальный db из app.database не должен трогать bot_data.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='webhook-load-'), 'bot_data.db')
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+
+from app.webhook import create_webhook_app
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.handler_latency import percentile
+
+SECRET = 'benchmark-secret'
+
+def make_update(update_id: int) -> dict:
+    """Синтетический апдейт с текстовым сообщением"""
+    user_id = 100000 + update_id % 1000
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench'},
+            'text': f"/start {update_id}",
+        },
+    }
+
+def make_dispatcher(done_at: dict, finished: asyncio.Event, total: int) -> Dispatcher:
+    """Диспетчер с обработчиком, отмечающим время окончания обработки"""
+    dp = Dispatcher()
+
+    @dp.message()
+    async def echo(message: Message):
+        await message.answer("ok")
+        done_at[message.message_id] = time.perf_counter()
+        if len(done_at) >= total:
+            finished.set()
+
+    return dp
+
+def report(name: str, sent_at: dict, done_at: dict, elapsed: float, http_latencies=None):
+    """Печатает сводку"""
+    latencies = [done_at[i] - sent_at[i] for i in done_at]
+    line = (
+        f"{name:>8}: {len(done_at) / elapsed:,.0f} апд/с, "
+        f"обработка p50={statistics.median(latencies) * 1000:.1f} мс "
+        f"p99={percentile(latencies, 99) * 1000:.1f} мс"
+    )
+    if http_latencies:
+        line += (
+            f", HTTP-ответ p50={statistics.median(http_latencies) * 1000:.1f} мс "
+            f"p99={percentile(http_latencies, 99) * 1000:.1f} мс"
+        )
+    print(line)
+
+async def run_webhook(api_url: str, args):
+    """Апдейты приходят POST-запросами в webhook-приложение"""
+    sent_at, done_at, finished = {}, {}, asyncio.Event()
+    bot = Bot(token='0:benchmark', session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+    dp = make_dispatcher(done_at, finished, args.updates)
+
+    runner = web.AppRunner(create_webhook_app(dp, bot, SECRET, path='/webhook'))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    url = f"http://{host}:{port}/webhook"
+
+    http_latencies = []
+    queue = asyncio.Queue()
+    for update_id in range(1, args.updates + 1):
+        queue.put_nowait(update_id)
+
+    async with aiohttp.ClientSession(headers={'X-Telegram-Bot-Api-Secret-Token': SECRET}) as client:
+        async def sender():
+            while not queue.empty():
+                update_id = queue.get_nowait()
+                sent_at[update_id] = time.perf_counter()
+                async with client.post(url, json=make_update(update_id)) as resp:
+                    await resp.read()
+                    assert resp.status == 200, resp.status
+                http_latencies.append(time.perf_counter() - sent_at[update_id])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(args.concurrency)))
+        await asyncio.wait_for(finished.wait(), timeout=120)
+        elapsed = time.perf_counter() - started
+
+    await runner.cleanup()
+    report('webhook', sent_at, done_at, elapsed, http_latencies)
+
+async def run_polling(server: FakeBotAPI, api_url: str, args):
+    """Апдейты забираются через getUpdates"""
+    sent_at, done_at, finished = {}, {}, asyncio.Event()
+    bot = Bot(token='0:benchmark', session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+    dp = make_dispatcher(done_at, finished, args.updates)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+    await asyncio.sleep(0.2)
+
+    started = time.perf_counter()
+    # Апдейты приходят с тем же темпом, что и в webhook: пачками по concurrency
+    for update_id in range(1, args.updates + 1):
+        sent_at[update_id] = time.perf_counter()
+        server.updates.put_nowait(make_update(update_id))
+        if update_id % args.concurrency == 0:
+            await asyncio.sleep(0)
+    await asyncio.wait_for(finished.wait(), timeout=120)
+    elapsed = time.perf_counter() - started
+
+    await dp.stop_polling()
+    await polling
+    report('polling', sent_at, done_at, elapsed)
+
+async def main_async(args):
+    """Оба режима против одного поддельного Bot API"""
+    server = FakeBotAPI(latency=args.latency, global_limit=None, group_limit=None)
+    api_url = await server.start()
+    await run_webhook(api_url, args)
+    await run_polling(server, api_url, args)
+    await server.stop()
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.005, help="Задержка Bot API, с")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
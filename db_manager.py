@@ -7,6 +7,8 @@ import sqlite3
 import json
 from datetime import datetime
 
+from app import serializers
+
 def print_table_data(table_name):
     """Выводит данные из таблицы"""
     print(f"\n=== {table_name.upper()} ===")
@@ -34,6 +36,9 @@ def print_table_data(table_name):
                 value = row[key]
                 if value is None:
                     print(f"  {key}: NULL")
+                elif isinstance(value, bytes):
+                    # Данные FSM в двоичном формате (FSM_SERIALIZER)
+                    print(f"  {key}: {serializers.loads(value)} ({len(value)} байт)")
                 elif isinstance(value, str) and value.startswith('['):
                     try:
                         parsed = json.loads(value)
@@ -61,40 +66,46 @@ def show_stats():
     cursor = conn.cursor()
     
     # Подсчет записей в каждой таблице
-    tables = ['user_states', 'moderation_ads', 'published_ads']
+    tables = ['user_states', 'ads', 'ad_channel_posts', 'ad_moderation_cards']
     for table in tables:
         cursor.execute(f"SELECT COUNT(*) FROM {table}")
         count = cursor.fetchone()[0]
         print(f"{table}: {count} записей")
     
-    # Статистика по статусам модерации
-    cursor.execute("SELECT status, COUNT(*) FROM moderation_ads GROUP BY status")
+    # Статистика по статусам объявлений: pending → approved/rejected → active → sold/expired
+    cursor.execute("SELECT status, COUNT(*) FROM ads GROUP BY status")
     status_stats = cursor.fetchall()
-    print("\nСтатистика модерации:")
+    print("\nСтатистика объявлений по статусам:")
     for status, count in status_stats:
         print(f"  {status}: {count}")
     
-    # Статистика по статусам опубликованных объявлений
-    cursor.execute("SELECT status, COUNT(*) FROM published_ads GROUP BY status")
-    pub_stats = cursor.fetchall()
-    print("\nСтатистика опубликованных объявлений:")
-    for status, count in pub_stats:
-        print(f"  {status}: {count}")
-    
     conn.close()
 
+def clear_ads():
+    """Очищает объявления вместе с карточками, постами, фото и очередью снятия"""
+    for table in ('expiry_queue', 'ad_photos', 'ad_channel_posts', 'ad_moderation_cards', 'ads'):
+        clear_table(table)
+
+def vacuum_database():
+    """Переводит БД в режим incremental auto_vacuum и сжимает файл"""
+    conn = sqlite3.connect('bot_data.db')
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.close()
+    print("База данных сжата, включён incremental auto_vacuum")
+
 def main():
     """Главная функция"""
     while True:
         print("\n=== УПРАВЛЕНИЕ БАЗОЙ ДАННЫХ ===")
         print("1. Показать статистику")
         print("2. Показать user_states")
-        print("3. Показать moderation_ads")
-        print("4. Показать published_ads")
+        print("3. Показать ads")
+        print("4. Показать ad_channel_posts")
         print("5. Очистить user_states")
-        print("6. Очистить moderation_ads")
-        print("7. Очистить published_ads")
-        print("8. Очистить все таблицы")
+        print("6. Очистить ads (с карточками, постами и фото)")
+        print("7. Очистить все таблицы")
+        print("8. Сжать БД (VACUUM)")
         print("0. Выход")
         
         choice = input("\nВыберите действие: ").strip()
@@ -104,23 +115,21 @@ def main():
         elif choice == '2':
             print_table_data('user_states')
         elif choice == '3':
-            print_table_data('moderation_ads')
+            print_table_data('ads')
         elif choice == '4':
-            print_table_data('published_ads')
+            print_table_data('ad_channel_posts')
         elif choice == '5':
             if input("Уверены? (y/N): ").lower() == 'y':
                 clear_table('user_states')
         elif choice == '6':
             if input("Уверены? (y/N): ").lower() == 'y':
-                clear_table('moderation_ads')
+                clear_ads()
         elif choice == '7':
-            if input("Уверены? (y/N): ").lower() == 'y':
-                clear_table('published_ads')
-        elif choice == '8':
             if input("Уверены? Это удалит ВСЕ данные! (y/N): ").lower() == 'y':
                 clear_table('user_states')
-                clear_table('moderation_ads')
-                clear_table('published_ads')
+                clear_ads()
+        elif choice == '8':
+            vacuum_database()
         elif choice == '0':
             break
         else:
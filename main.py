@@ -5,9 +5,47 @@
 import asyncio
 import logging
 
+from app.albums import albums
 from app.bot import bot, dp
 from app.handlers import register_all_handlers
-from app.config import logger
+from app.handlers.moderation import close_bulk_jobs
+from app.config import RUN_MODE, WORKERS, METRICS_HOST, METRICS_PORT, logger
+from app.database import db
+from app.expiry import run_expiry
+from app.metrics import start_metrics_server
+from app.sweeper import run_sweeper
+from app.webhook import register_webhook, run_webhook
+from app.workers import run_workers
+
+# Фоновые задачи и серверы, работающие вместе с ботом
+background_tasks = []
+runners = []
+
+async def on_startup():
+    """
+    Запуск фоновых задач и эндпоинта метрик
+    """
+    background_tasks.append(asyncio.create_task(run_sweeper()))
+    background_tasks.append(asyncio.create_task(run_expiry()))
+    if METRICS_PORT:
+        runners.append(await start_metrics_server(METRICS_HOST, METRICS_PORT))
+
+async def on_shutdown():
+    """
+    Завершение работы: останавливаем фоновые задачи, сохраняем собираемые
+    альбомы, сбрасываем кэш состояний FSM и дожидаемся записи в БД
+    """
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    for runner in runners:
+        await runner.cleanup()
+    # Недособранные альбомы сохраняем до сброса кэша состояний
+    await albums.close()
+    await close_bulk_jobs()
+    await dp.storage.close()
+    db.close()
+    logger.info("База данных закрыта")
 
 async def main():
     """
@@ -17,9 +55,21 @@ async def main():
     
     # Регистрируем все обработчики
     register_all_handlers(dp)
+    if RUN_MODE == 'webhook':
+        # Webhook устанавливается до остальных хуков запуска
+        register_webhook(dp)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
     
-    # Запускаем поллинг
-    await dp.start_polling(bot)
+    if WORKERS > 1:
+        # Главный процесс принимает апдейты и раздаёт их процессам-обработчикам
+        await run_workers(dp, bot, WORKERS, RUN_MODE)
+    elif RUN_MODE == 'webhook':
+        # Принимаем апдейты через webhook
+        await run_webhook(dp, bot)
+    else:
+        # Запускаем поллинг
+        await dp.start_polling(bot)
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file